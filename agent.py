@@ -1,13 +1,24 @@
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage, SystemMessage, AnyMessage
+from typing import Any, Optional, Tuple
 from typing_extensions import TypedDict
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.runnables import RunnableLambda
-from langchain_together import ChatTogether
 from dotenv import load_dotenv
 load_dotenv()
 import os
 import sys
+import re
+import time
+from collections import deque
+from command_router import fast_route, RouterStats
+from conversation_memory import ConversationMemory, estimate_tokens
+from evidence_ledger import EvidenceLedger
+from case_model import Case, SUSPECT_COUNT
+from emotions import EMOTIONS, EmotionHeaderFilter, split_emotion_header
+from tracing import span
+from response_cache import CachedModel
+
+_DOSSIER_HEADER_RE = re.compile(r"^\s*#+\s*(Crime|Suspect\s+([1-4]))\b.*$", re.IGNORECASE | re.MULTILINE)
 
 class AgentState(TypedDict):
     case_details: AnyMessage
@@ -15,10 +26,31 @@ class AgentState(TypedDict):
     chat_history: list
     user_input: str
     router_info: str
+    dossiers: dict
+    emotion: str
+    case: Any
+    group_emotions: dict
 
 class Agent:
-    def __init__(self, model):
-        self.model = model
+    def __init__(self, model, structured_emotion: bool = True, checkpointer=None, session_store=None,
+                 response_cache=None):
+        # With a ResponseCache, repeated assistant, solution and router prompts skip the model call
+        self.model = CachedModel(model, response_cache) if response_cache is not None else model
+        # Optional SessionStore shared with the Streamlit UI; the console game saves every turn to it
+        self.session_store = session_store
+        self.session_id = None
+        # Ask suspect nodes for an "EMOTION:" header so no separate emotion call is needed
+        self.structured_emotion = structured_emotion
+        self.router_stats = RouterStats()
+        # Set to a callable to stream reply tokens as they arrive
+        self.on_token = None
+        self.call_log = deque(maxlen=200)
+        self.memory = ConversationMemory(
+            token_budget=int(os.getenv("MEMORY_TOKEN_BUDGET", "1200")),
+            recent_turns=int(os.getenv("MEMORY_RECENT_TURNS", "8")),
+        )
+        # Facts and contradictions per suspect, merged turn by turn for the solution check
+        self.ledger = EvidenceLedger()
         self.graph = StateGraph(AgentState)
 
         self.graph.add_node("router", lambda state: state)
@@ -27,11 +59,16 @@ class Agent:
         self.graph.add_node("suspect3", RunnableLambda(self.suspect3))
         self.graph.add_node("suspect2", RunnableLambda(self.suspect2))
         self.graph.add_node("suspect1", RunnableLambda(self.suspect1))
+        self.graph.add_node("group", RunnableLambda(self.group_interrogation))
         self.graph.add_node("default", RunnableLambda(self.default))
         self.graph.add_node("get_input", RunnableLambda(self.get_input))
         self.graph.add_node("solution", RunnableLambda(self.solution))
 
-        self.graph.set_entry_point("mysterygen")
+        # Resumed sessions already have a case and go straight to the next question
+        self.graph.set_conditional_entry_point(
+            lambda state: "get_input" if state.get("case_details") else "mysterygen",
+            ["get_input", "mysterygen"]
+        )
         self.graph.add_edge("mysterygen", "get_input")
 
         self.graph.add_conditional_edges("solution", self.solution)
@@ -41,9 +78,10 @@ class Agent:
         self.graph.add_edge("suspect3", "get_input")
         self.graph.add_edge("suspect2", "get_input")
         self.graph.add_edge("suspect1", "get_input")
+        self.graph.add_edge("group", "get_input")
         self.graph.add_edge("default", "get_input")    
 
-        self.graph = self.graph.compile()   
+        self.graph = self.graph.compile(checkpointer=checkpointer)   
 
     def mystery_generator(self, state: AgentState):
         prompt = ([HumanMessage("""
@@ -61,8 +99,12 @@ class Agent:
         Ensure multiple suspects could be guilty.
         Format as a case briefing to a detective, starting with the crime description followed by the suspect details in the exact format above.
         """)])
-        result = self.model.invoke(prompt)
-        state["case_details"] = result.content
+        case = self._generate_case(prompt)
+        state["case"] = case
+        state["case_details"] = case.briefing()
+        state["dossiers"] = self.compile_dossiers(state["case_details"])
+        self.memory.reset()
+        self.ledger.reset()
 
         instructions = """
         ===== Welcome to the Detective Mystery Game! =====
@@ -74,6 +116,8 @@ class Agent:
             suspect 4
 
             and then ask your question.
+        - To put the same question to every suspect at once, type:
+            all suspects, where were you at midnight?
         - To ask the assistant for help, type: help
         - To check your current theory and the solution, type: solution check
         - If you need general assistance or hints, just ask your question.
@@ -86,138 +130,277 @@ class Agent:
 
         return state 
     
+    def _generate_case(self, prompt) -> Case:
+        """Generate a Case, preferring schema-constrained output, with one repair attempt on invalid results"""
+        case = None
+        try:
+            with span("llm", "mysterygen_structured") as call:
+                call.prompt_tokens = estimate_tokens(str(prompt))
+                structured_model = self.model.with_structured_output(Case)
+                case = structured_model.invoke(prompt)
+                if isinstance(case, Case) and case.problems():
+                    call.retries += 1
+                    case = structured_model.invoke(prompt + [HumanMessage(
+                        f"This case is invalid because: {'; '.join(case.problems())}.\n"
+                        f"Return the corrected case.\n{case.model_dump_json()}"
+                    )])
+                if isinstance(case, Case):
+                    call.completion_tokens = estimate_tokens(case.model_dump_json())
+        except Exception:
+            case = None
+
+        if not isinstance(case, Case) or case.problems():
+            # Plain text generation parsed with the briefing grammar
+            text = self._reply("mysterygen", prompt, stream=False)
+            case = Case.from_text(text)
+            if case.problems():
+                repaired = self._reply("mysterygen", [HumanMessage(f"""
+        Rewrite this case briefing so it has a crime description followed by exactly four suspect lines
+        in this format, with every field filled in:
+        Suspect N: [Name], [Role]. Motive: [Motive]. Access: [Access]. Suspicious Fact: [Fact]. Evidence: [Evidence]
+
+        Problems to fix: {'; '.join(case.problems())}
+
+        {text}
+        """)], stream=False)
+                repaired_case = Case.from_text(repaired)
+                if len(repaired_case.problems()) < len(case.problems()):
+                    case = repaired_case
+
+        return case.fill_missing() if case.problems() else case
+
+    def compile_dossiers(self, case_details: str) -> dict:
+        """Condense the case once into a stable persona per suspect, used as a fixed prompt prefix"""
+        prompt = f"""
+        Here is a detective mystery case file:
+        {case_details}
+
+        Write a compact dossier that lets an actor play each suspect consistently.
+        Use exactly these headings and fields, with one short line per field:
+
+        ### Crime
+        [One or two sentences describing the crime as the suspects know it]
+
+        ### Suspect 1
+        Identity: [Name, role, relationship to the victim]
+        Motive: [Their motive]
+        Access: [Their access and opportunity]
+        Knows: [What they know about the crime and the other suspects]
+        Hides: [What they are hiding and will deflect or lie about]
+
+        Repeat the suspect section for Suspect 2, Suspect 3 and Suspect 4.
+        Do not add anything else.
+        """
+        try:
+            text = self._reply("dossier", prompt, stream=False)
+        except Exception:
+            return {}
+
+        sections = {}
+        headers = list(_DOSSIER_HEADER_RE.finditer(text))
+        for header, following in zip(headers, headers[1:] + [None]):
+            body = text[header.end():following.start() if following else len(text)].strip()
+            key = f"suspect{header.group(2)}" if header.group(2) else "crime"
+            if body:
+                sections[key] = body
+
+        crime = sections.pop("crime", "")
+        return {
+            suspect_id: f"THE CRIME: {crime}\n\n{body}" if crime else body
+            for suspect_id, body in sections.items()
+        }
+
     def get_input(self, state: AgentState):
         # This will be replaced in the Streamlit app
         # But keeping it for console-based testing
         chat_history = state.get("chat_history", [])
+        if self.session_store is not None:
+            self.session_store.save_game_state(self.session_id, state)
         user_input = input("\nDetective: ")
+        chat_history.append({"role": "detective", "content": user_input})
         state["user_input"] = user_input
         state["chat_history"] = chat_history
         return state
     
-    def suspect4(self, state: AgentState):
-        behaviour = state["case_details"]
-        chat_history = state.get("chat_history", [])
-        prompt = f"""
-        This is the details: {behaviour}
-        analyse the details and find out what is the motive of the suspect 4.
-        The suspect 4 is the one who is being questioned by the detective
-        and you are suspect 4 in the case.
-
-        this is the detective message/question: {state["user_input"]}
-
-        You are a suspect in a detective mystery.
-        You are being questioned by a detective.
+    def _reply(self, node: str, prompt, stream: bool = True, chat_history=None):
+        """Invoke the model, streaming tokens to ``self.on_token`` when it is set"""
+        start = time.perf_counter()
+        first_token_ms = None
+        streamed = stream and self.on_token is not None
+        prompt_tokens = estimate_tokens(str(prompt))
+        with span("llm", node) as call:
+            call.prompt_tokens = prompt_tokens
+            if not streamed:
+                result = self.model.invoke(prompt, config={"run_name": node})
+                response_content = result.content if hasattr(result, 'content') else result
+            else:
+                parts = []
+                for chunk in self.model.stream(prompt, config={"run_name": node}):
+                    token = chunk.content if hasattr(chunk, 'content') else chunk
+                    if not isinstance(token, str) or not token:
+                        continue
+                    if first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - start) * 1000
+                    parts.append(token)
+                    self.on_token(token)
+                response_content = "".join(parts)
+            completion_tokens = estimate_tokens(response_content)
+            call.completion_tokens = completion_tokens
+        self.call_log.append({
+            "node": node,
+            "streamed": streamed,
+            "ttft_ms": first_token_ms,
+            "total_ms": (time.perf_counter() - start) * 1000,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            # What the prompt would have carried with the raw history interpolated
+            "raw_history_tokens": estimate_tokens(str(chat_history)) if chat_history is not None else None,
+        })
+        return response_content
 
-        answer all the questions as if you are the suspect 4 in the case.
-        only include the information that is relevant to the case.
-        Do not include any information that is not relevant to the case. 
-        """
-        result = self.model.invoke(prompt)
-        response_content = result.content if hasattr(result, 'content') else result
-        
-        # Don't print to console when in Streamlit
-        if "streamlit" not in sys.modules:
-            print(response_content)
-        
-        chat_history.append({"role": "suspect 4", "content": response_content})
-        state["chat_history"] = chat_history
-        return state
-
-    def suspect3(self, state: AgentState):
+    def _suspect_prompt(self, state: AgentState, suspect_num: int) -> str:
+        """Interrogation prompt for one suspect; expects ``self.memory`` to be synced"""
         behaviour = state["case_details"]
-        chat_history = state.get("chat_history", [])
-        
-        prompt = f"""
-        This is the details: {behaviour}
-        analyse the details and find out what is the motive of the suspect 3.
-        The suspect 3 is the one who is being questioned by the detective
-        and you are suspect 3 in the case.
+        dossier = (state.get("dossiers") or {}).get(f"suspect{suspect_num}")
         
-        this is the detective message/question: {state["user_input"]}
+        if dossier:
+            # The dossier block is identical on every turn, so it stays a cacheable prefix
+            prompt = f"""
+        You are suspect {suspect_num} in a detective mystery and you are being questioned by a detective.
         
-        You are a suspect in a detective mystery.
-        You are being questioned by a detective.
+        YOUR DOSSIER:
+        {dossier}
         
-        answer all the questions as if you are the suspect 3 in the case.
-        only include the information that is relevant to the case.
-        Do not include any information that is not relevant to the case.
-        """
-        result = self.model.invoke(prompt)
-        response_content = result.content if hasattr(result, 'content') else result
+        Answer as this character. Stay consistent with your dossier and with what you already said.
+        Only include information that is relevant to the case.
+        Never reveal what you are hiding unless the detective confronts you with evidence.
         
-        # Don't print to console when in Streamlit
-        if "streamlit" not in sys.modules:
-            print(response_content)
+        Your interrogation so far:
+        {self.memory.context(f"suspect {suspect_num}")}
         
-        chat_history.append({"role": "suspect 3", "content": response_content})
-        state["chat_history"] = chat_history
-        return state    
-
-    def suspect2(self, state: AgentState):
-        behaviour = state["case_details"]
-        chat_history = state.get("chat_history", [])
-        
-        prompt = f"""
+        this is the detective message/question: {state["user_input"]}
+        """
+        else:
+            prompt = f"""
         This is the details: {behaviour}
-        analyse the details and find out what is the motive of the suspect 2.
-        The suspect 2 is the one who is being questioned by the detective
-        and you are suspect 2 in the case.
+        analyse the details and find out what is the motive of the suspect {suspect_num}.
+        The suspect {suspect_num} is the one who is being questioned by the detective
+        and you are suspect {suspect_num} in the case.
+        
+        Your interrogation so far (stay consistent with it):
+        {self.memory.context(f"suspect {suspect_num}")}
         
         this is the detective message/question: {state["user_input"]}
         
         You are a suspect in a detective mystery.
         You are being questioned by a detective.
         
-        answer all the questions as if you are the suspect 2 in the case.
+        answer all the questions as if you are the suspect {suspect_num} in the case.
         only include the information that is relevant to the case.
         Do not include any information that is not relevant to the case.
         """
-        result = self.model.invoke(prompt)
-        response_content = result.content if hasattr(result, 'content') else result
+        
+        if self.structured_emotion:
+            prompt += f"""
+        Start your reply with a single line "EMOTION: <emotion>" naming your current emotional state,
+        chosen from: {", ".join(EMOTIONS)}. Then write your answer on the following lines.
+        """
+        return prompt
+
+    def _interrogate(self, state: AgentState, suspect_num: int):
+        chat_history = state.get("chat_history", [])
+        self.memory.sync(chat_history)
+        prompt = self._suspect_prompt(state, suspect_num)
+        
+        emotion = None
+        if self.structured_emotion:
+            on_token = self.on_token
+            header_filter = EmotionHeaderFilter(on_token) if on_token is not None else None
+            self.on_token = header_filter
+            try:
+                response_content = self._reply(f"suspect{suspect_num}", prompt, chat_history=chat_history)
+                if header_filter is not None:
+                    header_filter.flush()
+            finally:
+                self.on_token = on_token
+            emotion, response_content = split_emotion_header(response_content)
+        else:
+            response_content = self._reply(f"suspect{suspect_num}", prompt, chat_history=chat_history)
+        state["emotion"] = emotion
         
         # Don't print to console when in Streamlit
         if "streamlit" not in sys.modules:
             print(response_content)
         
-        chat_history.append({"role": "suspect 2", "content": response_content})
+        chat_history.append({"role": f"suspect {suspect_num}", "content": response_content})
         state["chat_history"] = chat_history
         return state
 
-    def suspect1(self, state: AgentState):
-        behaviour = state["case_details"]
+    def group_interrogation(self, state: AgentState):
+        """Put the same question to every suspect at once with a single batched model call"""
         chat_history = state.get("chat_history", [])
-        
-        prompt = f"""
-        This is the details: {behaviour}
-        analyse the details and find out what is the motive of the suspect 1.
-        The suspect 1 is the one who is being questioned by the detective
-        and you are suspect 1 in the case.
-        
-        this is the detective message/question: {state["user_input"]}
-        
-        You are a suspect in a detective mystery.
-        You are being questioned by a detective.
-        
-        answer all the questions as if you are the suspect 1 in the case.
-        only include the information that is relevant to the case.
-        Do not include any information that is not relevant to the case.
-        """
-        result = self.model.invoke(prompt)
-        response_content = result.content if hasattr(result, 'content') else result
-        
-        # Don't print to console when in Streamlit
-        if "streamlit" not in sys.modules:
-            print(response_content)
-        
-        chat_history.append({"role": "suspect 1", "content": response_content})
+        self.memory.sync(chat_history)
+        numbers = list(range(1, SUSPECT_COUNT + 1))
+        prompts = [self._suspect_prompt(state, n) for n in numbers]
+        
+        start = time.perf_counter()
+        prompt_tokens = sum(estimate_tokens(prompt) for prompt in prompts)
+        with span("llm", "group") as call:
+            call.prompt_tokens = prompt_tokens
+            results = self.model.batch(prompts, config={"max_concurrency": len(prompts)}, return_exceptions=True)
+            failures = [result for result in results if isinstance(result, Exception)]
+            if len(failures) == len(results):
+                raise failures[0]
+            replies = {
+                n: result.content if hasattr(result, 'content') else result
+                for n, result in zip(numbers, results) if not isinstance(result, Exception)
+            }
+            completion_tokens = sum(estimate_tokens(reply) for reply in replies.values())
+            call.completion_tokens = completion_tokens
+            if failures:
+                call.outcome = "partial"
+        self.call_log.append({
+            "node": "group",
+            "streamed": False,
+            "ttft_ms": None,
+            "total_ms": (time.perf_counter() - start) * 1000,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "raw_history_tokens": estimate_tokens(str(chat_history)) * len(prompts),
+        })
+        
+        emotions = {}
+        for n, reply in replies.items():
+            emotion = None
+            if self.structured_emotion:
+                emotion, reply = split_emotion_header(reply)
+            emotions[f"suspect{n}"] = emotion
+            if "streamlit" not in sys.modules:
+                print(f"Suspect {n}: {reply}")
+            chat_history.append({"role": f"suspect {n}", "content": reply})
+        
+        state["emotion"] = None
+        state["group_emotions"] = emotions
         state["chat_history"] = chat_history
         return state
+
+    def suspect4(self, state: AgentState):
+        return self._interrogate(state, 4)
+
+    def suspect3(self, state: AgentState):
+        return self._interrogate(state, 3)
+
+    def suspect2(self, state: AgentState):
+        return self._interrogate(state, 2)
+
+    def suspect1(self, state: AgentState):
+        return self._interrogate(state, 1)
     
     def default(self, state: AgentState):
         behaviour = state["case_details"]
         chat_history = state.get("chat_history", [])
         detective_input = state["user_input"]
+        self.memory.sync(chat_history)
         
         prompt = f"""
         You are an assistant detective helping with a case investigation.
@@ -226,7 +409,7 @@ class Agent:
         
         DETECTIVE'S CURRENT REQUEST: "{detective_input}"
         
-        CONVERSATION HISTORY: {chat_history}
+        CONVERSATION HISTORY: {self.memory.context()}
         
         As the detective's assistant:
         1. Analyze the detective's request and provide guidance
@@ -245,8 +428,7 @@ class Agent:
         Respond in a helpful, analytical tone suitable for a detective's assistant.
         """
         
-        result = self.model.invoke(prompt)
-        response_content = result.content if hasattr(result, 'content') else result
+        response_content = self._reply("default", prompt, chat_history=chat_history)
         
         # Don't print to console when in Streamlit
         if "streamlit" not in sys.modules:
@@ -262,13 +444,21 @@ class Agent:
         chat_history = state.get("chat_history", [])
         user_input = state["user_input"].lower()
         
+        # Only turns added since the last ledger update are extracted here
+        try:
+            self.update_ledger(chat_history)
+            records = self.ledger.render(self._suspect_names(state))
+        except Exception:
+            self.memory.sync(chat_history)
+            records = self.memory.context()
+        
         # Create a comprehensive analysis prompt
         prompt = f"""
         You are a master detective analyzing a case.
         
         CASE DETAILS: {behaviour}
         
-        INVESTIGATION RECORDS: {chat_history}
+        EVIDENCE LEDGER (facts and contradictions from the interrogations): {records}
         
         DETECTIVE'S REQUEST: "{user_input}"
         
@@ -290,8 +480,7 @@ class Agent:
         - Be specific about next steps if the case is incomplete
         """
         
-        result = self.model.invoke(prompt)
-        response_content = result.content if hasattr(result, 'content') else result
+        response_content = self._reply("solution", prompt, chat_history=chat_history)
         
         # Don't print to console when in Streamlit
         if "streamlit" not in sys.modules:
@@ -314,9 +503,55 @@ class Agent:
             
         return "get_input"
     
+    def update_ledger(self, chat_history) -> int:
+        """Extract facts from the turns added since the last update; returns how many were added"""
+        return self.merge_ledger(self.extract_ledger(chat_history))
+
+    def extract_ledger(self, chat_history) -> Tuple[Optional[str], int]:
+        """Extraction reply for the turns added since the last update, and the history length it covers.
+
+        Leaves the ledger untouched, so a background extraction that is
+        superseded, e.g. by a new case, can simply be dropped. The text is
+        None when no suspect spoke in those turns. The lock is only held to
+        build the prompt, not for the model call.
+        """
+        history = list(chat_history)
+        with self.ledger.lock:
+            new_messages = self.ledger.pending(history)
+            if not any(message["role"].startswith("suspect") for message in new_messages):
+                return None, len(history)
+            prompt = self.ledger.extraction_prompt(new_messages)
+        return self._reply("ledger", prompt, stream=False), len(history)
+
+    def merge_ledger(self, extracted: Tuple[Optional[str], int]) -> int:
+        """Merge an ``extract_ledger`` result; returns how many entries were added"""
+        text, processed = extracted
+        with self.ledger.lock:
+            if text is None:
+                self.ledger.advance(processed)
+                return 0
+            return self.ledger.merge(text, processed)
+
+    @staticmethod
+    def _suspect_names(state: AgentState) -> dict:
+        case = state.get("case")
+        return {suspect.suspect_id: suspect.name for suspect in case.suspects} if case else {}
+    
     def router(self, state: AgentState):
+        start = time.perf_counter()
+        route = fast_route(state["user_input"], state.get("chat_history", []))
+        if route is not None:
+            self.router_stats.record(route, "fast", (time.perf_counter() - start) * 1000)
+            return route
+
+        route = self.llm_router(state)
+        self.router_stats.record(route, "llm", (time.perf_counter() - start) * 1000)
+        return route
+
+    def llm_router(self, state: AgentState):
         user_input = state["user_input"].lower()
         chat_history = state.get("chat_history", [])
+        self.memory.sync(chat_history)
         prompt = f"""
             Given the detective mystery context, determine which handler should process the current user message.
 
@@ -324,7 +559,7 @@ class Agent:
 
             CONVERSATION CONTEXT:
             - Mystery details previously established:
-            - Chat history: {chat_history}
+            - Chat history: {self.memory.context()}
 
             ROUTING INSTRUCTIONS:
             1. If the user explicitly wants to speak with a specific suspect:
@@ -342,18 +577,21 @@ class Agent:
             - If the last conversation was with suspect 1 -> return "suspect1"
 
 
-            3. If the user wants a new case/mystery -> return EXACTLY "mysterygen"
+            3. If the user addresses every suspect at once ("all suspects", "everyone") -> return EXACTLY "group"
+
+            4. If the user wants a new case/mystery -> return EXACTLY "mysterygen"
 
-            4. For any other query or help -> return EXACTLY "default"
+            5. For any other query or help -> return EXACTLY "default"
 
             OUTPUT FORMAT: Return ONLY the destination string (e.g., "suspect4") with no additional text.
             """
 
-        result = self.model.invoke(prompt)
-        result = result.content.lower()
+        result = self._reply("router", prompt, stream=False, chat_history=chat_history).lower()
 
         if "generate mystery" in result or "mysterygen" in result:
             return "mysterygen"
+        elif "group" in result:
+            return "group"
         elif "suspect4" in result:
             return "suspect4"
         elif "suspect3" in result:
@@ -369,14 +607,29 @@ class Agent:
         else:
             return "default"
 
-    def main(self):    
+    def main(self, session_id: str = None):    
         # This is only used for console-based running
         state = AgentState(
             case_details="",
             discovered_info="",
             chat_history=[],
             user_input="",
-            router_info=""
+            router_info="",
+            dossiers={},
+            emotion=None,
+            case=None
         )
-        result = self.graph.invoke(state)
-        return result
\ No newline at end of file
+        if self.session_store is not None:
+            if session_id and self.session_store.has_session(session_id):
+                loaded = self.session_store.load_game_state(session_id)
+                for key in ("case_details", "dossiers", "case", "chat_history"):
+                    state[key] = loaded[key]
+                print(f"Resumed session {session_id}")
+            else:
+                session_id = self.session_store.create_session()
+                print(f"Session ID: {session_id}")
+            self.session_id = session_id
+
+        config = {"configurable": {"thread_id": session_id or "console"}}
+        result = self.graph.invoke(state, config=config)
+        return result
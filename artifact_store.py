@@ -0,0 +1,155 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional
+
+
+class Artifact(NamedTuple):
+    mime_type: str
+    data: Optional[bytes]
+    path: Optional[str]
+    size: int
+    # Size of the same image as a decoded bitmap, for the memory report; 0 when unknown
+    decoded_size: int = 0
+
+
+class ArtifactStore:
+    """Session-scoped store for generated media kept as encoded bytes.
+
+    With ``spill_dir`` set, artifacts larger than ``spill_threshold`` are written
+    to disk under a key unique to this store instead of being held in memory.
+    When the bytes held in memory exceed ``budget_bytes``, the least recently
+    used artifacts are spilled to ``spill_dir``, or dropped if there is no
+    spill directory but ``reload`` can fetch them again by name.
+    """
+
+    def __init__(self, spill_dir: Optional[str] = None, spill_threshold: int = 2 * 1024 * 1024,
+                 budget_bytes: int = 0, reload: Optional[Callable[[str], Optional[bytes]]] = None):
+        self.key = uuid.uuid4().hex
+        self.spill_dir = spill_dir
+        self.spill_threshold = spill_threshold
+        self.budget_bytes = budget_bytes
+        self.reload = reload
+        self._artifacts: "OrderedDict[str, Artifact]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"spills": 0, "evictions": 0, "reloads": 0}
+
+    def _spill_path(self, name: str) -> str:
+        # Names such as "portrait:suspect1" are not valid file names everywhere
+        return os.path.join(self.spill_dir, f"{self.key}-{name.replace(':', '_')}")
+
+    def _write_spill(self, name: str, data: bytes) -> str:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self._spill_path(name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def put(self, name: str, data: bytes, mime_type: str = "image/png", decoded_size: int = 0):
+        artifact = Artifact(mime_type, data, None, len(data), decoded_size)
+        if self.spill_dir and len(data) > self.spill_threshold:
+            artifact = artifact._replace(data=None, path=self._write_spill(name, data))
+        with self._lock:
+            previous = self._artifacts.pop(name, None)
+            self._artifacts[name] = artifact
+        if previous and previous.path and previous.path != artifact.path:
+            self._remove_file(previous.path)
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        """Spill or drop least recently used artifacts until memory use fits the budget"""
+        if not self.budget_bytes or not (self.spill_dir or self.reload):
+            return
+        while True:
+            with self._lock:
+                held = [(name, a) for name, a in self._artifacts.items() if a.data is not None]
+                # The most recently used artifact always stays, even if it alone is over budget
+                if sum(a.size for _, a in held) <= self.budget_bytes or len(held) < 2:
+                    return
+                name, artifact = held[0]
+            if self.spill_dir:
+                replacement = artifact._replace(data=None, path=self._write_spill(name, artifact.data))
+                counter = "spills"
+            else:
+                replacement = artifact._replace(data=None)
+                counter = "evictions"
+            with self._lock:
+                # Skip the swap if the artifact was replaced meanwhile
+                if self._artifacts.get(name) is artifact:
+                    self._artifacts[name] = replacement
+                    self._artifacts.move_to_end(name, last=False)
+                self.counters[counter] += 1
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            artifact = self._artifacts.get(name)
+            if artifact is not None:
+                self._artifacts.move_to_end(name)
+        if artifact is None:
+            return None
+        if artifact.data is not None:
+            return artifact.data
+        if artifact.path is not None:
+            try:
+                with open(artifact.path, "rb") as f:
+                    return f.read()
+            except OSError:
+                return None
+        # Dropped under the budget: fetch it again and hold it as recently used
+        data = self.reload(name) if self.reload else None
+        if data is not None:
+            with self._lock:
+                self.counters["reloads"] += 1
+                if self._artifacts.get(name) is artifact:
+                    self._artifacts[name] = artifact._replace(data=data)
+            self._enforce_budget()
+        return data
+
+    def mime_type(self, name: str) -> Optional[str]:
+        with self._lock:
+            artifact = self._artifacts.get(name)
+        return artifact.mime_type if artifact is not None else None
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._artifacts
+
+    def discard(self, name: str):
+        with self._lock:
+            artifact = self._artifacts.pop(name, None)
+        if artifact and artifact.path:
+            self._remove_file(artifact.path)
+
+    def clear(self):
+        with self._lock:
+            artifacts, self._artifacts = self._artifacts, OrderedDict()
+        for artifact in artifacts.values():
+            if artifact.path:
+                self._remove_file(artifact.path)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(a.size for a in self._artifacts.values() if a.data is not None)
+
+    def memory_report(self) -> Dict[str, int]:
+        """Bytes held in memory, on disk and dropped, against the decoded-bitmap equivalent"""
+        with self._lock:
+            artifacts = list(self._artifacts.values())
+            report = dict(self.counters)
+        report.update(
+            items=len(artifacts),
+            memory_bytes=sum(a.size for a in artifacts if a.data is not None),
+            spilled_bytes=sum(a.size for a in artifacts if a.path is not None),
+            dropped_bytes=sum(a.size for a in artifacts if a.data is None and a.path is None),
+            decoded_bytes=sum(a.decoded_size for a in artifacts),
+            budget_bytes=self.budget_bytes,
+        )
+        return report
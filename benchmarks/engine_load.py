@@ -0,0 +1,225 @@
+"""Load-test the engine service with simulated players against the offline stubs.
+
+Each player opens a session, starts a case, then plays scripted turns the way
+the Streamlit client does: a streamed turn over the WebSocket, a snapshot,
+fetches of any portrait whose version changed, and a poll for background
+jobs. Every ``--workers`` value is a separate run; 0 runs the engine in this
+process through LocalEngineClient instead of over HTTP. Workers listen on
+their own ports and the client routes each session to one of them by id, as
+a session-affinity load balancer would; ``--shared-port`` runs them as one
+uvicorn service without affinity instead.
+
+    python benchmarks/engine_load.py --workers 1,4 --players 16 --turns 6
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, ROOT)
+
+from offline_suite import SCRIPTS, percentiles
+from stubs import ImageServer, LatencyProfile
+
+
+class Timings:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, start: float, end: float = None):
+        with self._lock:
+            self.samples[stage].append(((end or time.perf_counter()) - start) * 1000)
+
+    def error(self, stage: str):
+        with self._lock:
+            self.errors[stage] += 1
+
+
+def fetch_changed(client, session_id, game, seen, timings):
+    """Fetch the images whose version differs from what this player last saw, like the UI's cache"""
+    refs = [dict(artifact=s["artifact"], version=s["version"]) for s in game["suspects"]]
+    if game["scene"]:
+        refs.append(game["scene"])
+    for ref in refs:
+        if seen.get(ref["artifact"]) == ref["version"]:
+            continue
+        start = time.perf_counter()
+        if client.artifact(session_id, ref["artifact"]) is None:
+            timings.error("artifact")
+            continue
+        timings.add("artifact", start)
+        seen[ref["artifact"]] = ref["version"]
+
+
+def play(client, script, turns, think_seconds, timings):
+    start = time.perf_counter()
+    session_id = client.open_session()
+    timings.add("open_session", start)
+    start = time.perf_counter()
+    game = client.start_case(session_id)
+    timings.add("start_case", start)
+    seen = {}
+    fetch_changed(client, session_id, game, seen, timings)
+    for i in range(turns):
+        start = time.perf_counter()
+        first_token = None
+        for event in client.turn(session_id, script[i % len(script)]):
+            if event["event"] == "token" and first_token is None:
+                first_token = time.perf_counter()
+            elif event["event"] == "error":
+                timings.error("turn")
+        if first_token is not None:
+            timings.add("turn_first_token", start, first_token)
+        timings.add("turn", start)
+        start = time.perf_counter()
+        game = client.snapshot(session_id)
+        timings.add("snapshot", start)
+        fetch_changed(client, session_id, game, seen, timings)
+        start = time.perf_counter()
+        client.poll(session_id)
+        timings.add("poll", start)
+        time.sleep(think_seconds)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(workers: int, env: dict):
+    """Run engine_service with the stub app on ``workers`` processes; returns (process, base url)"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "engine_service.py"), "--app", "stub_service:app",
+         "--workers", str(workers), "--port", str(port)],
+        env=env, cwd=ROOT,
+    )
+    import httpx
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if httpx.get(url + "/healthz", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("engine service did not start")
+
+
+def start_workers(workers: int, env: dict, shared_port: bool):
+    """Start the engine workers; returns (processes, ENGINE_URL for the client)"""
+    if shared_port:
+        # uvicorn spreads connections over its workers with no session affinity
+        process, url = start_service(workers, env)
+        return [process], url
+    # One port per worker; the client routes each session to one of them by id
+    started = [start_service(1, env) for _ in range(workers)]
+    return [process for process, _ in started], ",".join(url for _, url in started)
+
+
+def run(workers: int, args, image_url: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.pathsep.join([ROOT, BENCHMARKS]),
+            POLLINATIONS_URL=image_url,
+            SESSION_DB=os.path.join(tmp, "sessions.sqlite3"),
+            PORTRAIT_CACHE_DIR=os.path.join(tmp, "portraits"),
+            CASE_POOL_DIR=os.path.join(tmp, "case_pool"),
+            CASE_POOL_SIZE="0",
+            STUB_LLM_LATENCY_MS=str(args.llm_latency_ms),
+            STUB_LLM_JITTER_MS=str(args.llm_latency_ms / 5),
+            STUB_TOKENS_PER_SECOND=str(args.tokens_per_second),
+            STUB_SCENE_LATENCY_MS=str(args.scene_latency_ms),
+            # The stubs have no quotas, and the scheduler's limits are per worker process
+            SCHEDULER="1" if args.scheduler else "0",
+        )
+        processes = []
+        if workers:
+            from engine_client import RemoteEngineClient
+            processes, url = start_workers(workers, env, args.shared_port)
+            make_client = lambda: RemoteEngineClient(url)
+        else:
+            # In-process: the stubs and engine load here, configured like a worker
+            os.environ.update(env)
+            import stub_service  # noqa: F401
+            from engine_client import LocalEngineClient
+            client = LocalEngineClient()
+            make_client = lambda: client
+
+        timings = Timings()
+        threads = [
+            threading.Thread(target=play, args=(make_client(), SCRIPTS[i % len(SCRIPTS)], args.turns,
+                                                args.think_ms / 1000, timings))
+            for i in range(args.players)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+            time.sleep(args.ramp_ms / 1000)
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - start
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    turns = len(timings.samples["turn"])
+    return {
+        "workers": (f"{workers}, shared" if args.shared_port else workers) if workers else "in-process",
+        "wall_seconds": round(wall_seconds, 2),
+        "turns_per_second": round(turns / wall_seconds, 2),
+        "errors": dict(timings.errors),
+        "stages": {stage: percentiles(samples) for stage, samples in sorted(timings.samples.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,4", help="comma-separated worker counts; 0 runs in-process")
+    parser.add_argument("--players", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--think-ms", type=float, default=200, help="pause between a player's turns")
+    parser.add_argument("--ramp-ms", type=float, default=50, help="delay between player starts")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--image-latency-ms", type=float, default=400)
+    parser.add_argument("--scene-latency-ms", type=float, default=1000)
+    parser.add_argument("--shared-port", action="store_true",
+                        help="run the workers as one uvicorn --workers service instead of routing by session id")
+    parser.add_argument("--scheduler", action="store_true", help="keep the per-process outbound scheduler on")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    with ImageServer(LatencyProfile(args.image_latency_ms, args.image_latency_ms / 4, seed=1)) as server:
+        # The in-process run imports the engine into this process, so it goes last
+        for workers in sorted((int(w) for w in args.workers.split(",")), key=lambda w: w == 0):
+            result = run(workers, args, server.url)
+            results.append(result)
+            stages = result["stages"]
+            print(f"workers {str(result['workers']):10s} {result['turns_per_second']:6.2f} turns/s  "
+                  f"turn p50 {stages['turn']['p50_ms']:7.0f} p95 {stages['turn']['p95_ms']:7.0f}  "
+                  f"first token p95 {stages.get('turn_first_token', {}).get('p95_ms', 0):7.0f}  "
+                  f"start case p95 {stages['start_case']['p95_ms']:7.0f}  errors {sum(result['errors'].values())}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
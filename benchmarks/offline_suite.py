@@ -0,0 +1,309 @@
+"""Replay scripted interrogation sessions offline and report per-stage latency percentiles.
+
+The chat model, the Gemini image client and Pollinations are replaced by the
+deterministic stand-ins in ``stubs.py``, each with its own latency and error
+distribution, so the numbers only move when the app's own hot paths do.
+
+    python benchmarks/offline_suite.py --sessions 5 --output bench_results.json
+    python benchmarks/offline_suite.py --compare bench_results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stubs import ImageServer, LatencyProfile, StubChatModel, StubImageClient
+
+STAGES = [
+    "case_generation", "portrait_batch", "portrait_fetch", "scene_generation", "routing",
+    "suspect_reply", "group_reply", "emotion_analysis", "ledger_update", "assistant_reply", "chat_render",
+]
+
+SCRIPTS = [
+    [
+        "suspect 1, where were you at midnight?",
+        "Who else was in the building?",
+        "Why were your fingerprints on the display case?",
+        "suspect 3, was the camera working?",
+        "What was on your radio log?",
+        "all suspects, who did you see near the archive?",
+        "any hints for me?",
+        "suspect 2 why did you buy a train ticket?",
+        "solution check: I think suspect 3 did it",
+        "solution check: I think suspect 3 did it",
+    ],
+    [
+        "talk to the second suspect",
+        "How much did you owe the curator?",
+        "suspect four, what were you cleaning?",
+        "Did you hear anything from the archive?",
+        "Did you see the librarian that night?",
+        "What do we know so far?",
+        "suspect 1 tell me about your keys",
+        "solution check: suspect 4",
+    ],
+]
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered), 3),
+        "p50_ms": round(rank(50), 3),
+        "p90_ms": round(rank(90), 3),
+        "p95_ms": round(rank(95), 3),
+        "p99_ms": round(rank(99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def run(self, stage, fn, *args, **kwargs):
+        """Time one call of ``fn``; failures are counted and return None"""
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            self.errors[stage] += 1
+            return None
+        finally:
+            self.samples[stage].append((time.perf_counter() - start) * 1000)
+
+    def report(self):
+        return {
+            stage: dict(percentiles(self.samples[stage]), errors=self.errors[stage])
+            for stage in STAGES if self.samples[stage] or self.errors[stage]
+        }
+
+
+def render_chat(chat_history, suspect_images, image_versions, thumbnails):
+    """The per-rerun work of ui.render_chat_history, minus Streamlit's own element serialisation"""
+    from render_cache import CHAT_WIDTH
+    rendered = []
+    for message in chat_history:
+        role = message["role"]
+        if role.startswith("suspect"):
+            suspect_id = f"suspect{role.split()[-1]}"
+            image = suspect_images.get(suspect_id)
+            if image is not None:
+                rendered.append(thumbnails.get(suspect_id, image_versions.get(suspect_id, 0), image, CHAT_WIDTH))
+            rendered.append(f"**Suspect {role.split()[-1]}:** {message['content']}")
+        else:
+            rendered.append(f"**{role.title()}:** {message['content']}")
+    return rendered
+
+
+def run_session(script, model, timer, structured_emotion, response_cache=None):
+    from agent import Agent, AgentState
+    from detective_engine import analyze_emotion, generate_crime_scene_image, generate_suspect_images, update_suspect_expression
+    from langgraph.graph import END
+    from render_cache import ThumbnailCache
+
+    agent = Agent(model, structured_emotion=structured_emotion, response_cache=response_cache)
+    state = AgentState(case_details="", discovered_info="", chat_history=[], user_input="",
+                       router_info="", dossiers={}, emotion=None, case=None)
+    state = timer.run("case_generation", agent.mystery_generator, state)
+    if state is None:
+        return agent
+    descriptions = state["case"].descriptions()
+    suspect_images = timer.run("portrait_batch", generate_suspect_images, descriptions) or {}
+    timer.run("scene_generation", generate_crime_scene_image, state["case_details"], descriptions)
+    image_versions = defaultdict(int)
+    thumbnails = ThumbnailCache()
+
+    for line in script:
+        state["user_input"] = line
+        state["chat_history"].append({"role": "detective", "content": line})
+        route = timer.run("routing", agent.router, state)
+        if route is None or route == END:
+            break
+        if route.startswith("suspect"):
+            if timer.run("suspect_reply", getattr(agent, route), state) is None:
+                continue
+            emotion = state.get("emotion")
+            if emotion is None:
+                emotion = timer.run("emotion_analysis", asyncio.run, analyze_emotion(
+                    model, line, state["chat_history"][-1]["content"], descriptions.get(route, ""))) or "neutral"
+            image = timer.run("portrait_fetch", update_suspect_expression, route, emotion, descriptions.get(route, ""))
+            if image is not None:
+                suspect_images[route] = image
+                image_versions[route] += 1
+        elif route == "group":
+            history_length = len(state["chat_history"])
+            if timer.run("group_reply", agent.group_interrogation, state) is None:
+                continue
+            emotions = state.get("group_emotions", {})
+            for message in state["chat_history"][history_length:]:
+                suspect_id = message["role"].replace(" ", "")
+                emotion = emotions.get(suspect_id)
+                if emotion is None:
+                    emotion = timer.run("emotion_analysis", asyncio.run, analyze_emotion(
+                        model, line, message["content"], descriptions.get(suspect_id, ""))) or "neutral"
+                image = timer.run("portrait_fetch", update_suspect_expression, suspect_id, emotion, descriptions.get(suspect_id, ""))
+                if image is not None:
+                    suspect_images[suspect_id] = image
+                    image_versions[suspect_id] += 1
+        elif route in ("default", "solution"):
+            timer.run("assistant_reply", getattr(agent, route), state)
+        if route.startswith("suspect") or route == "group":
+            # The UI runs this on the session worker after every interrogation turn
+            timer.run("ledger_update", agent.update_ledger, state["chat_history"])
+        timer.run("chat_render", render_chat, state["chat_history"], suspect_images, image_versions, thumbnails)
+    return agent
+
+
+def token_report(agents):
+    nodes = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+    for agent in agents:
+        for call in agent.call_log:
+            # Suspect nodes are reported together so runs with different scripts stay comparable
+            node = "suspect" if call["node"].startswith("suspect") else call["node"]
+            nodes[node]["calls"] += 1
+            nodes[node]["prompt_tokens"] += call["prompt_tokens"]
+            nodes[node]["completion_tokens"] += call.get("completion_tokens") or 0
+    for totals in nodes.values():
+        totals["mean_prompt_tokens"] = round(totals["prompt_tokens"] / totals["calls"], 1)
+    return dict(sorted(nodes.items()))
+
+
+def run(args):
+    llm_latency = LatencyProfile(args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate, seed=args.seed)
+    image_latency = LatencyProfile(args.image_latency_ms, args.image_jitter_ms, args.image_error_rate, seed=args.seed + 1)
+    scene_latency = LatencyProfile(args.scene_latency_ms, args.scene_latency_ms / 4, args.llm_error_rate, seed=args.seed + 2)
+
+    with ImageServer(image_latency) as server, tempfile.TemporaryDirectory() as cache_dir:
+        # Configure before detective_engine is imported: both are read at import time
+        os.environ["POLLINATIONS_URL"] = server.url
+        os.environ["PORTRAIT_CACHE_DIR"] = cache_dir
+        import providers
+        model = StubChatModel(llm_latency)
+        image_client = StubImageClient(scene_latency)
+        providers.install("chat_model", model)
+        providers.install("image_client", image_client)
+        from detective_engine import portrait_cache
+        from tracing import process_tracer
+        try:
+            # Pay the SDK import up front so the first scene sample measures generation, not import
+            from google.genai import types  # noqa: F401
+        except ImportError:
+            pass
+
+        from response_cache import ResponseCache
+        response_cache = None if args.no_response_cache else ResponseCache()
+        timer = StageTimer()
+        agents = []
+        start = time.perf_counter()
+        for i in range(args.sessions):
+            agents.append(run_session(SCRIPTS[i % len(SCRIPTS)], model, timer, not args.unstructured_emotion, response_cache))
+        wall_seconds = time.perf_counter() - start
+
+        router = defaultdict(int)
+        for agent in agents:
+            for path, count in agent.router_stats.calls.items():
+                router[path] += count
+        return {
+            "benchmark": "offline_suite",
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "config": {
+                "sessions": args.sessions,
+                "seed": args.seed,
+                "structured_emotion": not args.unstructured_emotion,
+                "response_cache": response_cache is not None,
+                "llm": llm_latency.describe(),
+                "image": image_latency.describe(),
+                "scene": scene_latency.describe(),
+            },
+            "wall_seconds": round(wall_seconds, 3),
+            "stages": timer.report(),
+            "tokens": token_report(agents),
+            "calls": {
+                "llm": model.calls, "llm_errors": model.errors,
+                "image_server": server.requests, "image_server_errors": server.errors,
+                "scene": image_client.calls, "scene_errors": image_client.errors,
+            },
+            "router_paths": dict(router),
+            "portrait_cache": portrait_cache.stats(),
+            "response_cache": response_cache.stats() if response_cache is not None else None,
+            "spans": process_tracer.summary(),
+        }
+
+
+def compare(baseline, current, tolerance):
+    """Print per-stage p50/p95 deltas; returns the stages whose p95 regressed beyond ``tolerance``"""
+    regressions = []
+    print(f"{'stage':18} {'p50 base':>10} {'p50 now':>10} {'p95 base':>10} {'p95 now':>10}  change")
+    for stage in STAGES:
+        before, after = baseline["stages"].get(stage), current["stages"].get(stage)
+        if not before or not after or not before.get("count") or not after.get("count"):
+            continue
+        change = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        flag = ""
+        if change > tolerance and after["p95_ms"] - before["p95_ms"] > 1:
+            flag = "  REGRESSION"
+            regressions.append(stage)
+        print(f"{stage:18} {before['p50_ms']:10.1f} {after['p50_ms']:10.1f} "
+              f"{before['p95_ms']:10.1f} {after['p95_ms']:10.1f}  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--image-latency-ms", type=float, default=800)
+    parser.add_argument("--image-jitter-ms", type=float, default=250)
+    parser.add_argument("--image-error-rate", type=float, default=0.05)
+    parser.add_argument("--scene-latency-ms", type=float, default=2000)
+    parser.add_argument("--unstructured-emotion", action="store_true",
+                        help="analyse emotion with a second model call instead of the reply header")
+    parser.add_argument("--no-response-cache", action="store_true", help="send every prompt to the stub model")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", metavar="BASELINE", help="previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95 increase per stage")
+    args = parser.parse_args()
+
+    results = run(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    for stage, stats in results["stages"].items():
+        if stats["count"]:
+            print(f"{stage:18} n={stats['count']:3}  p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms"
+                  f"  errors {stats['errors']}")
+    for node, totals in results["tokens"].items():
+        print(f"{node:18} calls {totals['calls']:3}  prompt tokens {totals['prompt_tokens']:6}"
+              f"  completion tokens {totals['completion_tokens']:5}")
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            sys.exit(f"p95 regressed for: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Replay scripted latency and failure patterns against one provider and a two-provider pool.
+
+Each scenario drives the same sequence of calls through the primary stub on
+its own and through a ProviderPool of the primary plus a steady secondary,
+then reports latency percentiles, errors, hedges and the final circuit state.
+
+    python benchmarks/provider_failover.py --calls 200 --mode invoke
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from provider_pool import CircuitBreaker, Provider, ProviderPool
+from stubs import LatencyProfile, ScriptedLatency, StubChatModel
+
+PROMPT = "Suspect 1 answers the detective: where were you at nine?"
+
+
+def scenarios(scale: float):
+    """Name -> (primary latency pattern, secondary latency profile)"""
+    ms = lambda value: value * scale
+    return {
+        # Every tenth call takes 20x longer than usual
+        "slow_tail": (ScriptedLatency([(ms(50), False)] * 9 + [(ms(1000), False)]),
+                      LatencyProfile(ms(70), ms(5), seed=1)),
+        # Forty fast failures in a row, e.g. a 5xx outage, then recovery
+        "outage": (ScriptedLatency([(ms(50), False)] * 40 + [(ms(5), True)] * 40 + [(ms(50), False)] * 40),
+                   LatencyProfile(ms(70), ms(5), seed=2)),
+        # The primary stops answering for a stretch of calls
+        "stall": (ScriptedLatency([(ms(50), False)] * 30 + [(ms(3000), False)] * 10 + [(ms(50), False)] * 30),
+                  LatencyProfile(ms(70), ms(5), seed=3)),
+    }
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def drive(model, calls: int, mode: str):
+    timings, errors = [], 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            if mode == "stream":
+                "".join(chunk.content for chunk in model.stream(PROMPT))
+            else:
+                model.invoke(PROMPT)
+        except Exception:
+            errors += 1
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": round(percentile(timings, 0.5), 1),
+        "p95_ms": round(percentile(timings, 0.95), 1),
+        "p99_ms": round(percentile(timings, 0.99), 1),
+        "max_ms": round(max(timings), 1),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=120)
+    parser.add_argument("--mode", choices=["invoke", "stream"], default="invoke")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every scripted delay")
+    parser.add_argument("--deadline", type=float, default=2.0, help="pool deadline in seconds")
+    parser.add_argument("--hedge-percentile", type=float, default=0.9)
+    parser.add_argument("--scenario", action="append", help="run only these scenarios")
+    args = parser.parse_args()
+
+    results = {}
+    for name, (primary_pattern, secondary_profile) in scenarios(args.scale).items():
+        if args.scenario and name not in args.scenario:
+            continue
+        single = drive(StubChatModel(ScriptedLatency(primary_pattern.steps)), args.calls, args.mode)
+        pool = ProviderPool(
+            [Provider("primary", StubChatModel(ScriptedLatency(primary_pattern.steps)),
+                      CircuitBreaker(failure_threshold=3, reset_seconds=0.5)),
+             Provider("secondary", StubChatModel(secondary_profile))],
+            deadline_seconds=args.deadline, hedge_percentile=args.hedge_percentile,
+            hedge_default_seconds=0.5, min_samples=5,
+        )
+        pooled = drive(pool, args.calls, args.mode)
+        pooled["providers"] = pool.stats()
+        results[name] = {"single": single, "pool": pooled}
+        print(f"{name:10s} single p50 {single['p50_ms']:7.1f} p95 {single['p95_ms']:7.1f} "
+              f"p99 {single['p99_ms']:7.1f} errors {single['errors']:3d} | "
+              f"pool p50 {pooled['p50_ms']:7.1f} p95 {pooled['p95_ms']:7.1f} "
+              f"p99 {pooled['p99_ms']:7.1f} errors {pooled['errors']:3d}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
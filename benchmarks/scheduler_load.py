@@ -0,0 +1,93 @@
+"""Measure interactive latency while background work floods a capacity-limited provider.
+
+A stub provider serves at most ``--capacity`` calls at once, like a quota.
+Interactive replies arrive at a steady rate while a burst of emotion,
+portrait and background calls is queued at the same time. The run is repeated
+with the scheduler off (every call goes straight to the provider) and on.
+
+    python benchmarks/scheduler_load.py --capacity 4 --background 60
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler
+from provider_pool import Provider, ProviderPool
+from scheduler import BACKGROUND, EMOTION, INTERACTIVE, PORTRAIT, PRIORITY_NAMES, Scheduler, run_at
+from stubs import LatencyProfile, StubChatModel
+
+PROMPT = "Suspect 1 answers the detective: where were you at nine?"
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))] if ordered else 0.0
+
+
+def run(enabled: bool, args) -> dict:
+    scheduler._scheduler = Scheduler({"stub": (args.rate, args.capacity)}, reserve=1, enabled=enabled)
+    model = StubChatModel(LatencyProfile(args.latency_ms, args.latency_ms / 10, seed=7), capacity=args.capacity)
+    pool = ProviderPool([Provider("stub", model)], deadline_seconds=120)
+    timings = {level: [] for level in range(len(PRIORITY_NAMES))}
+    lock = threading.Lock()
+
+    def call(level):
+        start = time.perf_counter()
+        run_at(level, pool.invoke, PROMPT)
+        with lock:
+            timings[level].append((time.perf_counter() - start) * 1000)
+
+    threads = []
+    # The burst: what a handful of new cases and emotion updates queue at once
+    for i in range(args.background):
+        level = (EMOTION, PORTRAIT, BACKGROUND, BACKGROUND)[i % 4]
+        threads.append(threading.Thread(target=call, args=(level,)))
+    for thread in threads:
+        thread.start()
+    for _ in range(args.interactive):
+        thread = threading.Thread(target=call, args=(INTERACTIVE,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(args.interval_ms / 1000)
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return {
+        "drain_seconds": round(time.perf_counter() - start, 2),
+        "classes": {
+            PRIORITY_NAMES[level]: {
+                "calls": len(samples),
+                "p50_ms": round(percentile(samples, 0.5), 1),
+                "p95_ms": round(percentile(samples, 0.95), 1),
+            }
+            for level, samples in timings.items() if samples
+        },
+        "scheduler": scheduler._scheduler.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacity", type=int, default=4, help="concurrent calls the provider serves")
+    parser.add_argument("--rate", type=float, default=0, help="scheduler rate limit, calls per second (0: none)")
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--background", type=int, default=60, help="queued non-interactive calls")
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--interval-ms", type=float, default=100, help="time between interactive calls")
+    args = parser.parse_args()
+
+    results = {"off": run(False, args), "on": run(True, args)}
+    for mode, result in results.items():
+        line = "  ".join(f"{name} p50 {row['p50_ms']:7.1f} p95 {row['p95_ms']:7.1f}"
+                         for name, row in result["classes"].items())
+        print(f"scheduler {mode:3s}: {line}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
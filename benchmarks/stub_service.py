@@ -0,0 +1,28 @@
+"""engine_service's ASGI app with the offline stubs installed, for load tests.
+
+Each worker process builds its own stubs on import, before the engine is
+created. Latencies come from the environment so ``engine_load.py`` can pass
+them through uvicorn to every worker; POLLINATIONS_URL should point at a
+running ``stubs.ImageServer``.
+
+    PYTHONPATH=.:benchmarks python engine_service.py --app stub_service:app --workers 4
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import providers
+from provider_pool import Provider, ProviderPool
+from stubs import LatencyProfile, StubChatModel, StubImageClient
+
+providers.install("chat_model", ProviderPool([Provider("gemini", StubChatModel(
+    LatencyProfile(float(os.getenv("STUB_LLM_LATENCY_MS", "300")), float(os.getenv("STUB_LLM_JITTER_MS", "60")),
+                   seed=os.getpid()),
+    tokens_per_second=float(os.getenv("STUB_TOKENS_PER_SECOND", "60")),
+))]))
+providers.install("image_client", StubImageClient(
+    LatencyProfile(float(os.getenv("STUB_SCENE_LATENCY_MS", "1000")), seed=os.getpid())
+))
+
+from engine_service import app  # noqa: E402,F401
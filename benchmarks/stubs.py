@@ -0,0 +1,278 @@
+"""Deterministic offline stand-ins for the chat model, the Gemini image client and Pollinations."""
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from types import SimpleNamespace
+
+from PIL import Image
+
+STUB_CASE = """Detective, the curator of the Halden Museum was found dead in the archive at midnight.
+The archive door was locked from the inside and a rare manuscript is missing.
+
+Suspect 1: Ada Marsh, night librarian. Motive: She was about to be dismissed. Access: She holds the archive keys. Suspicious Fact: She signed out at 11pm but her car stayed until 1am. Evidence: Her fingerprints are on the display case.
+Suspect 2: Victor Hale, art dealer. Motive: He owed the curator money. Access: He had an evening appointment. Suspicious Fact: He paid cash for a train ticket out of town. Evidence: A receipt from the museum cafe at 11:40pm.
+Suspect 3: Irene Cole, security guard. Motive: The curator reported her for sleeping on duty. Access: She controls the cameras. Suspicious Fact: The archive camera was off for twenty minutes. Evidence: Her radio log has a gap.
+Suspect 4: Tom Reyes, restorer. Motive: The curator took credit for his work. Access: His workshop adjoins the archive. Suspicious Fact: He cleaned his tools twice that night. Evidence: Solvent traces on the archive door handle.
+"""
+
+STUB_DOSSIERS = "### Crime\nThe curator was found dead in the locked archive and a manuscript is missing.\n\n" + "\n".join(
+    f"### Suspect {n}\nIdentity: Suspect {n} of the Halden case\nMotive: See the case file\n"
+    f"Access: See the case file\nKnows: Who was in the building\nHides: Where they were at midnight\n"
+    for n in range(1, 5)
+)
+
+STUB_ANSWERS = [
+    "I was in the reading room all evening, you can ask anyone.",
+    "The curator and I had our differences, but nothing worth killing over.",
+    "I heard footsteps near the archive a little before midnight.",
+    "I don't see why that matters. I told the officers everything already.",
+    "Fine. I went back for my coat, but the archive door was already shut.",
+]
+
+_EMOTION_CYCLE = ["nervous", "defensive", "neutral", "angry", "fearful"]
+_SUSPECT_RE = re.compile(r"suspect\s*(\d)", re.IGNORECASE)
+_ANSWER_LINE_RE = re.compile(r"^\s*Suspect (\d): (.+)$", re.MULTILINE)
+
+
+class LatencyProfile:
+    """Per-call delay drawn from a normal distribution, plus an independent failure rate"""
+
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """Return (delay in seconds, whether this call fails)"""
+        with self._lock:
+            delay = max(0.0, self._random.gauss(self.mean_ms, self.jitter_ms)) if self.jitter_ms else self.mean_ms
+            failed = self._random.random() < self.error_rate
+        return delay / 1000, failed
+
+    def describe(self) -> dict:
+        return {"mean_ms": self.mean_ms, "jitter_ms": self.jitter_ms, "error_rate": self.error_rate}
+
+
+class ScriptedLatency:
+    """Replays a fixed list of (delay_ms, fails) steps, cycling when it runs out.
+
+    Drop-in for LatencyProfile when a test needs an exact pattern, e.g. a slow
+    call every tenth request or a burst of failures.
+    """
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            delay_ms, failed = self.steps[self._index % len(self.steps)]
+            self._index += 1
+        return delay_ms / 1000, failed
+
+    def describe(self) -> dict:
+        return {"scripted_steps": len(self.steps),
+                "failures": sum(1 for _, failed in self.steps if failed),
+                "max_ms": max(delay for delay, _ in self.steps)}
+
+
+class StubChatModel:
+    """Chat model that answers each kind of app prompt with canned text after a sampled delay.
+
+    Supports the parts of the LangChain interface the app uses: ``invoke``,
+    ``stream``, ``batch`` and ``with_structured_output``.
+    """
+
+    model_name = "stub-chat"
+
+    def __init__(self, latency: LatencyProfile = None, tokens_per_second: float = 0.0, capacity: int = 0):
+        self.latency = latency or LatencyProfile()
+        self.tokens_per_second = tokens_per_second
+        # Provider-side concurrency quota: calls past it queue inside the "provider"
+        self._capacity = threading.Semaphore(capacity) if capacity else None
+        self._lock = threading.Lock()
+        self._turn = 0
+        self.calls = 0
+        self.errors = 0
+
+    def _wait(self):
+        delay, failed = self.latency.sample()
+        with self._lock:
+            self.calls += 1
+            if failed:
+                self.errors += 1
+        if self._capacity is not None:
+            with self._capacity:
+                time.sleep(delay)
+        else:
+            time.sleep(delay)
+        if failed:
+            raise RuntimeError("stub chat model: injected failure")
+
+    def respond(self, prompt) -> str:
+        text = str(prompt)
+        if "Emotional state:" in text:
+            return self._next(_EMOTION_CYCLE)
+        if "ROUTING INSTRUCTIONS" in text:
+            match = _SUSPECT_RE.search(text.split("CONVERSATION CONTEXT")[0])
+            return f"suspect{match.group(1)}" if match else "default"
+        if "evidence ledger" in text:
+            new = text.split("NEW CONVERSATION SINCE THE LAST UPDATE:")[-1]
+            facts = [f"FACT | suspect {n} | {answer.strip()}" for n, answer in _ANSWER_LINE_RE.findall(new)]
+            return "\n".join(facts) or "NONE"
+        if "### Crime" in text:
+            return STUB_DOSSIERS
+        if "Create a detective mystery" in text or "Rewrite this case briefing" in text:
+            return STUB_CASE
+        if "Imagine a detailed and immersive crime scene" in text:
+            return "A dim museum archive at midnight, an overturned chair and an empty display case."
+        answer = self._next(STUB_ANSWERS)
+        if "EMOTION: <emotion>" in text:
+            return f"EMOTION: {self._next(_EMOTION_CYCLE)}\n{answer}"
+        return answer
+
+    def _next(self, options):
+        with self._lock:
+            self._turn += 1
+            return options[self._turn % len(options)]
+
+    def invoke(self, prompt, config=None, **kwargs):
+        self._wait()
+        return SimpleNamespace(content=self.respond(prompt))
+
+    def stream(self, prompt, config=None, **kwargs):
+        self._wait()
+        text = self.respond(prompt)
+        for word in re.findall(r"\S+\s*", text):
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            yield SimpleNamespace(content=word)
+
+    def batch(self, prompts, config=None, return_exceptions=False, **kwargs):
+        """Run the prompts concurrently, like the LangChain default implementation"""
+        workers = (config or {}).get("max_concurrency") or len(prompts) or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.invoke, prompt) for prompt in prompts]
+        results = []
+        for future in futures:
+            if future.exception() is not None and return_exceptions:
+                results.append(future.exception())
+            else:
+                results.append(future.result())
+        return results
+
+    def with_structured_output(self, schema, **kwargs):
+        return _StructuredStub(self, schema)
+
+
+class _StructuredStub:
+    def __init__(self, model: StubChatModel, schema):
+        self.model = model
+        self.schema = schema
+
+    def invoke(self, prompt, config=None, **kwargs):
+        self.model._wait()
+        from case_model import Case
+        if self.schema is Case:
+            return Case.from_text(STUB_CASE)
+        raise NotImplementedError(f"stub has no structured answer for {self.schema!r}")
+
+
+def stub_png(size: int = 512, color=(92, 64, 51)) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (size, size), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class StubImageClient:
+    """Stands in for ``google.genai.Client`` when generating the crime scene"""
+
+    def __init__(self, latency: LatencyProfile = None):
+        self.latency = latency or LatencyProfile()
+        self.models = self
+        self._image = stub_png(1024, (40, 40, 48))
+        self.calls = 0
+        self.errors = 0
+
+    def generate_content(self, model=None, contents=None, config=None):
+        delay, failed = self.latency.sample()
+        self.calls += 1
+        time.sleep(delay)
+        if failed:
+            self.errors += 1
+            raise RuntimeError("stub image client: injected failure")
+        part = SimpleNamespace(text=None, inline_data=SimpleNamespace(data=self._image, mime_type="image/png"))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class ImageServer:
+    """Local HTTP stand-in for Pollinations; every GET returns the same PNG after a sampled delay.
+
+        with ImageServer(LatencyProfile(800, 200, 0.05)) as server:
+            os.environ["POLLINATIONS_URL"] = server.url
+    """
+
+    def __init__(self, latency: LatencyProfile = None, size: int = 512):
+        self.latency = latency or LatencyProfile()
+        self.image = stub_png(size)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/p/"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                delay, failed = server.latency.sample()
+                with server._lock:
+                    server.requests += 1
+                    if failed:
+                        server.errors += 1
+                time.sleep(delay)
+                if failed:
+                    self.send_error(503, "injected failure")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(server.image)))
+                self.end_headers()
+                try:
+                    self.wfile.write(server.image)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The caller gave up, e.g. a worker shutting down mid-fetch
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "ImageServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-pollinations", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,55 @@
+"""Compare interrogation turn latency with and without the structured emotion header.
+
+Runs suspect turns against a stubbed chat model with fixed per-call latency, so
+the difference comes only from the number of model round trips per turn.
+
+    python benchmarks/turn_latency.py --turns 20 --latency-ms 400
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent import Agent, AgentState
+from detective_engine import analyze_emotion
+from stubs import LatencyProfile, StubChatModel
+
+
+def run_turns(structured: bool, turns: int, latency_ms: float):
+    model = StubChatModel(LatencyProfile(latency_ms))
+    agent = Agent(model, structured_emotion=structured)
+    state = AgentState(case_details="Suspect 1: Ada, librarian.", discovered_info="", chat_history=[],
+                       user_input="", router_info="", dossiers={}, emotion=None)
+    timings = []
+    for i in range(turns):
+        question = f"Where were you at {i} o'clock?"
+        state["user_input"] = question
+        state["chat_history"].append({"role": "detective", "content": question})
+        start = time.perf_counter()
+        state = agent.suspect1(state)
+        emotion = state["emotion"]
+        if emotion is None:
+            emotion = asyncio.run(analyze_emotion(model, question, state["chat_history"][-1]["content"], "Ada"))
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, model.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    args = parser.parse_args()
+
+    for structured in (False, True):
+        timings, calls = run_turns(structured, args.turns, args.latency_ms)
+        label = "structured reply+emotion" if structured else "reply then analyze_emotion"
+        print(f"{label:28} mean {statistics.mean(timings):7.1f} ms  "
+              f"p95 {sorted(timings)[int(0.95 * (len(timings) - 1))]:7.1f} ms  model calls {calls}")
+
+
+if __name__ == "__main__":
+    main()
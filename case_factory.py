@@ -0,0 +1,246 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no lock file, so only one process should refill a pool there
+    fcntl = None
+
+from case_model import Case
+from scheduler import BACKGROUND, run_at
+
+CASE_FILE = "case.json"
+SCENE_FILE = "scene.img"
+PORTRAIT_FILE = "{}.img"
+LOCK_FILE = ".refill.lock"
+
+
+def build_case() -> dict:
+    """Build a complete case: text, parsed suspects, dossiers, portraits and scene"""
+    from agent import Agent, AgentState
+    from detective_engine import generate_crime_scene_image, generate_suspect_images
+    from providers import get_chat_model
+
+    state = Agent(get_chat_model()).mystery_generator(AgentState(
+        case_details="",
+        discovered_info="",
+        chat_history=[],
+        user_input="",
+        router_info="",
+        dossiers={},
+        emotion=None,
+        case=None
+    ))
+    suspect_descriptions = state["case"].descriptions()
+    return {
+        "case": state["case"],
+        "case_details": state["case_details"],
+        "dossiers": state["dossiers"],
+        "suspect_images": generate_suspect_images(suspect_descriptions),
+        "scene": generate_crime_scene_image(state["case_details"], suspect_descriptions),
+    }
+
+
+class CaseFactory:
+    """Keeps a pool of fully built cases on disk, shared by every session and process.
+
+    Cases are built into ``building/`` and published to ``ready/`` with an atomic
+    rename; ``pop`` claims one the same way, so two sessions never get the same case.
+    Every process runs a refill loop, but only the one holding the pool's lock file
+    checks the depth and builds, so together they stop at ``target_depth``.
+    """
+
+    def __init__(self, pool_dir: str, target_depth: int = 2, build: Callable[[], dict] = build_case):
+        self.pool_dir = pool_dir
+        self.target_depth = target_depth
+        self.build = build
+        self._ready_dir = os.path.join(pool_dir, "ready")
+        self._building_dir = os.path.join(pool_dir, "building")
+        self._claimed_dir = os.path.join(pool_dir, "claimed")
+        self._lock_path = os.path.join(pool_dir, LOCK_FILE)
+        for directory in (self._ready_dir, self._building_dir, self._claimed_dir):
+            os.makedirs(directory, exist_ok=True)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._build_seconds = deque(maxlen=20)
+        self._built_at = deque(maxlen=20)
+        self.counters = {"built": 0, "build_failures": 0, "served": 0, "misses": 0}
+
+    def start(self) -> "CaseFactory":
+        with self._lock:
+            if self._thread is None and self.target_depth > 0:
+                self._thread = threading.Thread(target=self._refill_loop, name="case-factory", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def request_refill(self):
+        self._wakeup.set()
+
+    def depth(self) -> int:
+        return len([name for name in os.listdir(self._ready_dir) if not name.startswith(".")])
+
+    @contextmanager
+    def _refill_lock(self):
+        """Hold the pool's lock file, shared by every process using ``pool_dir``; yields
+        False instead of waiting when another process holds it"""
+        if fcntl is None:
+            yield True
+            return
+        with open(self._lock_path, "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _clear_staging(self):
+        """Remove half-built cases; only the lock holder builds, so any left are from a process that died"""
+        for name in os.listdir(self._building_dir):
+            shutil.rmtree(os.path.join(self._building_dir, name), ignore_errors=True)
+
+    def _refill_loop(self):
+        while not self._stopped.is_set():
+            with self._refill_lock() as held:
+                needed = held and self.depth() < self.target_depth
+                if needed:
+                    self._clear_staging()
+                    built = self._build_one()
+            if not needed:
+                # Full, or another process is refilling it
+                self._wakeup.wait(timeout=30)
+                self._wakeup.clear()
+            elif not built:
+                # Back off so a failing provider is not hammered
+                self._stopped.wait(timeout=30)
+
+    def _build_one(self) -> bool:
+        start = time.perf_counter()
+        try:
+            # Pre-generation only gets capacity interactive sessions leave over
+            self._publish(run_at(BACKGROUND, self.build))
+        except Exception:
+            with self._lock:
+                self.counters["build_failures"] += 1
+            return False
+        with self._lock:
+            self.counters["built"] += 1
+            self._build_seconds.append(time.perf_counter() - start)
+            self._built_at.append(time.time())
+        return True
+
+    def _publish(self, built: dict):
+        name = f"{time.time():.6f}-{uuid.uuid4().hex}"
+        staging = os.path.join(self._building_dir, name)
+        os.makedirs(staging)
+        with open(os.path.join(staging, CASE_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "case": built["case"].model_dump(),
+                "case_details": built["case_details"],
+                "dossiers": built["dossiers"],
+                "suspect_ids": sorted(built["suspect_images"]),
+            }, f)
+        for suspect_id, data in built["suspect_images"].items():
+            with open(os.path.join(staging, PORTRAIT_FILE.format(suspect_id)), "wb") as f:
+                f.write(data)
+        if built.get("scene"):
+            with open(os.path.join(staging, SCENE_FILE), "wb") as f:
+                f.write(built["scene"])
+        os.rename(staging, os.path.join(self._ready_dir, name))
+
+    def pop(self) -> Optional[dict]:
+        """Claim the oldest ready case, or None when the pool is empty; always triggers a refill"""
+        self.request_refill()
+        for name in sorted(os.listdir(self._ready_dir)):
+            claimed = os.path.join(self._claimed_dir, name)
+            try:
+                os.rename(os.path.join(self._ready_dir, name), claimed)
+            except OSError:
+                # Another session claimed it first
+                continue
+            try:
+                built = self._load(claimed)
+            except (OSError, ValueError):
+                built = None
+            shutil.rmtree(claimed, ignore_errors=True)
+            if built is not None:
+                with self._lock:
+                    self.counters["served"] += 1
+                return built
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    @staticmethod
+    def _load(directory: str) -> dict:
+        with open(os.path.join(directory, CASE_FILE), encoding="utf-8") as f:
+            data = json.load(f)
+        suspect_images = {}
+        for suspect_id in data["suspect_ids"]:
+            path = os.path.join(directory, PORTRAIT_FILE.format(suspect_id))
+            if not os.path.exists(path):
+                # Pools built before portraits were stored compact
+                path = os.path.join(directory, f"{suspect_id}.png")
+            with open(path, "rb") as f:
+                suspect_images[suspect_id] = f.read()
+        scene = None
+        scene_path = os.path.join(directory, SCENE_FILE)
+        if os.path.exists(scene_path):
+            with open(scene_path, "rb") as f:
+                scene = f.read()
+        return {
+            "case": Case.model_validate(data["case"]),
+            "case_details": data["case_details"],
+            "dossiers": data["dossiers"],
+            "suspect_images": suspect_images,
+            "scene": scene,
+        }
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.counters)
+            build_seconds = list(self._build_seconds)
+            built_at = list(self._built_at)
+        stats["depth"] = self.depth()
+        stats["target_depth"] = self.target_depth
+        stats["avg_build_seconds"] = sum(build_seconds) / len(build_seconds) if build_seconds else 0.0
+        stats["last_build_seconds"] = build_seconds[-1] if build_seconds else 0.0
+        # Recent refill rate in cases per minute
+        if len(built_at) > 1 and built_at[-1] > built_at[0]:
+            stats["refill_per_minute"] = (len(built_at) - 1) * 60 / (built_at[-1] - built_at[0])
+        else:
+            stats["refill_per_minute"] = 0.0
+        return stats
+
+
+_factory = None
+_factory_lock = threading.Lock()
+
+
+def get_case_factory() -> CaseFactory:
+    """Process-wide case factory configured from CASE_POOL_DIR and CASE_POOL_SIZE"""
+    global _factory
+    with _factory_lock:
+        if _factory is None:
+            _factory = CaseFactory(
+                os.getenv("CASE_POOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "cases")),
+                target_depth=int(os.getenv("CASE_POOL_SIZE", "2")),
+            )
+        return _factory
@@ -0,0 +1,119 @@
+import re
+from typing import Dict, List
+
+from pydantic import BaseModel, Field
+
+SUSPECT_COUNT = 4
+
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4}
+_SUSPECT_HEADER_RE = re.compile(
+    r"^[\s*#>-]*(?:\d+\.\s*)?Suspect\s+(\d|one|two|three|four)\b[\s*]*[:.\-–]",
+    re.IGNORECASE | re.MULTILINE,
+)
+_FIELD_RE = re.compile(
+    r"(Motive|Access|Suspicious\s+Fact|Evidence)\s*\**\s*:\s*\**",
+    re.IGNORECASE,
+)
+_FIELD_NAMES = {"motive": "motive", "access": "access", "suspicious fact": "suspicious_fact", "evidence": "evidence"}
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text.replace("*", "")).strip(" .")
+
+
+class SuspectProfile(BaseModel):
+    """One suspect as laid out in the case briefing"""
+
+    number: int = Field(description="Suspect number, 1 to 4")
+    name: str = Field(description="Full name")
+    role: str = Field(description="Occupation or relationship to the victim")
+    motive: str = Field(description="Why they might have done it")
+    access: str = Field(description="Their access and opportunity")
+    suspicious_fact: str = Field(description="A fact that makes them look suspicious")
+    evidence: str = Field(description="Evidence pointing at them")
+
+    @property
+    def suspect_id(self) -> str:
+        return f"suspect{self.number}"
+
+    def description(self) -> str:
+        return (
+            f"Suspect {self.number}: {self.name}, {self.role}. Motive: {self.motive}. "
+            f"Access: {self.access}. Suspicious Fact: {self.suspicious_fact}. Evidence: {self.evidence}"
+        )
+
+
+class Case(BaseModel):
+    """A generated mystery: the crime plus four suspects"""
+
+    crime: str = Field(description="Case briefing describing the crime, addressed to the detective")
+    suspects: List[SuspectProfile] = Field(description="Exactly four suspects numbered 1 to 4")
+
+    def problems(self) -> List[str]:
+        """Validation issues that make the case unusable as-is; empty when valid"""
+        issues = []
+        if not self.crime.strip():
+            issues.append("the crime description is empty")
+        numbers = sorted(suspect.number for suspect in self.suspects)
+        if numbers != list(range(1, SUSPECT_COUNT + 1)):
+            issues.append(f"suspects must be numbered 1 to {SUSPECT_COUNT}, got {numbers}")
+        for suspect in self.suspects:
+            for field in ("name", "role", "motive", "access", "suspicious_fact", "evidence"):
+                if not getattr(suspect, field).strip():
+                    issues.append(f"suspect {suspect.number} is missing {field.replace('_', ' ')}")
+        return issues
+
+    def suspect(self, suspect_id: str) -> SuspectProfile:
+        for suspect in self.suspects:
+            if suspect.suspect_id == suspect_id:
+                return suspect
+        raise KeyError(suspect_id)
+
+    def descriptions(self) -> Dict[str, str]:
+        return {suspect.suspect_id: suspect.description() for suspect in self.suspects}
+
+    def briefing(self) -> str:
+        """Render the case in the original briefing text format used by prompts and the sidebar"""
+        return self.crime.strip() + "\n\n" + "\n".join(
+            suspect.description() for suspect in sorted(self.suspects, key=lambda s: s.number)
+        )
+
+    @classmethod
+    def from_text(cls, text: str) -> "Case":
+        """Parse a free-text briefing; fields that cannot be found are left empty"""
+        headers = list(_SUSPECT_HEADER_RE.finditer(text))
+        crime = text[:headers[0].start()] if headers else text
+        suspects = {}
+        for header, following in zip(headers, headers[1:] + [None]):
+            label = header.group(1).lower()
+            number = int(label) if label.isdigit() else _NUMBER_WORDS[label]
+            if number in suspects or not 1 <= number <= SUSPECT_COUNT:
+                continue
+            body = text[header.end():following.start() if following else len(text)]
+            suspects[number] = _parse_suspect(number, body)
+        return cls(crime=_clean_block(crime), suspects=[suspects[n] for n in sorted(suspects)])
+
+    def fill_missing(self) -> "Case":
+        """Return a copy padded with placeholder suspects so consumers always see four"""
+        present = {suspect.number for suspect in self.suspects}
+        padding = [
+            SuspectProfile(number=n, name=f"Suspect {n}", role="Unknown details", motive="Unknown",
+                           access="Unknown", suspicious_fact="Unknown", evidence="Unknown")
+            for n in range(1, SUSPECT_COUNT + 1) if n not in present
+        ]
+        return Case(crime=self.crime, suspects=sorted(self.suspects + padding, key=lambda s: s.number))
+
+
+def _clean_block(text: str) -> str:
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+def _parse_suspect(number: int, body: str) -> SuspectProfile:
+    fields = {"motive": "", "access": "", "suspicious_fact": "", "evidence": ""}
+    matches = list(_FIELD_RE.finditer(body))
+    identity = body[:matches[0].start()] if matches else body
+    for match, following in zip(matches, matches[1:] + [None]):
+        name = _FIELD_NAMES[re.sub(r"\s+", " ", match.group(1).lower())]
+        fields[name] = _clean(body[match.end():following.start() if following else len(body)])
+    name, _, role = _clean(identity).partition(",")
+    return SuspectProfile(number=number, name=name.strip(), role=role.strip(), **fields)
@@ -0,0 +1,131 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from langgraph.graph import END
+
+_NUMBER_WORDS = {
+    "1": "1", "one": "1", "first": "1", "1st": "1",
+    "2": "2", "two": "2", "second": "2", "2nd": "2",
+    "3": "3", "three": "3", "third": "3", "3rd": "3",
+    "4": "4", "four": "4", "fourth": "4", "4th": "4",
+}
+
+_EXIT_RE = re.compile(r"^\s*(?:exit|quit)\s*[.!]*\s*$", re.IGNORECASE)
+# Only a whole-message command: "new case" inside a question to a suspect must not discard the case
+_MYSTERY_RE = re.compile(
+    r"^\s*(?:(?:generate|create|start)\s+(?:a\s+)?(?:new\s+)?|new\s+)(?:mystery|case)\s*[.!]*\s*$",
+    re.IGNORECASE,
+)
+_SOLUTION_RE = re.compile(
+    r"\b(?:solution\s+check|check\s+(?:my\s+|the\s+)?solution)\b",
+    re.IGNORECASE,
+)
+_SUSPECT_RE = re.compile(
+    r"\bsuspect\s*(?:#|no\.?\s*|number\s+)?([1-4]|one|two|three|four)\b"
+    r"|\b(first|second|third|fourth|1st|2nd|3rd|4th)\s+suspect\b",
+    re.IGNORECASE,
+)
+# Only a leading address: "did everyone leave by ten?" is an ordinary follow-up
+_GROUP_RE = re.compile(
+    r"^\s*(?:(?:all|every|each)\s+(?:of\s+)?(?:the\s+|you\s+)?suspects|everyone|all\s+of\s+you"
+    r"|group(?:\s+(?:interrogation|question))?)\b",
+    re.IGNORECASE,
+)
+_HELP_RE = re.compile(r"^\s*(?:help|hints?)\b", re.IGNORECASE)
+# Free text that reads like a request to the assistant rather than a follow-up
+# question for the suspect; leave these to the LLM router.
+_ASSISTANT_HINT_RE = re.compile(
+    r"\b(?:help|hints?|clues?|summar(?:y|ise|ize)|recap|assistant|theory|suspects)\b",
+    re.IGNORECASE,
+)
+
+
+def _last_turn_route(chat_history: List[dict]) -> Optional[str]:
+    """Route that produced the replies since the last detective message; "group" if several suspects answered"""
+    speakers = []
+    for message in reversed(chat_history or []):
+        role = message.get("role", "")
+        if role in ("detective", "user"):
+            if speakers:
+                break
+            continue
+        speakers.append(role)
+    suspects = {role for role in speakers if role.startswith("suspect")}
+    if len(suspects) > 1:
+        return "group"
+    if speakers and speakers[0].startswith("suspect"):
+        return speakers[0].replace(" ", "")
+    return None
+
+
+def fast_route(user_input: str, chat_history: List[dict]) -> Optional[str]:
+    """Resolve common commands locally; return None when the LLM should decide"""
+    text = user_input or ""
+
+    if _EXIT_RE.match(text):
+        return END
+    # A message that opens with a command is that command, even if it names a suspect,
+    # e.g. "solution check: suspect 3 did it" or "help me with suspect 3"
+    if _SOLUTION_RE.match(text.lstrip()):
+        return "solution"
+    if _HELP_RE.match(text):
+        return "default"
+
+    # Otherwise an explicitly addressed suspect wins over any command words in the question
+    suspects = {
+        _NUMBER_WORDS[(match.group(1) or match.group(2)).lower()]
+        for match in _SUSPECT_RE.finditer(text)
+    }
+    if len(suspects) == 1:
+        return f"suspect{suspects.pop()}"
+
+    if _MYSTERY_RE.match(text):
+        return "mysterygen"
+    if _SOLUTION_RE.search(text):
+        return "solution"
+
+    if _GROUP_RE.match(text):
+        return "group"
+
+    if suspects:
+        # Several suspects named in one message, e.g. "suspect 1, what about suspect 2?"
+        return None
+
+    # Follow-ups continue with whoever answered last, including a whole group
+    last_route = _last_turn_route(chat_history)
+    if last_route and not _ASSISTANT_HINT_RE.search(text):
+        return last_route
+
+    return None
+
+
+class RouterStats:
+    """Counts which routing path handled each turn and how long it took"""
+
+    def __init__(self):
+        self.calls = {"fast": 0, "llm": 0}
+        self.total_ms = {"fast": 0.0, "llm": 0.0}
+        self.last: Optional[Tuple[str, str, float]] = None
+
+    def record(self, route: str, path: str, elapsed_ms: float):
+        self.calls[path] += 1
+        self.total_ms[path] += elapsed_ms
+        self.last = (route, path, elapsed_ms)
+
+    def average_ms(self, path: str) -> float:
+        return self.total_ms[path] / self.calls[path] if self.calls[path] else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        total = self.calls["fast"] + self.calls["llm"]
+        saved_per_turn = max(self.average_ms("llm") - self.average_ms("fast"), 0.0)
+        return {
+            "turns": total,
+            "fast_hits": self.calls["fast"],
+            "llm_calls": self.calls["llm"],
+            "hit_rate": self.calls["fast"] / total if total else 0.0,
+            "fast_avg_ms": self.average_ms("fast"),
+            "llm_avg_ms": self.average_ms("llm"),
+            "saved_ms_per_fast_turn": saved_per_turn,
+            "saved_ms_total": saved_per_turn * self.calls["fast"],
+        }
+
@@ -0,0 +1,125 @@
+import re
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+GLOBAL = "global"
+
+ROLE_LABELS = {
+    "detective": "Detective",
+    "user": "Detective",
+    "assistant": "Assistant",
+    "analysis": "Case Analysis",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for budgeting"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _format_message(message: dict) -> str:
+    role = message.get("role", "")
+    label = ROLE_LABELS.get(role, role.title())
+    return f"{label}: {message.get('content', '')}"
+
+
+def extractive_summary(summary: str, folded: List[str], max_chars: int = 160) -> str:
+    """Fold turns into the summary by keeping the first sentence of each one"""
+    lines = [summary] if summary else []
+    for line in folded:
+        first_sentence = _SENTENCE_END_RE.split(line.strip(), maxsplit=1)[0]
+        if len(first_sentence) > max_chars:
+            first_sentence = first_sentence[:max_chars].rstrip() + "..."
+        lines.append(first_sentence)
+    return "\n".join(lines)
+
+
+class _Transcript:
+    def __init__(self, token_budget: int, recent_turns: int, summarizer):
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.summarizer = summarizer
+        self.summary = ""
+        self.recent = deque()
+
+    def _tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(line) for line in self.recent)
+
+    def add(self, line: str):
+        self.recent.append(line)
+        folded = []
+        while len(self.recent) > self.recent_turns or (len(self.recent) > 1 and self._tokens() > self.token_budget):
+            folded.append(self.recent.popleft())
+        if folded:
+            self.summary = self.summarizer(self.summary, folded)
+            self._trim_summary()
+
+    def _trim_summary(self):
+        # The summary may use at most a third of the budget; drop its oldest lines first
+        limit = self.token_budget // 3
+        lines = self.summary.split("\n")
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > limit:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+
+    def render(self) -> str:
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        if self.recent:
+            parts.append("Recent conversation:\n" + "\n".join(self.recent))
+        return "\n\n".join(parts) if parts else "No conversation yet."
+
+
+class ConversationMemory:
+    """Global and per-suspect transcripts kept under a token budget.
+
+    The last ``recent_turns`` lines stay verbatim; older ones are folded into a
+    running summary. ``sync`` only processes messages added since the last call.
+    """
+
+    def __init__(self, token_budget: int = 1200, recent_turns: int = 8,
+                 summarizer: Optional[Callable[[str, List[str]], str]] = None):
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.summarizer = summarizer or extractive_summary
+        self.reset()
+
+    def reset(self):
+        self._transcripts: Dict[str, _Transcript] = {}
+        self._seen = 0
+        self._pending_question = None
+        self._answered = set()
+
+    def _transcript(self, key: str) -> _Transcript:
+        if key not in self._transcripts:
+            self._transcripts[key] = _Transcript(self.token_budget, self.recent_turns, self.summarizer)
+        return self._transcripts[key]
+
+    def sync(self, chat_history: List[dict]):
+        if len(chat_history) < self._seen:
+            # History was cleared or replaced, e.g. a new case
+            self.reset()
+        for message in chat_history[self._seen:]:
+            line = _format_message(message)
+            self._transcript(GLOBAL).add(line)
+            role = message.get("role", "")
+            if role in ("detective", "user"):
+                self._pending_question = line
+                self._answered = set()
+            elif role.startswith("suspect"):
+                suspect = self._transcript(role)
+                # A group question is answered by several suspects; each transcript gets it once
+                if self._pending_question and role not in self._answered:
+                    suspect.add(self._pending_question)
+                    self._answered.add(role)
+                suspect.add(line)
+        self._seen = len(chat_history)
+
+    def context(self, key: str = GLOBAL) -> str:
+        """Budgeted context for the global transcript or one suspect (e.g. "suspect 2")"""
+        if key not in self._transcripts:
+            return "No conversation yet."
+        return self._transcripts[key].render()
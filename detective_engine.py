@@ -1,44 +1,47 @@
-from typing import Dict
+from typing import Dict, Optional
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
-import requests
-import re
+from concurrent.futures import ThreadPoolExecutor, wait
+import contextvars
 import os
 import asyncio
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_together import ChatTogether
-import google.generativeai as genai
+import time
+from portrait_cache import PortraitCache
+from sprite_sheet import SpriteSheet
+from emotions import EMOTION_PRIORITY, EMOTION_RE
+from case_model import Case
+from session_log import DEBUG, INFO, WARNING, current_log
+from conversation_memory import estimate_tokens
+from tracing import span
+from render_cache import compact_image
+from scheduler import BACKGROUND, EMOTION, PORTRAIT, get_scheduler, priority, run_at
+from providers import MissingCredentials, get_chat_model, get_http_session, get_image_client
 from dotenv import load_dotenv
 import streamlit as st
-from google import genai
-from google.genai import types
-import base64
 
 # Load environment variables
 load_dotenv()
 
 def initialize_llm():
-    """Initialize the LLM based on available API keys"""
-    if os.getenv("GEMINI_API_KEY"):
-        return ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            temperature=0,
-            max_tokens=None,
-            timeout=None,
-            max_retries=2,
-            api_key=os.getenv("GEMINI_API_KEY")
-        )
-    elif os.getenv("TOGETHER_API_KEY"):
-        return ChatTogether(
-            model="meta-llama/Llama-3.3-70B-Instruct-Turbo-Free",
-            together_api_key=os.getenv("TOGETHER_API_KEY")
-        )
-    else:
-        import streamlit as st
-        st.error("No API keys found. Please set GEMINI_API_KEY or TOGETHER_API_KEY in your .env file.")
+    """Return the shared LLM for the available API keys"""
+    try:
+        return get_chat_model()
+    except MissingCredentials as e:
+        st.error(str(e))
         st.stop()
 
-llm= initialize_llm()
+POLLINATIONS_URL = os.getenv("POLLINATIONS_URL", "https://pollinations.ai/p/")
+
+portrait_cache = PortraitCache(
+    os.getenv("PORTRAIT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "portraits")),
+    max_disk_bytes=int(os.getenv("PORTRAIT_CACHE_MAX_MB", "256")) * 1024 * 1024,
+)
+
+def _log(level: int, message: str, *args):
+    """Write to the current session's debug log; a no-op outside a session"""
+    session_log = current_log()
+    if session_log is not None:
+        session_log.log(level, message, *args)
 
 def create_placeholder_image(suspect_id: str, description: str = "") -> Image.Image:
     """Create a placeholder image with suspect ID and optional description"""
@@ -60,75 +63,79 @@ def create_placeholder_image(suspect_id: str, description: str = "") -> Image.Im
         )
         return img
     except Exception as e:
-        import streamlit as st
-        st.session_state.debug_log.append(f"Placeholder creation failed for {suspect_id}: {str(e)}")
+        _log(WARNING, "Placeholder creation failed for %s: %s", suspect_id, e)
         return Image.new('RGB', (300, 400), color=(50, 50, 50))
 
+def fetch_image_bytes(prompt: str, timeout_seconds: float = 15, base_url: Optional[str] = None) -> bytes:
+    """Fetch raw image bytes from Pollinations AI through the portrait cache; raises on failure"""
+    url = f"{base_url or POLLINATIONS_URL}{prompt}"
+
+    with span("image", "portrait") as call:
+        # Stays "cached" unless the cache has to go upstream
+        call.outcome = "cached"
+
+        def fetch():
+            call.outcome = "ok"
+            with get_scheduler().slot("pollinations"):
+                response = get_http_session().get(url, timeout=timeout_seconds)
+            response.raise_for_status()
+            return response.content
+
+        data = portrait_cache.get_or_fetch(portrait_cache.key(prompt, base_url=base_url or POLLINATIONS_URL), fetch)
+        call.bytes = len(data)
+    return data
+
 def download_image(prompt: str, timeout_seconds: int = 15) -> Image.Image:
     """Download an image from Pollinations AI and return as PIL Image"""
     try:
-        url = f"https://pollinations.ai/p/{prompt}"
-        response = requests.get(url, timeout=timeout_seconds)
-        response.raise_for_status()
-        return Image.open(BytesIO(response.content))
+        return Image.open(BytesIO(fetch_image_bytes(prompt, timeout_seconds)))
     except Exception as e:
-        import streamlit as st
-        st.session_state.debug_log.append(f"Pollinations AI failed for prompt '{prompt[:50]}...': {str(e)}")
+        _log(WARNING, "Pollinations AI failed for prompt '%s...': %s", prompt[:50], e)
         return None
 
 def parse_suspect_descriptions(case_details: str) -> Dict[str, str]:
-    """Parse suspect descriptions from case details with flexible matching"""
-    suspect_descriptions = {}
-    current_suspect = None
-    current_description = []
-    lines = case_details.split('\n')
-    for line in lines:
-        match = re.match(r'(?:Suspect\s+(\d+)|(?:\d+\.\s*Suspect)|Suspect\s+(One|Two|Three|Four)):', line, re.IGNORECASE)
-        if match:
-            if current_suspect:
-                suspect_descriptions[current_suspect] = ' '.join(current_description)
-                current_description = []
-            if match.group(1):
-                current_suspect = f"suspect{match.group(1)}"
-            elif match.group(2):
-                number_map = {'One': '1', 'Two': '2', 'Three': '3', 'Four': '4'}
-                current_suspect = f"suspect{number_map.get(match.group(2).capitalize(), '1')}"
-            current_description.append(line)
-        elif current_suspect and line.strip():
-            current_description.append(line.strip())
-    if current_suspect:
-        suspect_descriptions[current_suspect] = ' '.join(current_description)
-    if not suspect_descriptions:
-        for i in range(1, 5):
-            suspect_descriptions[f"suspect{i}"] = f"Suspect {i}: Unknown details"
-    return suspect_descriptions
-
-def generate_suspect_images(case_details: str) -> Dict[str, Image.Image]:
-    """Generate images for each suspect using Pollinations AI or placeholders"""
-    import streamlit as st
+    """Parse suspect descriptions from free-text case details; prefer Case.descriptions when a Case exists"""
+    return Case.from_text(case_details).fill_missing().descriptions()
+
+def _fetch_portrait(prompt: str, timeout_seconds: float, base_url: Optional[str]) -> bytes:
+    # Only compact display-sized bytes outlive this call, never the full-size bitmap
+    return compact_image(fetch_image_bytes(prompt, timeout_seconds, base_url))
+
+def generate_suspect_images(suspect_descriptions: Dict[str, str], timeout_seconds: float = 15,
+                            deadline_seconds: float = 20, base_url: Optional[str] = None) -> Dict[str, bytes]:
+    """Generate compact portrait bytes for each suspect concurrently, using placeholders for failures and stragglers"""
     suspect_images = {f"suspect{i}": None for i in range(1, 5)}
-    suspect_descriptions = parse_suspect_descriptions(case_details)
-    
-    st.session_state.debug_log.append(f"Raw case_details: {case_details[:200]}...")
-    st.session_state.debug_log.append(f"Parsed descriptions: {suspect_descriptions}")
     
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=len(suspect_images), thread_name_prefix="portrait")
+    futures = {}
     for suspect_id in suspect_images:
         description = suspect_descriptions.get(suspect_id, "")
         prompt = f"realistic detective graphic novel illustration stylen potrait style of a character: {description}"
-        st.session_state.debug_log.append(f"Generating image for {suspect_id} with prompt: {prompt[:100]}...")
-        image = download_image(prompt)
-        if image:
-            suspect_images[suspect_id] = image
-            st.session_state.debug_log.append(f"Pollinations AI image generated for {suspect_id}")
+        _log(DEBUG, "Generating image for %s with prompt: %s...", suspect_id, prompt[:100])
+        # Run in a copy of this context so the fetch spans land in the session's tracer
+        futures[suspect_id] = executor.submit(contextvars.copy_context().run, _fetch_portrait, prompt, timeout_seconds, base_url)
+    
+    done, _ = wait(futures.values(), timeout=deadline_seconds)
+    executor.shutdown(wait=False, cancel_futures=True)
+    
+    for suspect_id, future in futures.items():
+        description = suspect_descriptions.get(suspect_id, "")
+        if future in done and future.exception() is None:
+            suspect_images[suspect_id] = future.result()
+            _log(INFO, "Pollinations AI image generated for %s", suspect_id)
         else:
-            suspect_images[suspect_id] = create_placeholder_image(suspect_id, description)
-            st.session_state.debug_log.append(f"Used placeholder for {suspect_id}")
+            reason = future.exception() if future in done else f"missed {deadline_seconds}s batch deadline"
+            _log(WARNING, "Pollinations AI failed for %s: %s", suspect_id, reason)
+            suspect_images[suspect_id] = compact_image(create_placeholder_image(suspect_id, description))
+            _log(INFO, "Used placeholder for %s", suspect_id)
     
-    st.session_state.debug_log.append(f"Final suspect_images: { {k: 'Image present' if v else 'No image' for k, v in suspect_images.items()} }")
+    _log(INFO, "Portrait batch finished in %.2fs", time.perf_counter() - start)
     
     return suspect_images
 
-def generate_crime_scene_image(case_details: str,suspect_descriptions: str) -> Image.Image:
+def generate_crime_scene_image(case_details: str, suspect_descriptions: Dict[str, str]) -> Optional[bytes]:
+    """Generate the crime scene with Gemini and return the encoded image bytes, or None on failure"""
     prompt = f"""
     Imagine a detailed and immersive crime scene as described in the following case details:
     {case_details}
@@ -137,33 +144,36 @@ def generate_crime_scene_image(case_details: str,suspect_descriptions: str) -> I
     {suspect_descriptions}
 
     """
-    scene_prompt = llm.invoke(prompt)
-
-    client = genai.Client(
-        api_key=os.getenv("GEMINI_API_KEY")
-    )
+    try:
+        with span("llm", "scene_prompt") as call:
+            call.prompt_tokens = estimate_tokens(prompt)
+            scene_prompt = get_chat_model().invoke(prompt).content
+            call.completion_tokens = estimate_tokens(scene_prompt)
+        _log(DEBUG, "Generating crime scene with prompt: %s...", scene_prompt)
 
-    contents = (f"{scene_prompt}")
+        from google.genai import types
+        with span("image", "scene") as call:
+            with get_scheduler().slot("gemini-image"):
+                response = get_image_client().models.generate_content(
+                    model="gemini-2.0-flash-exp-image-generation",
+                    contents=scene_prompt,
+                    config=types.GenerateContentConfig(
+                    response_modalities=['TEXT', 'IMAGE']
+                    )
+                )
+            for part in response.candidates[0].content.parts:
+                if part.text is not None:
+                    _log(DEBUG, "Crime scene model text: %s", part.text)
+                elif part.inline_data is not None:
+                    call.bytes = len(part.inline_data.data)
+                    return part.inline_data.data
+            call.outcome = "empty"
+    except Exception as e:
+        _log(WARNING, "Crime scene generation failed: %s", e)
+        return None
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-exp-image-generation",
-        contents=contents,
-        config=types.GenerateContentConfig(
-        response_modalities=['TEXT', 'IMAGE']
-        )
-    )
-    for part in response.candidates[0].content.parts:
-        if part.text is not None:
-            print(part.text)
-        elif part.inline_data is not None:
-            image = Image.open(BytesIO((part.inline_data.data)))
-            scene_image = image.save('gemini-native-image.png')
-            
-    result = llm.invoke(prompt)
-    scene_prompt = result.content
-    import streamlit as st
-    st.session_state.debug_log.append(f"Generating crime scene with prompt: {scene_prompt}...")
-    return scene_image
+    _log(WARNING, "Crime scene response contained no image")
+    return None
 
 async def analyze_emotion(llm, user_input: str, suspect_response: str, suspect_description: str) -> str:
     """Use LLM to analyze the appropriate emotional expression based on conversation context"""
@@ -180,41 +190,65 @@ async def analyze_emotion(llm, user_input: str, suspect_response: str, suspect_d
     Emotional state: 
     """
     
-    try:
-        # For ChatGoogleGenerativeAI
-        if hasattr(llm, 'invoke'):
-            response = llm.invoke(prompt).content
-        # Fallback for direct API calls
-        elif os.getenv("GEMINI_API_KEY"):
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(prompt).text
-        else:
-            # If no LLM is available, fall back to a simple analysis
-            return "neutral"
-        
-        # Extract just the emotion word
-        emotion_match = re.search(r'(nervous|defensive|guilty|fearful|suspicious|confident|neutral|angry|surprised|sad|smug)', 
-                                 response.lower())
-        if emotion_match:
-            return emotion_match.group(1)
-        else:
+    with span("llm", "emotion") as call, priority(EMOTION):
+        call.prompt_tokens = estimate_tokens(prompt)
+        try:
+            # For ChatGoogleGenerativeAI
+            if hasattr(llm, 'invoke'):
+                response = llm.invoke(prompt).content
+            # Fallback for direct API calls
+            elif os.getenv("GEMINI_API_KEY"):
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                model = genai.GenerativeModel('gemini-1.5-flash')
+                response = model.generate_content(prompt).text
+            else:
+                # If no LLM is available, fall back to a simple analysis
+                call.outcome = "skipped"
+                return "neutral"
+            call.completion_tokens = estimate_tokens(response)
+            
+            # Extract just the emotion word
+            emotion_match = EMOTION_RE.search(response.lower())
+            if emotion_match:
+                return emotion_match.group(1)
+            else:
+                return "neutral"
+        except Exception as e:
+            call.outcome = "error"
+            call.error = f"{type(e).__name__}: {e}"
+            _log(WARNING, "LLM emotion analysis failed: %s", e)
             return "neutral"
-    except Exception as e:
-        import streamlit as st
-        st.session_state.debug_log.append(f"LLM emotion analysis failed: {str(e)}")
-        return "neutral"
 
-def update_suspect_expression(suspect_id: str, emotion: str, description: str) -> Image.Image:
-    """Generate updated image for suspect with specific emotional expression"""
-    prompt = f"detailed portrait of a {emotion} character in detective noir style: {description[:100]}"
-    
-    import streamlit as st
-    st.session_state.debug_log.append(f"Updating {suspect_id} expression to '{emotion}' with prompt: {prompt[:100]}...")
+def expression_prompt(emotion: str, description: str) -> str:
+    return f"detailed portrait of a {emotion} character in detective noir style: {description[:100]}"
+
+def start_sprite_prerender(suspect_descriptions: Dict[str, str], timeout_seconds: float = 15) -> SpriteSheet:
+    """Start pre-rendering every emotion portrait for every suspect in the background"""
+    jobs = [
+        (suspect_id, emotion, expression_prompt(emotion, description))
+        for emotion in EMOTION_PRIORITY
+        for suspect_id, description in suspect_descriptions.items()
+    ]
+    _log(INFO, "Pre-rendering %d emotion sprites", len(jobs))
+    return SpriteSheet(jobs, lambda prompt: run_at(BACKGROUND, _fetch_portrait, prompt, timeout_seconds, None)).start()
+
+def update_suspect_expression(suspect_id: str, emotion: str, description: str,
+                              sprites: Optional[SpriteSheet] = None) -> bytes:
+    """Return compact portrait bytes for the suspect with a specific emotional expression"""
+    if sprites is not None:
+        sprite = sprites.get(suspect_id, emotion)
+        if sprite is not None:
+            _log(INFO, "Updating %s expression to '%s' from pre-rendered sprite", suspect_id, emotion)
+            return sprite
+
+    prompt = expression_prompt(emotion, description)
+    _log(INFO, "Updating %s expression to '%s' with prompt: %s...", suspect_id, emotion, prompt[:100])
     
-    updated_image = download_image(prompt)
-    if not updated_image:
-        # If download fails, create a placeholder with emotion text
-        updated_image = create_placeholder_image(suspect_id, f"{emotion} - {description[:50]}")
-        
-    return updated_image
\ No newline at end of file
+    try:
+        with priority(PORTRAIT):
+            return compact_image(fetch_image_bytes(prompt))
+    except Exception as e:
+        _log(WARNING, "Pollinations AI failed for prompt '%s...': %s", prompt[:50], e)
+    # If download fails, create a placeholder with emotion text
+    return compact_image(create_placeholder_image(suspect_id, f"{emotion} - {description[:50]}"))
@@ -0,0 +1,52 @@
+import re
+from typing import Optional, Tuple
+
+EMOTIONS = ("nervous", "defensive", "guilty", "fearful", "suspicious", "confident",
+            "neutral", "angry", "surprised", "sad", "smug")
+# Most frequent analyze_emotion results first, so pre-rendering covers them early
+EMOTION_PRIORITY = ("nervous", "defensive", "neutral", "suspicious", "fearful", "guilty",
+                    "confident", "angry", "surprised", "sad", "smug")
+
+EMOTION_RE = re.compile(r"(" + "|".join(EMOTIONS) + r")")
+_EMOTION_HEADER_RE = re.compile(r"^\s*\**\s*emotion\s*\**\s*:\s*\**\s*([a-z]+)\**\s*$", re.IGNORECASE)
+
+
+def split_emotion_header(text: str) -> Tuple[Optional[str], str]:
+    """Split a leading "EMOTION: <word>" line off a reply; emotion is None if it is missing or unknown"""
+    first_line, _, rest = text.lstrip().partition("\n")
+    match = _EMOTION_HEADER_RE.match(first_line)
+    if not match:
+        return None, text
+    emotion = match.group(1).lower()
+    return (emotion if emotion in EMOTIONS else None), rest.lstrip()
+
+
+class EmotionHeaderFilter:
+    """Token sink wrapper that holds back the "EMOTION:" header line while streaming"""
+
+    def __init__(self, on_token, max_header_chars: int = 60):
+        self.on_token = on_token
+        self.max_header_chars = max_header_chars
+        self._buffer = ""
+        self._passthrough = False
+
+    def __call__(self, token: str):
+        if self._passthrough:
+            self.on_token(token)
+            return
+        self._buffer += token
+        if "\n" not in self._buffer.lstrip() and len(self._buffer) < self.max_header_chars:
+            return
+        self._passthrough = True
+        _, reply = split_emotion_header(self._buffer)
+        if reply:
+            self.on_token(reply)
+
+    def flush(self):
+        """Emit whatever is still held back once the stream has ended, e.g. a short reply without a header"""
+        if self._passthrough or not self._buffer:
+            return
+        self._passthrough = True
+        _, reply = split_emotion_header(self._buffer)
+        if reply:
+            self.on_token(reply)
@@ -0,0 +1,674 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+from langgraph.graph import END
+
+import tracing
+from agent import Agent, AgentState
+from artifact_store import ArtifactStore
+from case_factory import get_case_factory
+from detective_engine import (
+    analyze_emotion,
+    generate_crime_scene_image,
+    generate_suspect_images,
+    portrait_cache,
+    start_sprite_prerender,
+    update_suspect_expression,
+)
+from evidence_ledger import CONTRADICTION, EvidenceLedger
+from providers import get_chat_model
+from render_cache import COMPACT_MIME, PORTRAIT_WIDTH, SCENE_WIDTH, compact_image, decoded_size
+from response_cache import get_response_cache
+from scheduler import BACKGROUND, get_scheduler, run_at
+from session_log import DEBUG, INFO, SessionLog, use_log
+from session_store import get_session_store
+from session_worker import SessionWorker
+from tracing import Tracer, process_tracer, use_tracer
+
+TEST_EMOTIONS = ["nervous", "defensive", "guilty", "fearful", "suspicious", "confident"]
+WELCOME = "Case file generated. What would you like to do next, Detective?"
+_SESSION_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+
+class UnknownSession(KeyError):
+    """Raised for a session id the session store has never seen"""
+
+
+class NoCaseInProgress(RuntimeError):
+    """Raised for a turn sent before a case was started"""
+
+
+def artifact_version(data: bytes) -> str:
+    """Content hash, so every worker names the same image the same way"""
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def refresh_suspect_expression(llm, sprite_sheet, suspect_id, user_input, suspect_response, description, emotion=None):
+    """Background job: pick the suspect's emotion if the reply did not carry one, then fetch the portrait"""
+    if emotion is None:
+        emotion = asyncio.run(analyze_emotion(llm, user_input, suspect_response, description))
+    image = update_suspect_expression(suspect_id, emotion, description, sprite_sheet)
+    return emotion, image
+
+
+class EngineSession:
+    """One game: the agent, its case and transcript, images and background jobs.
+
+    Every public method takes the session lock, so one session runs one
+    operation at a time while other sessions on the same engine run freely.
+    Changes are written to the session store when each operation finishes.
+    """
+
+    def __init__(self, session_id: str, store, llm):
+        self.session_id = session_id
+        self.store = store
+        self.llm = llm
+        self.agent = Agent(llm, response_cache=get_response_cache())
+        # The engine passes turns in; the agent never prompts for input itself
+        self.agent.get_input = lambda state: state
+        self.case_details = ""
+        self.case = None
+        self.chat_history: List[dict] = []
+        self.state_tracker = None
+        self.case_started = False
+        self.concluded = False
+        # Suspect id -> artifact name of the current portrait
+        self.suspect_images: Dict[str, str] = {}
+        self.artifacts = ArtifactStore(
+            spill_dir=os.getenv("ARTIFACT_SPILL_DIR"),
+            budget_bytes=int(float(os.getenv("SESSION_IMAGE_BUDGET_MB", "1")) * 1024 * 1024),
+            # Artifacts dropped under the memory budget are read back from the session store
+            reload=partial(store.get_artifact, session_id),
+        )
+        # Artifact name -> content version, for client caches and ETags
+        self.versions: Dict[str, str] = {}
+        self.suspect_emotions = {f"suspect{i}": "neutral" for i in range(1, 5)}
+        self.log = SessionLog()
+        self.last_emotion_update = {}
+        self.sprite_sheet = None
+        # One slot per suspect so a group question refreshes every portrait at once
+        self.worker = SessionWorker(max_workers=4)
+        self.tracer = Tracer(parent=process_tracer)
+        self.lock = threading.RLock()
+        self.revision = None
+        self.last_used = time.monotonic()
+
+    def _activate(self):
+        """Send spans and log lines from this thread, and jobs it submits, to this session"""
+        use_tracer(self.tracer)
+        use_log(self.log)
+        self.last_used = time.monotonic()
+
+    # Game operations
+
+    def start_case(self):
+        """Start a case from the warm pool, or generate one on the spot when the pool is empty"""
+        with self.lock:
+            self._activate()
+            if self.case is not None:
+                self._reset()
+            factory = get_case_factory().start()
+            prebuilt = factory.pop()
+
+            if prebuilt:
+                self.agent.memory.reset()
+                self.agent.ledger.reset()
+                updated_state = AgentState(
+                    case_details=prebuilt["case_details"],
+                    discovered_info="",
+                    chat_history=[],
+                    user_input="",
+                    router_info="",
+                    dossiers=prebuilt["dossiers"],
+                    emotion=None,
+                    case=prebuilt["case"]
+                )
+                suspect_images = prebuilt["suspect_images"]
+                scene = prebuilt["scene"]
+                self.log.info("Case served from warm pool")
+            else:
+                state = AgentState(
+                    case_details="",
+                    discovered_info="",
+                    chat_history=[],
+                    user_input="",
+                    router_info="",
+                    dossiers={},
+                    emotion=None,
+                    case=None
+                )
+                updated_state = self.agent.mystery_generator(state)
+                self.log.info("Mystery generated")
+
+                suspect_descriptions = updated_state["case"].descriptions()
+                suspect_images = generate_suspect_images(suspect_descriptions)
+                scene = generate_crime_scene_image(updated_state["case_details"], suspect_descriptions)
+                self.log.info("Images generated")
+
+            self.case_details = updated_state["case_details"]
+            self.case = updated_state["case"]
+            self.suspect_images = {}
+            for suspect_id, image in suspect_images.items():
+                self._set_suspect_image(suspect_id, image)
+            if scene:
+                self._set_crime_scene(scene)
+
+            # Pre-render every emotion portrait so expression swaps are lookups
+            self.sprite_sheet = start_sprite_prerender(self.case.descriptions())
+
+            self.state_tracker = updated_state
+            self.case_started = True
+            self.chat_history.append({"role": "assistant", "content": WELCOME})
+            self.log.info("Case started, ready to play")
+            self._persist()
+
+    def reset(self):
+        with self.lock:
+            self._activate()
+            self._reset()
+            self._persist()
+
+    def _reset(self):
+        self.worker.clear()
+        if self.sprite_sheet is not None:
+            self.sprite_sheet.cancel()
+        self.sprite_sheet = None
+        self.chat_history = []
+        self.case_details = ""
+        self.case = None
+        self.state_tracker = None
+        self.case_started = False
+        self.concluded = False
+        self.suspect_images = {}
+        self.versions = {}
+        self.artifacts.clear()
+        self.suspect_emotions = {f"suspect{i}": "neutral" for i in range(1, 5)}
+        self.log.clear()
+        self.last_emotion_update = {}
+
+    def turn(self, user_input: str, on_event: Optional[Callable[[str, str], None]] = None) -> dict:
+        """Play one detective turn.
+
+        ``on_event(kind, value)`` is called with ("route", node) once the turn
+        is routed and ("token", text) for each streamed reply token. Returns
+        the route, the messages the turn added and whether the case ended.
+        """
+        with self.lock:
+            self._activate()
+            if not self.case_started:
+                raise NoCaseInProgress("No case in progress; start a case first")
+            self._apply_background_results()
+            history_length = len(self.chat_history)
+            self.chat_history.append({"role": "detective", "content": user_input})
+            current_state = self.state_tracker.copy() if self.state_tracker else {}
+            current_state["user_input"] = user_input
+            current_state["chat_history"] = self.chat_history
+
+            router_output = self.agent.router(current_state)
+            _, route_path, route_ms = self.agent.router_stats.last
+            self.log.info("Router output: %s (%s path, %.2f ms)", router_output, route_path, route_ms)
+            if on_event is not None:
+                on_event("route", router_output)
+
+            suspect_match = re.match(r"suspect(\d+)", router_output)
+            if suspect_match:
+                suspect_num = suspect_match.group(1)
+                updated_state = self._run_node(router_output, current_state, on_event)
+
+                # Find the latest response from this suspect
+                suspect_response = ""
+                for msg in reversed(updated_state.get("chat_history", [])):
+                    if msg.get("role") == f"suspect {suspect_num}":
+                        suspect_response = msg.get("content", "")
+                        break
+
+                # Emotion analysis and the portrait refresh run in the background so the reply returns right away
+                if suspect_response:
+                    # The suspect node reports its emotion inline; analyze the reply only if that failed
+                    self._queue_expression_update(f"suspect{suspect_num}", user_input, suspect_response,
+                                                  updated_state.get("emotion"))
+                self._finish_turn(updated_state, ledger=True)
+            elif router_output == "group":
+                self._finish_turn(self._run_group(current_state), ledger=True)
+            elif router_output == "mysterygen":
+                self._reset()
+                history_length = 0
+            elif router_output == END:
+                self.concluded = True
+                self.log.info("Case concluded")
+            else:
+                if router_output == "solution":
+                    self._settle_ledger()
+                self._finish_turn(self._run_node(router_output, current_state, on_event))
+                self.log.info("Processed node: %s", router_output)
+            self._persist()
+            return {
+                "route": router_output,
+                "messages": self.chat_history[history_length:],
+                "concluded": self.concluded,
+                "case_started": self.case_started,
+            }
+
+    def _finish_turn(self, updated_state, ledger: bool = False):
+        self.chat_history = updated_state.get("chat_history", self.chat_history)
+        self.state_tracker = updated_state
+        if ledger:
+            self._queue_ledger_update(self.chat_history)
+
+    def _run_node(self, router_output, current_state, on_event=None):
+        agent = self.agent
+        node_function = getattr(agent, router_output)
+        if on_event is not None:
+            agent.on_token = partial(on_event, "token")
+        try:
+            updated_state = node_function(current_state)
+        finally:
+            agent.on_token = None
+
+        # The solution node returns the next route rather than the state
+        if not isinstance(updated_state, dict):
+            updated_state = current_state
+
+        timing = agent.call_log[-1] if agent.call_log else None
+        if timing and timing["node"] == router_output:
+            first_token = f"{timing['ttft_ms']:.0f} ms" if timing["ttft_ms"] is not None else "n/a"
+            self.log.info("%s reply: first token %s, total %.0f ms", router_output, first_token, timing["total_ms"])
+        return updated_state
+
+    def _run_group(self, current_state):
+        """Ask every suspect at once, then refresh all their portraits concurrently"""
+        agent = self.agent
+        history_length = len(current_state.get("chat_history", []))
+        updated_state = agent.group_interrogation(current_state)
+
+        timing = agent.call_log[-1] if agent.call_log else None
+        if timing and timing["node"] == "group":
+            self.log.info("group replies: total %.0f ms for %d suspects",
+                          timing["total_ms"], len(updated_state.get("group_emotions", {})))
+
+        emotions = updated_state.get("group_emotions", {})
+        for message in updated_state["chat_history"][history_length:]:
+            suspect_id = message["role"].replace(" ", "")
+            self._queue_expression_update(suspect_id, current_state["user_input"], message["content"],
+                                          emotions.get(suspect_id))
+        missing = [f"suspect{n}" for n in range(1, 5) if f"suspect{n}" not in emotions]
+        if missing:
+            self.log.warning("No group reply from %s", ", ".join(missing))
+        return updated_state
+
+    def _queue_ledger_update(self, chat_history):
+        """Extract facts from the new turns in the background; they are merged into the ledger when applied"""
+        self.worker.submit("ledger", partial(run_at, BACKGROUND, self.agent.extract_ledger, list(chat_history)))
+
+    def _settle_ledger(self):
+        """Let a running ledger extraction finish and merge it, so the solution check does not repeat it"""
+        self.worker.wait("ledger")
+        self._apply_background_results()
+
+    def _queue_expression_update(self, suspect_id, user_input, suspect_response, emotion=None):
+        """Refresh the suspect's portrait on the session worker; one job per suspect, newest wins"""
+        description = self.case.suspect(suspect_id).description()
+        self.last_emotion_update[suspect_id] = user_input
+        self.worker.submit(suspect_id, partial(
+            refresh_suspect_expression, self.llm, self.sprite_sheet, suspect_id,
+            user_input, suspect_response, description, emotion
+        ))
+        self.log.info("Queued expression update for %s", suspect_id)
+
+    def test_emotions(self) -> Dict[str, str]:
+        """Swap every portrait to a random emotion; returns suspect id -> emotion"""
+        with self.lock:
+            self._activate()
+            if not self.suspect_images or not self.case_details:
+                return {}
+            suspect_descriptions = self.case.descriptions()
+            applied = {}
+            for suspect_id in list(self.suspect_images):
+                emotion = random.choice(TEST_EMOTIONS)
+                self._set_suspect_image(suspect_id, update_suspect_expression(
+                    suspect_id, emotion, suspect_descriptions.get(suspect_id, ""), self.sprite_sheet
+                ))
+                self.suspect_emotions[suspect_id] = emotion
+                applied[suspect_id] = emotion
+            self._persist()
+            return applied
+
+    def poll(self) -> dict:
+        """Apply finished background jobs; reports whether any did and whether more are running.
+
+        ``revision`` moves with every saved change, including those the
+        reaper applied, so a client can tell whether its last snapshot is stale.
+        """
+        with self.lock:
+            self._activate()
+            changed = self._apply_background_results()
+            if changed:
+                self._persist()
+            return {"changed": changed, "pending": self.worker.pending(), "revision": list(self.revision or ())}
+
+    def _apply_background_results(self) -> bool:
+        results = self.worker.drain()
+        for suspect_id, result, error in results:
+            if suspect_id == "ledger":
+                if error is not None:
+                    self.log.warning("Evidence ledger update failed: %s", error)
+                else:
+                    self.log.info("Evidence ledger: %d new entries", self.agent.merge_ledger(result))
+                continue
+            if error is not None:
+                self.log.warning("Expression update for %s failed: %s", suspect_id, error)
+                continue
+            emotion, image = result
+            self.suspect_emotions[suspect_id] = emotion
+            if self.case is not None:
+                self._set_suspect_image(suspect_id, image)
+            self.log.info("Updated %s with LLM-selected emotion: %s", suspect_id, emotion)
+        return bool(results)
+
+    def set_verbose(self, verbose: bool):
+        self.log.level = DEBUG if verbose else INFO
+
+    # Images
+
+    def _set_suspect_image(self, suspect_id, image, persist=True):
+        """Swap a suspect's image (PIL or encoded bytes); only compact display-sized bytes are kept"""
+        name = f"portrait:{suspect_id}"
+        data = compact_image(image, PORTRAIT_WIDTH)
+        self.artifacts.put(name, data, COMPACT_MIME, decoded_size=decoded_size(image))
+        self.suspect_images[suspect_id] = name
+        self.versions[name] = artifact_version(data)
+        if persist:
+            self.store.put_artifact(self.session_id, name, data, COMPACT_MIME)
+
+    def _set_crime_scene(self, scene, persist=True):
+        data = compact_image(scene, SCENE_WIDTH)
+        self.artifacts.put("crime_scene", data, COMPACT_MIME, decoded_size=decoded_size(scene))
+        self.versions["crime_scene"] = artifact_version(data)
+        if persist:
+            self.store.put_artifact(self.session_id, "crime_scene", data, COMPACT_MIME)
+
+    def artifact(self, name: str):
+        """(bytes, mime type, version) of one artifact, or None"""
+        self.last_used = time.monotonic()
+        data = self.artifacts.get(name)
+        if data is None:
+            return None
+        return data, self.artifacts.mime_type(name), self.versions.get(name) or artifact_version(data)
+
+    # Persistence
+
+    def _persist(self):
+        """Append whatever changed since the last operation to the session store"""
+        if self.state_tracker is not None:
+            state = dict(self.state_tracker, chat_history=self.chat_history)
+            self.store.save_game_state(self.session_id, state)
+        self.store.set_state(
+            self.session_id,
+            case_started=self.case_started,
+            suspect_emotions=self.suspect_emotions,
+            ledger=self.agent.ledger.to_dict(),
+        )
+        self.revision = self.store.revision(self.session_id)
+
+    def resume(self):
+        with self.lock:
+            self._activate()
+            loaded = self.store.load_game_state(self.session_id)
+            self.revision = self.store.revision(self.session_id)
+            if not loaded["case"]:
+                return
+            self.case = loaded["case"]
+            self.case_details = loaded["case_details"]
+            self.chat_history = loaded["chat_history"]
+            self.state_tracker = AgentState(
+                case_details=loaded["case_details"],
+                discovered_info="",
+                chat_history=loaded["chat_history"],
+                user_input="",
+                router_info="",
+                dossiers=loaded["dossiers"],
+                emotion=None,
+                case=loaded["case"]
+            )
+            self.case_started = loaded["extra"].get("case_started", True)
+            self.suspect_emotions.update(loaded["extra"].get("suspect_emotions", {}))
+            self.agent.ledger = EvidenceLedger.from_dict(loaded["extra"].get("ledger"))
+
+            self.suspect_images = {}
+            for name, data in loaded["artifacts"].items():
+                if name.startswith("portrait:"):
+                    self._set_suspect_image(name[len("portrait:"):], data, persist=False)
+                elif name == "crime_scene":
+                    self._set_crime_scene(data, persist=False)
+                else:
+                    self.artifacts.put(name, data)
+                    self.versions[name] = artifact_version(data)
+
+            self.sprite_sheet = start_sprite_prerender(self.case.descriptions())
+            self.log.info("Resumed session %s", self.session_id)
+
+    def close(self):
+        """Stop background work and free spilled files and store caches, e.g. when the session is evicted"""
+        self.worker.close()
+        if self.sprite_sheet is not None:
+            self.sprite_sheet.cancel()
+        self.artifacts.clear()
+        self.store.forget(self.session_id)
+
+    # Views
+
+    def snapshot(self) -> dict:
+        """Everything a client needs to draw the game, as plain JSON-able values"""
+        with self.lock:
+            self._activate()
+            if self._apply_background_results():
+                self._persist()
+            names = {s.suspect_id: s.name for s in self.case.suspects} if self.case else {}
+            return {
+                "session_id": self.session_id,
+                "case_started": self.case_started,
+                "concluded": self.concluded,
+                "case_details": self.case_details,
+                "chat_history": list(self.chat_history),
+                "suspects": [
+                    {
+                        "id": suspect_id,
+                        "name": names.get(suspect_id, suspect_id),
+                        "emotion": self.suspect_emotions.get(suspect_id, "neutral"),
+                        "artifact": self.suspect_images[suspect_id],
+                        "version": self.versions.get(self.suspect_images[suspect_id]),
+                    }
+                    for suspect_id in sorted(self.suspect_images)
+                ],
+                "suspect_emotions": dict(self.suspect_emotions),
+                "scene": {"artifact": "crime_scene", "version": self.versions["crime_scene"]}
+                if "crime_scene" in self.artifacts else None,
+                "pending": self.worker.pending() or self.worker.has_completed(),
+                "revision": list(self.revision or ()),
+            }
+
+    def diagnostics(self, scope: str = "session", min_level: int = INFO, log_limit: int = 200) -> dict:
+        """Stats behind the debug sidebar: ledger, router, caches, providers, images, tracing and log"""
+        with self.lock:
+            self._activate()
+            ledger = self.agent.ledger
+            names = {s.suspect_id: s.name for s in self.case.suspects} if self.case else None
+            calls = [c for c in self.agent.call_log if c.get("raw_history_tokens") is not None]
+            prompt_size = {}
+            for call in calls:
+                row = prompt_size.setdefault(call["node"], {"calls": 0})
+                row.update(calls=row["calls"] + 1, prompt_tokens=call["prompt_tokens"],
+                           raw_history_tokens=call["raw_history_tokens"])
+            tracer = self.tracer if scope == "session" else process_tracer
+            scheduler = get_scheduler()
+            return {
+                "ledger": {
+                    "entries": ledger.count(),
+                    "contradictions": ledger.count(CONTRADICTION),
+                    "processed": ledger.processed,
+                    "messages": len(self.chat_history),
+                    "markdown": ledger.render(names),
+                },
+                "router": self.agent.router_stats.summary(),
+                "prompt_size": prompt_size,
+                "case_pool": get_case_factory().stats(),
+                "response_cache": get_response_cache().stats(),
+                "providers": {
+                    "deadline_seconds": self.llm.deadline_seconds,
+                    "hedge_percentile": self.llm.hedge_percentile,
+                    "rows": self.llm.stats(),
+                } if hasattr(self.llm, "stats") else None,
+                "scheduler": {"enabled": scheduler.enabled, "resources": scheduler.stats()},
+                "image_memory": dict(
+                    self.artifacts.memory_report(),
+                    sprite_bytes=self.sprite_sheet.memory_bytes() if self.sprite_sheet is not None else 0,
+                ),
+                "sprites": self.sprite_sheet.progress() if self.sprite_sheet is not None else None,
+                "portrait_cache": portrait_cache.stats(),
+                "tracing": {
+                    "enabled": tracing.ENABLED,
+                    "scope": scope,
+                    "summary": tracer.summary(),
+                    "errors": [call for call in tracer.recent(limit=10) if call["outcome"] == "error"],
+                },
+                "log": {
+                    "verbose": self.log.level == DEBUG,
+                    "size": len(self.log),
+                    "capacity": self.log.capacity,
+                    "dropped": self.log.dropped,
+                    "entries": [list(entry) for entry in self.log.entries(min_level, limit=log_limit)],
+                },
+            }
+
+    def trace_export(self, scope: str = "session", fmt: str = "json") -> str:
+        """The session's (or process's) spans as JSON or Prometheus text; built only when exported"""
+        tracer = self.tracer if scope == "session" else process_tracer
+        return tracer.to_prometheus() if fmt == "prometheus" else tracer.to_json()
+
+
+class GameEngine:
+    """Live sessions for one engine process, loaded from and saved to the session store.
+
+    Sessions are kept in memory up to ``max_sessions``, least recently used
+    first out. When another worker has written to a session since this one
+    last saw it, the session is reloaded from the store before use, so any
+    worker behind a load balancer can serve any session (routing by session
+    id keeps background jobs and warm caches on one worker). A reaper thread
+    applies finished background jobs and saves them without waiting for a poll.
+    """
+
+    def __init__(self, store=None, llm=None, max_sessions: int = 256, reap_seconds: float = 0.5):
+        self.store = store or get_session_store()
+        self.llm = llm or get_chat_model()
+        self.max_sessions = max_sessions
+        self.reap_seconds = reap_seconds
+        self._sessions: "OrderedDict[str, EngineSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._reaper = None
+        self.counters = {"created": 0, "resumed": 0, "reloaded": 0, "evicted": 0}
+
+    def create_session(self, session_id: Optional[str] = None) -> str:
+        session_id = self.store.create_session(session_id)
+        session = EngineSession(session_id, self.store, self.llm)
+        session.revision = self.store.revision(session_id)
+        with self._lock:
+            self.counters["created"] += 1
+        self._keep(session)
+        return session_id
+
+    def open_session(self, session_id: Optional[str] = None) -> str:
+        """Id of ``session_id`` if the store knows it, otherwise of a new session. A new session
+        takes ``session_id`` when it is a fresh id from the client (32 hex digits), so the
+        client can route it to the worker its id maps to"""
+        if session_id and self.store.has_session(session_id):
+            return session_id
+        return self.create_session(session_id if session_id and _SESSION_ID_RE.fullmatch(session_id) else None)
+
+    def session(self, session_id: str) -> EngineSession:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+        if session is not None:
+            # Under the session lock: _persist writes before it records the new revision
+            with session.lock:
+                current = self.store.revision(session_id) == session.revision
+            if current:
+                return session
+            # Written by another worker since this one last saw it
+            with self._lock:
+                if self._sessions.get(session_id) is session:
+                    del self._sessions[session_id]
+                self.counters["reloaded"] += 1
+            session.close()
+        elif not self.store.has_session(session_id):
+            raise UnknownSession(session_id)
+        else:
+            with self._lock:
+                self.counters["resumed"] += 1
+        session = EngineSession(session_id, self.store, self.llm)
+        session.resume()
+        return self._keep(session)
+
+    def _keep(self, session: EngineSession) -> EngineSession:
+        with self._lock:
+            existing = self._sessions.get(session.session_id)
+            if existing is not None and existing is not session:
+                # Another request loaded it at the same time; use the first copy
+                self._sessions.move_to_end(session.session_id)
+                evicted = [session]
+                session = existing
+            else:
+                self._sessions[session.session_id] = session
+                evicted = []
+                while len(self._sessions) > self.max_sessions:
+                    evicted.append(self._sessions.popitem(last=False)[1])
+                    self.counters["evicted"] += 1
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, name="engine-reaper", daemon=True)
+                self._reaper.start()
+        for stale in evicted:
+            stale.close()
+        return session
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.reap_seconds)
+            with self._lock:
+                sessions = list(self._sessions.values())
+            for session in sessions:
+                if not session.worker.has_completed() or not session.lock.acquire(blocking=False):
+                    continue
+                try:
+                    # Never apply results onto a copy another worker has moved past
+                    if self.store.revision(session.session_id) == session.revision:
+                        session.poll()
+                except Exception as e:
+                    session.log.warning("Applying background results failed: %s", e)
+                finally:
+                    session.lock.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, live=len(self._sessions), max_sessions=self.max_sessions)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> GameEngine:
+    """Process-wide engine over the shared session store and chat model, sized by ENGINE_MAX_SESSIONS"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = GameEngine(max_sessions=int(os.getenv("ENGINE_MAX_SESSIONS", "256")))
+        return _engine
@@ -0,0 +1,195 @@
+import json
+import os
+import queue
+import re
+import threading
+import uuid
+import zlib
+from contextvars import copy_context
+from typing import Iterator, Optional, Tuple
+
+_SESSION_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+
+class EngineError(RuntimeError):
+    """Raised when the engine answers a call with an error; ``status`` is its HTTP status"""
+
+    def __init__(self, message: str, status: int = 500):
+        super().__init__(message)
+        self.status = status
+
+
+class LocalEngineClient:
+    """Runs the engine in this process; the default when ENGINE_URL is not set"""
+
+    def __init__(self, engine=None):
+        if engine is None:
+            from engine import get_engine
+            engine = get_engine()
+        self.engine = engine
+
+    def _session(self, session_id: str):
+        from engine import UnknownSession
+        try:
+            return self.engine.session(session_id)
+        except UnknownSession:
+            raise EngineError(f"Unknown session {session_id}", 404) from None
+
+    def open_session(self, session_id: Optional[str] = None) -> str:
+        return self.engine.open_session(session_id)
+
+    def snapshot(self, session_id: str) -> dict:
+        return self._session(session_id).snapshot()
+
+    def start_case(self, session_id: str) -> dict:
+        session = self._session(session_id)
+        session.start_case()
+        return session.snapshot()
+
+    def reset(self, session_id: str) -> dict:
+        session = self._session(session_id)
+        session.reset()
+        return session.snapshot()
+
+    def turn(self, session_id: str, text: str) -> Iterator[dict]:
+        """Yield route and token events while the turn runs, then a done (or error) event"""
+        from engine import NoCaseInProgress
+        session = self._session(session_id)
+        events = queue.Queue()
+
+        def play():
+            try:
+                result = session.turn(text, lambda kind, value: events.put({"event": kind, "value": value}))
+                events.put({"event": "done", "result": result})
+            except NoCaseInProgress as e:
+                events.put({"event": "error", "status": 409, "message": str(e)})
+            except Exception as e:
+                events.put({"event": "error", "status": 500, "message": str(e)})
+
+        # The caller draws tokens as they arrive, so the turn runs beside it
+        threading.Thread(target=copy_context().run, args=(play,), daemon=True).start()
+        while True:
+            event = events.get()
+            yield event
+            if event["event"] in ("done", "error"):
+                return
+
+    def poll(self, session_id: str) -> dict:
+        return self._session(session_id).poll()
+
+    def test_emotions(self, session_id: str) -> dict:
+        return self._session(session_id).test_emotions()
+
+    def set_verbose(self, session_id: str, verbose: bool):
+        self._session(session_id).set_verbose(verbose)
+
+    def diagnostics(self, session_id: str, scope: str = "session", min_level: int = 20) -> dict:
+        return self._session(session_id).diagnostics(scope=scope, min_level=min_level)
+
+    def trace_export(self, session_id: str, scope: str = "session", fmt: str = "json") -> str:
+        return self._session(session_id).trace_export(scope=scope, fmt=fmt)
+
+    def artifact(self, session_id: str, name: str) -> Optional[Tuple[bytes, str, str]]:
+        """(bytes, mime type, version), or None"""
+        return self._session(session_id).artifact(name)
+
+
+class RemoteEngineClient:
+    """Talks to engine_service.py workers over HTTP, streaming turns over a WebSocket.
+
+    ``base_url`` may list several workers, comma-separated; each session is
+    then always sent to the same one, picked by a hash of its id, so its
+    background jobs and in-memory state stay on one worker.
+    """
+
+    def __init__(self, base_url: str, timeout_seconds: float = 120):
+        import httpx
+        self.base_urls = [url.strip().rstrip("/") for url in base_url.split(",") if url.strip()]
+        self.timeout_seconds = timeout_seconds
+        self._http = [httpx.Client(base_url=url, timeout=timeout_seconds) for url in self.base_urls]
+
+    def _worker(self, session_id: str) -> int:
+        return zlib.crc32(session_id.encode()) % len(self.base_urls)
+
+    def _request(self, method: str, path: str, session_id: str, **kwargs):
+        response = self._http[self._worker(session_id)].request(method, path, **kwargs)
+        if response.status_code >= 400:
+            try:
+                message = response.json().get("error", response.text)
+            except ValueError:
+                message = response.text
+            raise EngineError(message, response.status_code)
+        return response
+
+    def _call(self, method: str, path: str, session_id: str, **kwargs):
+        return self._request(method, path, session_id, **kwargs).json()
+
+    def open_session(self, session_id: Optional[str] = None) -> str:
+        # A new session's id is chosen here, so it is created on the worker that will serve it;
+        # anything but 32 hex digits cannot name a stored session
+        if not session_id or not _SESSION_ID_RE.fullmatch(session_id):
+            session_id = uuid.uuid4().hex
+        return self._call("POST", "/sessions", session_id, json={"session_id": session_id})["session_id"]
+
+    def snapshot(self, session_id: str) -> dict:
+        return self._call("GET", f"/sessions/{session_id}", session_id)
+
+    def start_case(self, session_id: str) -> dict:
+        return self._call("POST", f"/sessions/{session_id}/case", session_id)
+
+    def reset(self, session_id: str) -> dict:
+        return self._call("POST", f"/sessions/{session_id}/reset", session_id)
+
+    def turn(self, session_id: str, text: str) -> Iterator[dict]:
+        """Like LocalEngineClient.turn, except that the events simply stop if the connection drops
+        or no event arrives within ``timeout_seconds``"""
+        from websockets.exceptions import ConnectionClosed
+        from websockets.sync.client import connect
+        base_url = self.base_urls[self._worker(session_id)]
+        url = "ws" + base_url[len("http"):] + f"/sessions/{session_id}/turns"
+        with connect(url, open_timeout=self.timeout_seconds) as websocket:
+            websocket.send(json.dumps({"text": text}))
+            while True:
+                try:
+                    event = json.loads(websocket.recv(timeout=self.timeout_seconds))
+                except (ConnectionClosed, TimeoutError):
+                    return
+                yield event
+                if event["event"] in ("done", "error"):
+                    return
+
+    def poll(self, session_id: str) -> dict:
+        return self._call("POST", f"/sessions/{session_id}/poll", session_id)
+
+    def test_emotions(self, session_id: str) -> dict:
+        return self._call("POST", f"/sessions/{session_id}/test-emotions", session_id)
+
+    def set_verbose(self, session_id: str, verbose: bool):
+        self._call("POST", f"/sessions/{session_id}/log-level", session_id, json={"verbose": verbose})
+
+    def diagnostics(self, session_id: str, scope: str = "session", min_level: int = 20) -> dict:
+        return self._call("GET", f"/sessions/{session_id}/diagnostics", session_id, params={"scope": scope, "min_level": min_level})
+
+    def trace_export(self, session_id: str, scope: str = "session", fmt: str = "json") -> str:
+        return self._request("GET", f"/sessions/{session_id}/traces", session_id, params={"scope": scope, "format": fmt}).text
+
+    def artifact(self, session_id: str, name: str) -> Optional[Tuple[bytes, str, str]]:
+        response = self._http[self._worker(session_id)].get(f"/sessions/{session_id}/artifacts/{name}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.content, response.headers.get("content-type"), response.headers.get("etag", "").strip('"')
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_engine_client():
+    """Remote client for the worker(s) in ENGINE_URL when it is set, otherwise an in-process engine"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            url = os.getenv("ENGINE_URL")
+            _client = RemoteEngineClient(url) if url else LocalEngineClient()
+        return _client
@@ -0,0 +1,239 @@
+"""HTTP and WebSocket front end for the game engine.
+
+Each worker process holds its own GameEngine; session state lives in the
+session store, so several workers can run behind one load balancer:
+
+    python engine_service.py --port 8100 &
+    python engine_service.py --port 8101 &
+    ENGINE_URL=http://localhost:8100,http://localhost:8101 streamlit run ui.py
+
+The client keeps each session on one worker. ``--workers`` instead runs
+several processes on one port, which spreads connections without regard to
+the session, so sessions are reloaded from the store whenever they move.
+
+Engine calls block on model and image providers, so they run on a bounded
+thread pool (ENGINE_THREADS) and the event loop only moves bytes.
+"""
+import argparse
+import asyncio
+import functools
+import os
+
+import anyio
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from engine import NoCaseInProgress, UnknownSession, get_engine
+from provider_pool import DeadlineExceeded
+from session_log import DEBUG, INFO
+from tracing import process_tracer
+
+_limiter = None
+
+
+async def _run(fn, *args, **kwargs):
+    """Run a blocking engine call off the event loop"""
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(int(os.getenv("ENGINE_THREADS", "64")))
+    return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs), limiter=_limiter)
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status)
+
+
+def _engine_endpoint(fn):
+    """Map engine errors to HTTP status codes"""
+    @functools.wraps(fn)
+    async def endpoint(request: Request):
+        try:
+            return await fn(request)
+        except UnknownSession as e:
+            return _error(404, f"Unknown session {e.args[0]}")
+        except NoCaseInProgress as e:
+            return _error(409, str(e))
+        except DeadlineExceeded as e:
+            return _error(504, str(e))
+    return endpoint
+
+
+async def _session(request):
+    return await _run(get_engine().session, request.path_params["session_id"])
+
+
+async def _body(request: Request) -> dict:
+    return await request.json() if await request.body() else {}
+
+
+@_engine_endpoint
+async def create_session(request: Request):
+    """Open the session named in the body if the store knows it, otherwise a new one"""
+    session_id = await _run(get_engine().open_session, (await _body(request)).get("session_id"))
+    return JSONResponse({"session_id": session_id}, status_code=201)
+
+
+@_engine_endpoint
+async def snapshot(request: Request):
+    session = await _session(request)
+    return JSONResponse(await _run(session.snapshot))
+
+
+@_engine_endpoint
+async def start_case(request: Request):
+    session = await _session(request)
+    await _run(session.start_case)
+    return JSONResponse(await _run(session.snapshot))
+
+
+@_engine_endpoint
+async def reset(request: Request):
+    session = await _session(request)
+    await _run(session.reset)
+    return JSONResponse(await _run(session.snapshot))
+
+
+@_engine_endpoint
+async def turn(request: Request):
+    """One turn without streaming; the reply arrives with the result"""
+    session = await _session(request)
+    return JSONResponse(await _run(session.turn, (await _body(request)).get("text", "")))
+
+
+@_engine_endpoint
+async def poll(request: Request):
+    session = await _session(request)
+    return JSONResponse(await _run(session.poll))
+
+
+@_engine_endpoint
+async def test_emotions(request: Request):
+    session = await _session(request)
+    return JSONResponse(await _run(session.test_emotions))
+
+
+@_engine_endpoint
+async def log_level(request: Request):
+    session = await _session(request)
+    session.set_verbose(bool((await _body(request)).get("verbose")))
+    return JSONResponse({"verbose": session.log.level == DEBUG})
+
+
+@_engine_endpoint
+async def diagnostics(request: Request):
+    session = await _session(request)
+    return JSONResponse(await _run(
+        session.diagnostics,
+        scope=request.query_params.get("scope", "session"),
+        min_level=int(request.query_params.get("min_level", INFO)),
+    ))
+
+
+@_engine_endpoint
+async def trace_export(request: Request):
+    session = await _session(request)
+    fmt = request.query_params.get("format", "json")
+    text = await _run(session.trace_export, scope=request.query_params.get("scope", "session"), fmt=fmt)
+    return PlainTextResponse(text, media_type="text/plain" if fmt == "prometheus" else "application/json")
+
+
+@_engine_endpoint
+async def artifact(request: Request):
+    session = await _session(request)
+    name = request.path_params["name"]
+    found = await _run(session.artifact, name)
+    if found is None:
+        return _error(404, f"No artifact {name}")
+    data, mime_type, version = found
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=0, must-revalidate"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(data, media_type=mime_type, headers=headers)
+
+
+async def turn_stream(websocket: WebSocket):
+    """Streamed turns: the client sends {"text": ...} and receives route, token and done events"""
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            message = await websocket.receive_json()
+            try:
+                # Looked up per turn: another worker may have moved the session on meanwhile
+                session = await _session(websocket)
+            except UnknownSession as e:
+                await websocket.send_json({"event": "error", "status": 404, "message": f"Unknown session {e.args[0]}"})
+                await websocket.close()
+                return
+            events: asyncio.Queue = asyncio.Queue()
+
+            def on_event(kind, value):
+                loop.call_soon_threadsafe(events.put_nowait, {"event": kind, "value": value})
+
+            async def play():
+                try:
+                    result = await _run(session.turn, message.get("text", ""), on_event)
+                    await events.put({"event": "done", "result": result})
+                except NoCaseInProgress as e:
+                    await events.put({"event": "error", "status": 409, "message": str(e)})
+                except DeadlineExceeded as e:
+                    await events.put({"event": "error", "status": 504, "message": str(e)})
+                except Exception as e:
+                    await events.put({"event": "error", "status": 500, "message": str(e)})
+
+            task = asyncio.create_task(play())
+            while True:
+                event = await events.get()
+                await websocket.send_json(event)
+                if event["event"] in ("done", "error"):
+                    break
+            await task
+    except WebSocketDisconnect:
+        pass
+
+
+async def metrics(request: Request):
+    return PlainTextResponse(process_tracer.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def health(request: Request):
+    return JSONResponse(dict(get_engine().stats(), pid=os.getpid()))
+
+
+app = Starlette(routes=[
+    Route("/sessions", create_session, methods=["POST"]),
+    Route("/sessions/{session_id}", snapshot, methods=["GET"]),
+    Route("/sessions/{session_id}/case", start_case, methods=["POST"]),
+    Route("/sessions/{session_id}/reset", reset, methods=["POST"]),
+    Route("/sessions/{session_id}/turns", turn, methods=["POST"]),
+    WebSocketRoute("/sessions/{session_id}/turns", turn_stream),
+    Route("/sessions/{session_id}/poll", poll, methods=["POST"]),
+    Route("/sessions/{session_id}/test-emotions", test_emotions, methods=["POST"]),
+    Route("/sessions/{session_id}/log-level", log_level, methods=["POST"]),
+    Route("/sessions/{session_id}/diagnostics", diagnostics, methods=["GET"]),
+    Route("/sessions/{session_id}/traces", trace_export, methods=["GET"]),
+    Route("/sessions/{session_id}/artifacts/{name}", artifact, methods=["GET"]),
+    Route("/metrics", metrics, methods=["GET"]),
+    Route("/healthz", health, methods=["GET"]),
+])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("ENGINE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ENGINE_PORT", "8100")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ENGINE_WORKERS", "1")),
+                        help="engine processes sharing the port")
+    parser.add_argument("--app", default="engine_service:app", help="ASGI app to serve, as module:attribute")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(args.app, host=args.host, port=args.port, workers=args.workers, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
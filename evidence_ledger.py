@@ -0,0 +1,142 @@
+import re
+import threading
+from typing import Dict, List, Optional
+
+from conversation_memory import ROLE_LABELS
+
+CASE = "case"
+FACT = "fact"
+CONTRADICTION = "contradiction"
+
+_ENTRY_RE = re.compile(
+    r"^[\s*\-•]*(FACT|CONTRADICTION)\s*[|:]\s*(suspect\s*([1-4])|case)\s*[|:]\s*(.+?)\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9 ]", "", re.sub(r"\s+", " ", text.lower())).strip()
+
+
+class EvidenceLedger:
+    """Facts and contradictions per suspect, extracted from the transcript as it grows.
+
+    ``pending`` returns only the messages added since the last merge, so each
+    extraction call sees new turns plus the compact ledger, never the whole
+    transcript. Each suspect keeps at most ``max_entries`` items; old facts are
+    dropped before contradictions.
+    """
+
+    def __init__(self, max_entries: int = 12):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.entries: Dict[str, List[dict]] = {}
+        self.processed = 0
+        self.extractions = 0
+
+    def pending(self, chat_history: List[dict]) -> List[dict]:
+        """Detective questions and suspect answers not merged yet"""
+        if len(chat_history) < self.processed:
+            # History was cleared or replaced, e.g. a new case
+            self.reset()
+        return [
+            message for message in chat_history[self.processed:]
+            if message.get("role") in ("detective", "user") or message.get("role", "").startswith("suspect")
+        ]
+
+    def extraction_prompt(self, new_messages: List[dict]) -> str:
+        transcript = "\n".join(
+            f"{ROLE_LABELS.get(message['role'], message['role'].title())}: {message.get('content', '')}"
+            for message in new_messages
+        )
+        return f"""
+        You maintain a detective's evidence ledger for a murder mystery interrogation.
+
+        CURRENT LEDGER:
+        {self.render()}
+
+        NEW CONVERSATION SINCE THE LAST UPDATE:
+        {transcript}
+
+        List only information from the new conversation that is not already in the ledger,
+        one item per line, in exactly one of these forms:
+        FACT | suspect N | <short fact the suspect stated or revealed>
+        CONTRADICTION | suspect N | <what they said that conflicts with the ledger or another suspect>
+        Use "case" instead of "suspect N" for facts not tied to one suspect.
+        Write NONE if there is nothing new.
+        """
+
+    def merge(self, text: str, processed: int) -> int:
+        """Add parsed entries, skipping duplicates; returns how many were added.
+
+        A result covering no more of the transcript than is already merged is
+        stale, e.g. from an overlapping extraction, and is ignored.
+        """
+        if processed <= self.processed:
+            return 0
+        added = 0
+        # Copy on write so readers such as the sidebar never see a half-merged ledger
+        entries = {key: list(items) for key, items in self.entries.items()}
+        for match in _ENTRY_RE.finditer(text or ""):
+            kind = match.group(1).lower()
+            key = f"suspect{match.group(3)}" if match.group(3) else CASE
+            entry_text = match.group(4).strip()
+            items = entries.setdefault(key, [])
+            if any(_normalize(item["text"]) == _normalize(entry_text) for item in items):
+                continue
+            items.append({"kind": kind, "text": entry_text, "turn": processed})
+            added += 1
+            self._trim(items)
+        self.entries = entries
+        self.processed = processed
+        self.extractions += 1
+        return added
+
+    def _trim(self, items: List[dict]):
+        while len(items) > self.max_entries:
+            facts = [item for item in items if item["kind"] == FACT]
+            items.remove(facts[0] if facts else items[0])
+
+    def advance(self, processed: int):
+        """Mark messages as covered without an extraction call, e.g. when none were suspect turns"""
+        self.processed = max(self.processed, processed)
+
+    def render(self, suspect_names: Optional[Dict[str, str]] = None) -> str:
+        """Compact text for prompts and the sidebar"""
+        entries = self.entries
+        if not any(entries.values()):
+            return "No evidence recorded yet."
+        sections = []
+        for key in sorted(entries, key=lambda k: (k == CASE, k)):
+            items = entries[key]
+            if not items:
+                continue
+            if key == CASE:
+                title = "General"
+            else:
+                title = f"Suspect {key[len('suspect'):]}"
+                if suspect_names and key in suspect_names:
+                    title += f" ({suspect_names[key]})"
+            lines = [
+                f"- {'CONTRADICTION: ' if item['kind'] == CONTRADICTION else ''}{item['text']}"
+                for item in items
+            ]
+            sections.append(title + ":\n" + "\n".join(lines))
+        return "\n\n".join(sections)
+
+    def count(self, kind: Optional[str] = None) -> int:
+        return sum(1 for items in self.entries.values() for item in items if kind is None or item["kind"] == kind)
+
+    def to_dict(self) -> dict:
+        return {"entries": self.entries, "processed": self.processed}
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict], max_entries: int = 12) -> "EvidenceLedger":
+        ledger = cls(max_entries)
+        if data:
+            ledger.entries = {key: list(items) for key, items in data.get("entries", {}).items()}
+            ledger.processed = data.get("processed", 0)
+        return ledger
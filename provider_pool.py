@@ -0,0 +1,376 @@
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from scheduler import get_scheduler
+
+
+def _spawn(fn, *args, **kwargs) -> Future:
+    """Run ``fn`` on its own daemon thread in a copy of the caller's context.
+
+    Not a shared executor: calls waiting for a scheduler slot would fill its
+    workers and queue higher-priority calls behind them. Hedged losers keep
+    running until their provider answers.
+    """
+    future = Future()
+    context = contextvars.copy_context()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(fn, *args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="provider-pool", daemon=True).start()
+    return future
+
+
+class DeadlineExceeded(TimeoutError):
+    """No provider answered within the call's deadline"""
+
+
+class AllProvidersFailed(RuntimeError):
+    """Every provider either failed or has its circuit open"""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and lets one trial call through
+    every ``reset_seconds`` until a call succeeds again."""
+
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def available(self) -> bool:
+        """Whether ``allow`` would let a call through now, without claiming the half-open trial"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            return time.monotonic() - self.opened_at >= self.reset_seconds and not self._trial_running
+
+    def claim(self) -> Optional[str]:
+        """Claim a call: ``None`` if refused, ``"trial"`` if it took the single half-open trial,
+        else ``"closed"``. Only call it for a call that is actually made"""
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.reset_seconds or self._trial_running:
+                return None
+            self._trial_running = True
+            return "trial"
+
+    def allow(self) -> bool:
+        """Let a call through; in the half-open state this claims the single trial"""
+        return self.claim() is not None
+
+    def release(self):
+        """Give back a half-open trial claimed with ``"trial"`` for a call that was never made"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class Provider:
+    """One backend in a pool with its breaker and recent latencies"""
+
+    def __init__(self, name: str, model, breaker: Optional[CircuitBreaker] = None, window: int = 50):
+        self.name = name
+        self.model = model
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = deque(maxlen=window)
+        self.counters = {"calls": 0, "failures": 0, "hedges_fired": 0, "hedge_wins": 0}
+        self._structured = {}
+        self._lock = threading.Lock()
+
+    def runnable(self, schema=None):
+        """The model itself, or its with_structured_output(schema) runnable, built once per schema"""
+        if schema is None:
+            return self.model
+        with self._lock:
+            if schema not in self._structured:
+                self._structured[schema] = self.model.with_structured_output(schema)
+            return self._structured[schema]
+
+    def percentile(self, q: float) -> Optional[float]:
+        samples = sorted(self.latencies)
+        if not samples:
+            return None
+        # Nearest rank, so a 10% slow tail does not set the p90
+        return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            self.counters["calls"] += 1
+            if ok:
+                self.latencies.append(seconds)
+            else:
+                self.counters["failures"] += 1
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+
+class ProviderPool:
+    """Chat model facade over several providers, in order of preference.
+
+    Each call has a deadline. If the first provider has not answered within
+    its ``hedge_percentile`` latency, the same request is also sent to the next
+    provider and the first answer wins. Failed calls fail over immediately,
+    and providers whose circuit is open are skipped. Supports ``invoke``,
+    ``stream``, ``batch`` and ``with_structured_output``.
+    """
+
+    def __init__(self, providers: Sequence[Provider], deadline_seconds: float = 60, hedge_percentile: float = 0.9,
+                 hedge_default_seconds: float = 8, min_samples: int = 5):
+        if not providers:
+            raise ValueError("a provider pool needs at least one provider")
+        self.providers = list(providers)
+        self.deadline_seconds = deadline_seconds
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default_seconds = hedge_default_seconds
+        self.min_samples = min_samples
+
+    @property
+    def model_name(self) -> str:
+        return "+".join(provider.name for provider in self.providers)
+
+    @property
+    def temperature(self):
+        return getattr(self.providers[0].model, "temperature", None)
+
+    def _candidates(self) -> List[Provider]:
+        """Providers whose breaker would let a call through; each is claimed with ``claim`` only when used"""
+        available = [provider for provider in self.providers if provider.breaker.available()]
+        if not available:
+            raise AllProvidersFailed("every provider's circuit is open")
+        return available
+
+    def hedge_delay(self, provider: Provider) -> float:
+        """How long to wait on ``provider`` before also asking the next one"""
+        if len(provider.latencies) < self.min_samples:
+            return self.hedge_default_seconds
+        return provider.percentile(self.hedge_percentile)
+
+    def _call(self, provider: Provider, trial: bool, started: Future, finished: threading.Event, schema, prompt,
+              config, kwargs):
+        """Make one call once the scheduler grants a slot; ``started`` gets the time the slot was granted.
+        ``trial`` says whether this call holds its provider's half-open trial"""
+        with get_scheduler().slot(provider.name):
+            if finished.is_set():
+                # Answered, failed or timed out while this call was queued: skip the provider,
+                # giving back the trial only if it is this call's
+                if trial:
+                    provider.breaker.release()
+                return None
+            started.set_result(time.monotonic())
+            start = time.perf_counter()
+            try:
+                result = provider.runnable(schema).invoke(prompt, config=config, **kwargs)
+            except Exception:
+                provider.record(time.perf_counter() - start, False)
+                raise
+        provider.record(time.perf_counter() - start, True)
+        return result
+
+    def _invoke(self, prompt, schema=None, config=None, deadline_seconds: Optional[float] = None, **kwargs):
+        # Time spent queued in the scheduler is not the provider's fault: the deadline starts when
+        # the first call leaves the queue, and the hedge clock when the newest call does
+        budget = deadline_seconds or self.deadline_seconds
+        deadline = None
+        waiting = list(self._candidates())
+        running: Dict[Future, Tuple[Provider, bool, Future]] = {}
+        errors: List[Tuple[str, BaseException]] = []
+        finished = threading.Event()
+        starts: List[Future] = []
+        latest: Optional[Future] = None
+
+        def launch(hedged: bool) -> bool:
+            nonlocal latest
+            while waiting:
+                provider = waiting.pop(0)
+                claim = provider.breaker.claim()
+                if claim is None:
+                    # Opened, or its half-open trial was taken, since _candidates
+                    continue
+                if hedged:
+                    provider.counters["hedges_fired"] += 1
+                latest = Future()
+                starts.append(latest)
+                trial = claim == "trial"
+                call = _spawn(self._call, provider, trial, latest, finished, schema, prompt, config, kwargs)
+                running[call] = (provider, hedged, latest)
+                return True
+            return False
+
+        if not launch(False):
+            raise AllProvidersFailed("every provider's circuit is open")
+        try:
+            while running:
+                now = time.monotonic()
+                queued = [started for _, _, started in running.values() if not started.done()]
+                if deadline is None and any(started.done() for started in starts):
+                    deadline = min(started.result() for started in starts if started.done()) + budget
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - now
+                    if timeout <= 0:
+                        break
+                # Hedge once the newest call has run for the primary's hedge delay; the hedge
+                # always gets at least half of what is left of the deadline
+                hedge_at = None
+                if waiting and latest.done():
+                    primary = next(iter(running.values()))[0]
+                    since = latest.result()
+                    hedge_at = since + min(self.hedge_delay(primary), (deadline - since) / 2)
+                    timeout = min(timeout, max(hedge_at - now, 0))
+                # Also wake up when a queued call starts, to start the clocks
+                done, _ = wait(list(running) + queued, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    if hedge_at is not None and time.monotonic() >= hedge_at:
+                        launch(True)
+                    continue
+                for future in done:
+                    if future not in running:
+                        continue
+                    provider, hedged, _ = running.pop(future)
+                    if future.exception() is None:
+                        if hedged:
+                            provider.counters["hedge_wins"] += 1
+                        return future.result()
+                    errors.append((provider.name, future.exception()))
+                if not running and waiting:
+                    # Fail over straight away instead of waiting out a hedge delay
+                    launch(False)
+        finally:
+            finished.set()
+
+        if running:
+            for provider, _, started in running.values():
+                if started.done():
+                    # A timed-out call counts against the provider even though it may still finish
+                    provider.breaker.record_failure()
+            raise DeadlineExceeded(
+                f"no answer from {', '.join(p.name for p, _, _ in running.values())} within the deadline"
+            )
+        raise AllProvidersFailed("; ".join(f"{name}: {error}" for name, error in errors)) from (
+            errors[-1][1] if errors else None
+        )
+
+    def invoke(self, prompt, config=None, **kwargs):
+        return self._invoke(prompt, config=config, **kwargs)
+
+    def stream(self, prompt, config=None, deadline_seconds: Optional[float] = None, **kwargs):
+        """Stream from the first provider that produces a first chunk in time; no hedging mid-stream"""
+        budget = deadline_seconds or self.deadline_seconds
+        deadline = None
+        errors = []
+        for provider in self._candidates():
+            if deadline is not None and deadline <= time.monotonic():
+                break
+            claim = provider.breaker.claim()
+            if claim is None:
+                continue
+            with get_scheduler().slot(provider.name):
+                # As in invoke, the deadline runs from when the first call leaves the scheduler queue
+                if deadline is None:
+                    deadline = time.monotonic() + budget
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if claim == "trial":
+                        provider.breaker.release()
+                    break
+                start = time.perf_counter()
+                iterator = iter(provider.model.stream(prompt, config=config, **kwargs))
+                # Wait for the first chunk off-thread so a stalled provider can be abandoned
+                first = _spawn(next, iterator, None)
+                timeout = remaining
+                if provider is not self.providers[-1]:
+                    timeout = min(remaining / 2, max(self.hedge_delay(provider), 0.001) * 2)
+                try:
+                    chunk = first.result(timeout=timeout)
+                except Exception as e:
+                    provider.record(time.perf_counter() - start, False)
+                    errors.append((provider.name, e))
+                    continue
+                try:
+                    if chunk is not None:
+                        yield chunk
+                    for chunk in iterator:
+                        yield chunk
+                except GeneratorExit:
+                    # The caller stopped reading; the provider did answer
+                    provider.record(time.perf_counter() - start, True)
+                    raise
+                except Exception:
+                    provider.record(time.perf_counter() - start, False)
+                    raise
+            provider.record(time.perf_counter() - start, True)
+            return
+        raise AllProvidersFailed("; ".join(f"{name}: {error!r}" for name, error in errors)
+                                 or "deadline exceeded or every provider's circuit is open")
+
+    def batch(self, prompts, config=None, return_exceptions: bool = False, **kwargs):
+        """Invoke every prompt concurrently, each with its own hedging and failover"""
+        futures = [_spawn(self._invoke, prompt, None, config, None, **kwargs) for prompt in prompts]
+        results = []
+        for future in futures:
+            error = future.exception()
+            if error is not None and not return_exceptions:
+                raise error
+            results.append(error if error is not None else future.result())
+        return results
+
+    def with_structured_output(self, schema, **kwargs):
+        return _StructuredPool(self, schema)
+
+    def stats(self) -> List[dict]:
+        rows = []
+        for provider in self.providers:
+            p50, p90 = provider.percentile(0.5), provider.percentile(0.9)
+            rows.append(dict(
+                provider.counters,
+                name=provider.name,
+                circuit=provider.breaker.state,
+                p50_ms=round(p50 * 1000) if p50 is not None else None,
+                p90_ms=round(p90 * 1000) if p90 is not None else None,
+                hedge_after_ms=round(self.hedge_delay(provider) * 1000),
+            ))
+        return rows
+
+
+class _StructuredPool:
+    def __init__(self, pool: ProviderPool, schema):
+        self.pool = pool
+        self.schema = schema
+
+    def invoke(self, prompt, config=None, **kwargs):
+        return self.pool._invoke(prompt, self.schema, config, **kwargs)
@@ -0,0 +1,112 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_lock = threading.RLock()
+_instances = {}
+
+
+class MissingCredentials(RuntimeError):
+    """Raised when no API key is configured for a provider"""
+
+
+def _shared(name: str, factory):
+    """Build a process-wide instance once, on first use"""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        if name not in _instances:
+            _instances[name] = factory()
+        return _instances[name]
+
+
+def _build_gemini():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model="gemini-1.5-flash",
+        temperature=0,
+        max_tokens=None,
+        timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "45")),
+        max_retries=1,
+        api_key=os.getenv("GEMINI_API_KEY")
+    )
+
+
+def _build_together():
+    from langchain_together import ChatTogether
+    return ChatTogether(
+        model="meta-llama/Llama-3.3-70B-Instruct-Turbo-Free",
+        timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "45")),
+        max_retries=1,
+        together_api_key=os.getenv("TOGETHER_API_KEY")
+    )
+
+
+# Provider name -> (API key variable, builder), in default order of preference
+_CHAT_PROVIDERS = {
+    "gemini": ("GEMINI_API_KEY", _build_gemini),
+    "together": ("TOGETHER_API_KEY", _build_together),
+}
+
+
+def _build_chat_model():
+    # SDK imports are deferred so importing the app does not pay for them
+    from provider_pool import Provider, ProviderPool
+    order = [name.strip() for name in os.getenv("LLM_PROVIDERS", ",".join(_CHAT_PROVIDERS)).split(",") if name.strip()]
+    pool = [
+        Provider(name, _CHAT_PROVIDERS[name][1]())
+        for name in order
+        if name in _CHAT_PROVIDERS and os.getenv(_CHAT_PROVIDERS[name][0])
+    ]
+    if not pool:
+        raise MissingCredentials("No API keys found. Please set GEMINI_API_KEY or TOGETHER_API_KEY in your .env file.")
+    return ProviderPool(
+        pool,
+        deadline_seconds=float(os.getenv("LLM_DEADLINE_SECONDS", "60")),
+        hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9")),
+    )
+
+
+def _build_image_client():
+    if not os.getenv("GEMINI_API_KEY"):
+        raise MissingCredentials("GEMINI_API_KEY is required for crime scene generation.")
+    from google import genai
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+def _build_http_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_chat_model():
+    """Shared provider pool over every configured chat model, used by all sessions"""
+    return _shared("chat_model", _build_chat_model)
+
+
+def get_image_client():
+    """Shared google-genai client for image generation"""
+    return _shared("image_client", _build_image_client)
+
+
+def get_http_session() -> requests.Session:
+    """Shared keep-alive session for image requests"""
+    return _shared("http_session", _build_http_session)
+
+
+def install(name: str, instance):
+    """Use a prebuilt instance instead of building one, e.g. a stub for offline benchmarks"""
+    with _lock:
+        _instances[name] = instance
+
+
+def reset():
+    """Drop every shared instance, e.g. after changing API keys"""
+    with _lock:
+        _instances.clear()
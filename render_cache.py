@@ -0,0 +1,107 @@
+import threading
+from io import BytesIO
+from typing import Dict, Optional, Tuple, Union
+
+from PIL import Image, features
+
+from tracing import span
+
+CHAT_WIDTH = 150
+PORTRAIT_WIDTH = 300
+SCENE_WIDTH = 1280
+
+# Stored images are re-encoded to this format at display resolution
+COMPACT_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+COMPACT_MIME = f"image/{COMPACT_FORMAT.lower()}"
+
+
+def decode_image(data: bytes) -> Image.Image:
+    image = Image.open(BytesIO(data))
+    image.load()
+    return image
+
+
+def decoded_size(image: Union[bytes, Image.Image]) -> int:
+    """Bytes the image takes as a decoded bitmap; reads only the header of encoded bytes"""
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(BytesIO(image))
+    return image.width * image.height * len(image.getbands())
+
+
+def compact_image(image: Union[bytes, Image.Image], max_width: int = PORTRAIT_WIDTH, quality: int = 80) -> bytes:
+    """Encode an image as compressed bytes no wider than ``max_width``.
+
+    Bytes already in the compact format and small enough are returned as they
+    are, so nothing is decoded.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        header = Image.open(BytesIO(image))
+        if header.format == COMPACT_FORMAT and header.width <= max_width:
+            return bytes(image)
+        image = decode_image(image)
+    with span("render", "compact") as call:
+        compact = image.convert("RGB")
+        if compact.width > max_width:
+            compact.thumbnail((max_width, max_width * 4), Image.LANCZOS)
+        buffer = BytesIO()
+        compact.save(buffer, format=COMPACT_FORMAT, quality=quality)
+        data = buffer.getvalue()
+        call.bytes = len(data)
+    return data
+
+
+class ThumbnailCache:
+    """Display-sized, pre-encoded suspect images keyed by suspect, image version and width.
+
+    Encoding happens once per image swap instead of once per message per rerun.
+    ``source`` may be compact bytes, which are decoded only on a miss and
+    returned as they are, without caching, when already narrow enough.
+    """
+
+    def __init__(self, quality: int = 85):
+        self.quality = quality
+        self._entries: Dict[Tuple[str, int, int], bytes] = {}
+        self._lock = threading.Lock()
+        self.encodes = 0
+        self.hits = 0
+
+    def cached(self, suspect_id: str, version: int, width: int) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get((suspect_id, version, width))
+            if data is not None:
+                self.hits += 1
+            return data
+
+    def get(self, suspect_id: str, version: int, source: Union[bytes, Image.Image], width: int) -> bytes:
+        key = (suspect_id, version, width)
+        data = self.cached(*key)
+        if data is not None:
+            return data
+
+        if isinstance(source, (bytes, bytearray)):
+            if Image.open(BytesIO(source)).width <= width:
+                # Already display-sized: no copy is kept, the caller's store owns these bytes
+                return source
+            source = decode_image(source)
+        with span("render", "thumbnail") as call:
+            thumbnail = source.convert("RGB")
+            thumbnail.thumbnail((width, width * 4), Image.LANCZOS)
+            buffer = BytesIO()
+            thumbnail.save(buffer, format="JPEG", quality=self.quality)
+            data = buffer.getvalue()
+            call.bytes = len(data)
+
+        with self._lock:
+            self._entries[key] = data
+            self.encodes += 1
+        return data
+
+    def invalidate(self, suspect_id: str = None):
+        """Drop cached encodes for one suspect, or for all when suspect_id is None"""
+        with self._lock:
+            for key in [k for k in self._entries if suspect_id is None or k[0] == suspect_id]:
+                del self._entries[key]
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(len(data) for data in self._entries.values())
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, Iterable, Optional, Tuple
+
+CACHED_NODES = ("default", "solution", "router")
+
+# Model attributes that change the output and so belong in the key
+_MODEL_PARAMS = ("temperature", "max_tokens", "max_output_tokens", "top_p", "top_k", "stop")
+
+
+def _render_prompt(prompt) -> list:
+    """Canonical form of a string or message-list prompt"""
+    if isinstance(prompt, str):
+        return [["text", prompt]]
+    if isinstance(prompt, (list, tuple)):
+        return [[getattr(message, "type", type(message).__name__), str(getattr(message, "content", message))]
+                for message in prompt]
+    return [[type(prompt).__name__, str(prompt)]]
+
+
+def model_id(model) -> str:
+    for attribute in ("model_name", "model"):
+        value = getattr(model, attribute, None)
+        if isinstance(value, str):
+            return value
+    return type(model).__name__
+
+
+def model_params(model) -> Dict[str, object]:
+    params = {}
+    for name in _MODEL_PARAMS:
+        value = getattr(model, name, None)
+        if value is not None:
+            params[name] = value if isinstance(value, (int, float, str, bool)) else repr(value)
+    return params
+
+
+class ResponseCache:
+    """Exact-match cache for model replies: an in-memory LRU plus an optional disk tier.
+
+    Keys hash the model ID, its sampling parameters and the rendered prompt.
+    Replies from deterministic calls (temperature 0 or unset) live for
+    ``ttl_seconds``; sampled ones for ``sampled_ttl_seconds``, and calls above
+    ``max_temperature`` are never cached.
+    """
+
+    def __init__(self, max_items: int = 256, directory: Optional[str] = None, ttl_seconds: float = 3600,
+                 sampled_ttl_seconds: float = 300, max_temperature: float = 1.0):
+        self.max_items = max_items
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.sampled_ttl_seconds = sampled_ttl_seconds
+        self.max_temperature = max_temperature
+        self._memory: "OrderedDict[str, Tuple[float, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._nodes: Dict[str, Dict[str, float]] = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(model, prompt) -> str:
+        material = json.dumps(
+            {"model": model_id(model), "params": model_params(model), "prompt": _render_prompt(prompt)},
+            sort_keys=True, separators=(",", ":"),
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, model) -> Optional[float]:
+        """Seconds a reply from ``model`` may be reused, or None when it must not be cached"""
+        temperature = getattr(model, "temperature", None)
+        if temperature is None or temperature == 0:
+            return self.ttl_seconds
+        if temperature > self.max_temperature:
+            return None
+        return self.sampled_ttl_seconds
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (content, latency_ms of the original call), or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return entry[1], entry[2]
+                del self._memory[key]
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored["expires"] <= now:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        self._remember(key, stored["expires"], stored["content"], stored["latency_ms"])
+        return stored["content"], stored["latency_ms"]
+
+    def put(self, key: str, content: str, latency_ms: float, ttl_seconds: float):
+        expires = time.time() + ttl_seconds
+        self._remember(key, expires, content, latency_ms)
+        if not self.directory:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump({"expires": expires, "content": content, "latency_ms": latency_ms}, f)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+
+    def _remember(self, key: str, expires: float, content: str, latency_ms: float):
+        with self._lock:
+            self._memory[key] = (expires, content, latency_ms)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def record(self, node: str, hit: bool, saved_ms: float = 0.0):
+        with self._lock:
+            stats = self._nodes.setdefault(node, {"hits": 0, "misses": 0, "saved_ms": 0.0})
+            stats["hits" if hit else "misses"] += 1
+            stats["saved_ms"] += saved_ms
+
+    def stats(self) -> dict:
+        """Per-node hits, misses, hit rate and model time saved, plus the memory tier size"""
+        with self._lock:
+            nodes = {node: dict(stats) for node, stats in self._nodes.items()}
+            items = len(self._memory)
+        for stats in nodes.values():
+            total = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return {"nodes": nodes, "memory_items": items, "max_items": self.max_items}
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+
+class CachedModel:
+    """Wraps a chat model so calls for ``nodes`` are answered from a ResponseCache.
+
+    The node is taken from ``config["run_name"]``. Everything else, including
+    ``batch`` and ``with_structured_output``, goes straight to the wrapped model.
+    """
+
+    def __init__(self, model, cache: ResponseCache, nodes: Iterable[str] = CACHED_NODES):
+        self.model = model
+        self.cache = cache
+        self.nodes = frozenset(nodes)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _lookup(self, prompt, config) -> Tuple[Optional[str], Optional[str], Optional[float], Optional[str]]:
+        """Return (node, key, ttl, cached content) for a call; key is None when it is not cacheable"""
+        node = (config or {}).get("run_name")
+        if node not in self.nodes:
+            return node, None, None, None
+        ttl = self.cache.ttl_for(self.model)
+        if ttl is None:
+            return node, None, None, None
+        key = self.cache.key(self.model, prompt)
+        start = time.perf_counter()
+        cached = self.cache.get(key)
+        if cached is None:
+            return node, key, ttl, None
+        content, original_ms = cached
+        self.cache.record(node, True, max(original_ms - (time.perf_counter() - start) * 1000, 0.0))
+        return node, key, ttl, content
+
+    def invoke(self, prompt, config=None, **kwargs):
+        node, key, ttl, content = self._lookup(prompt, config)
+        if content is not None:
+            return SimpleNamespace(content=content)
+        start = time.perf_counter()
+        result = self.model.invoke(prompt, config=config, **kwargs)
+        if key is not None:
+            text = result.content if hasattr(result, "content") else result
+            if isinstance(text, str):
+                self.cache.put(key, text, (time.perf_counter() - start) * 1000, ttl)
+            self.cache.record(node, False)
+        return result
+
+    def stream(self, prompt, config=None, **kwargs):
+        node, key, ttl, content = self._lookup(prompt, config)
+        if content is not None:
+            yield SimpleNamespace(content=content)
+            return
+        start = time.perf_counter()
+        parts = []
+        for chunk in self.model.stream(prompt, config=config, **kwargs):
+            token = chunk.content if hasattr(chunk, "content") else chunk
+            if isinstance(token, str):
+                parts.append(token)
+            yield chunk
+        # Only a stream that ran to completion is stored
+        if key is not None:
+            self.cache.put(key, "".join(parts), (time.perf_counter() - start) * 1000, ttl)
+            self.cache.record(node, False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache configured from RESPONSE_CACHE_SIZE, RESPONSE_CACHE_DIR and RESPONSE_CACHE_TTL"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                max_items=int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+                directory=os.getenv("RESPONSE_CACHE_DIR") or None,
+                ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+                max_temperature=float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", "1.0")),
+            )
+        return _cache
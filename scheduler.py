@@ -0,0 +1,228 @@
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+INTERACTIVE = 0
+EMOTION = 1
+PORTRAIT = 2
+BACKGROUND = 3
+PRIORITY_NAMES = ("interactive", "emotion", "portrait", "background")
+
+# Resource -> (requests per second, max concurrent calls); a rate of 0 means unlimited
+DEFAULT_LIMITS: Dict[str, Tuple[float, int]] = {
+    "gemini": (4, 8),
+    "together": (1, 4),
+    "pollinations": (3, 6),
+    "gemini-image": (0.5, 2),
+}
+_FALLBACK_LIMIT = (0, 8)
+
+_priority: ContextVar[int] = ContextVar("priority", default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextmanager
+def priority(level: int):
+    """Run outbound calls made in this block (and threads copied from it) at ``level``"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def run_at(level: int, fn, *args, **kwargs):
+    """Call ``fn`` at ``level``; handy for jobs handed to a worker"""
+    with priority(level):
+        return fn(*args, **kwargs)
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second on average, with bursts up to ``burst``"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available; 0 when one is available now"""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        if self.rate:
+            self.tokens -= 1
+
+
+class _Resource:
+    """Priority queue, concurrency limit and rate limit for one provider endpoint"""
+
+    def __init__(self, name: str, rate: float, concurrency: int, reserve: int, window: int = 500):
+        self.name = name
+        self.bucket = TokenBucket(rate, max(1, concurrency))
+        self.concurrency = concurrency
+        # Slots only interactive calls may take, so background work cannot fill the endpoint
+        self.reserve = min(reserve, concurrency - 1)
+        self.active = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self.waits = {level: deque(maxlen=window) for level in range(len(PRIORITY_NAMES))}
+        self.counts = {level: 0 for level in range(len(PRIORITY_NAMES))}
+
+    def _has_slot(self, level: int) -> bool:
+        limit = self.concurrency - (self.reserve if level > INTERACTIVE else 0)
+        return self.active < limit
+
+    def acquire(self, level: int) -> float:
+        """Block until this call may start; returns the seconds spent queued"""
+        start = time.monotonic()
+        with self._condition:
+            entry = (level, next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    if self._waiting[0] == entry and self._has_slot(level):
+                        delay = self.bucket.wait_time()
+                        if delay == 0:
+                            heapq.heappop(self._waiting)
+                            self.bucket.take()
+                            self.active += 1
+                            # The next caller in line may be able to start too
+                            self._condition.notify_all()
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+            except BaseException:
+                # Leave the queue so callers behind this one are not stuck
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+                raise
+            waited = time.monotonic() - start
+            self.waits[level].append(waited)
+            self.counts[level] += 1
+        return waited
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            queued = len(self._waiting)
+            waits = {level: sorted(samples) for level, samples in self.waits.items()}
+            counts = dict(self.counts)
+        classes = {}
+        for level, samples in waits.items():
+            if not counts[level]:
+                continue
+            classes[PRIORITY_NAMES[level]] = {
+                "calls": counts[level],
+                "queue_p50_ms": round(_nearest_rank(samples, 0.5) * 1000, 1),
+                "queue_p95_ms": round(_nearest_rank(samples, 0.95) * 1000, 1),
+                "queue_max_ms": round(samples[-1] * 1000, 1),
+            }
+        return {"active": self.active, "queued": queued, "concurrency": self.concurrency,
+                "rate": self.bucket.rate, "classes": classes}
+
+
+def _nearest_rank(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+
+class Scheduler:
+    """Process-wide gate for outbound model and image calls.
+
+    Each resource (a provider endpoint) has a token-bucket rate limit and a
+    concurrency limit. Waiting calls start in priority order (interactive,
+    emotion, portrait, background), first come first served within a class,
+    and ``reserve`` slots per resource are kept for interactive calls.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, int]]] = None, reserve: int = 1,
+                 enabled: bool = True):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.reserve = reserve
+        self.enabled = enabled
+        self._resources: Dict[str, _Resource] = {}
+        self._lock = threading.Lock()
+
+    def _resource(self, name: str) -> _Resource:
+        with self._lock:
+            resource = self._resources.get(name)
+            if resource is None:
+                rate, concurrency = self.limits.get(name, _FALLBACK_LIMIT)
+                resource = self._resources[name] = _Resource(name, rate, concurrency, self.reserve)
+            return resource
+
+    def slot(self, resource: str, level: Optional[int] = None):
+        """Context manager holding one call slot on ``resource`` at ``level`` (default: the current priority)"""
+        if not self.enabled:
+            return nullcontext()
+        return self._slot(self._resource(resource), current_priority() if level is None else level)
+
+    @contextmanager
+    def _slot(self, resource: _Resource, level: int):
+        resource.acquire(level)
+        try:
+            yield
+        finally:
+            resource.release()
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            resources = dict(self._resources)
+        return {name: resource.stats() for name, resource in sorted(resources.items())}
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[float, int]]:
+    """Parse "gemini=4:8,pollinations=3:6" (requests per second : concurrent calls)"""
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        rate, _, concurrency = value.partition(":")
+        limits[name.strip()] = (float(rate or 0), int(concurrency or _FALLBACK_LIMIT[1]))
+    return limits
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """Process-wide scheduler configured from SCHEDULER, SCHEDULER_LIMITS and SCHEDULER_RESERVE"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            limits = dict(DEFAULT_LIMITS)
+            limits.update(parse_limits(os.getenv("SCHEDULER_LIMITS", "")))
+            _scheduler = Scheduler(
+                limits,
+                reserve=int(os.getenv("SCHEDULER_RESERVE", "1")),
+                enabled=os.getenv("SCHEDULER", "1") != "0",
+            )
+        return _scheduler
@@ -0,0 +1,89 @@
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import List, NamedTuple, Optional, Tuple
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class LogRecord(NamedTuple):
+    created: float
+    level: int
+    message: str
+    args: tuple
+
+    def format(self) -> str:
+        try:
+            return self.message % self.args if self.args else self.message
+        except (TypeError, ValueError):
+            return f"{self.message} {self.args}"
+
+
+class SessionLog:
+    """Fixed-capacity, leveled log for one session.
+
+    Records below ``level`` are dropped before any formatting happens, and
+    ``%``-style arguments are only formatted when the log is viewed.
+    """
+
+    def __init__(self, capacity: int = 500, level: int = INFO):
+        self.level = level
+        self._records = deque(maxlen=capacity)
+        self.dropped = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._records.maxlen
+
+    def log(self, level: int, message: str, *args):
+        if level < self.level:
+            return
+        if len(self._records) == self._records.maxlen:
+            self.dropped += 1
+        self._records.append(LogRecord(time.time(), level, message, args))
+
+    def debug(self, message: str, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message: str, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message: str, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message: str, *args):
+        self.log(ERROR, message, *args)
+
+    def entries(self, min_level: int = DEBUG, limit: int = None) -> List[Tuple[str, str, str]]:
+        """Formatted (time, level, message) tuples, newest last"""
+        records = [record for record in list(self._records) if record.level >= min_level]
+        if limit is not None:
+            records = records[-limit:]
+        return [
+            (time.strftime("%H:%M:%S", time.localtime(record.created)), LEVEL_NAMES[record.level], record.format())
+            for record in records
+        ]
+
+    def __len__(self):
+        return len(self._records)
+
+    def clear(self):
+        self._records.clear()
+        self.dropped = 0
+
+
+_current: ContextVar[Optional[SessionLog]] = ContextVar("session_log", default=None)
+
+
+def use_log(log: Optional[SessionLog]):
+    """Send engine log lines from this context (and contexts copied from it) to ``log``"""
+    _current.set(log)
+
+
+def current_log() -> Optional[SessionLog]:
+    return _current.get()
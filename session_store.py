@@ -0,0 +1,276 @@
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from case_model import Case
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS state_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS state_events_session ON state_events (session_id, key, id);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    mime_type TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artifact_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    hash TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifact_events_session ON artifact_events (session_id, name, id);
+"""
+
+
+class SessionStore:
+    """Append-only SQLite store for resumable game sessions.
+
+    Transcript turns are appended once each, state changes are recorded as
+    per-key events (latest wins on load), and artifacts are stored once per
+    content hash and referenced by name. Nothing is ever rewritten in place.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        # Per-session caches so each write only sends what changed
+        self._turn_counts: Dict[str, int] = {}
+        self._segment_starts: Dict[str, int] = {}
+        self._last_state: Dict[str, Dict[str, str]] = {}
+        self._last_artifacts: Dict[str, Dict[str, Optional[str]]] = {}
+
+    def create_session(self, session_id: Optional[str] = None) -> str:
+        """Create a session, under ``session_id`` when given; an id that already exists is left as it is"""
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock, self._conn:
+            created = self._conn.execute("INSERT OR IGNORE INTO sessions (id, created) VALUES (?, ?)",
+                                         (session_id, time.time())).rowcount
+            if created:
+                self._turn_counts[session_id] = 0
+                self._segment_starts[session_id] = 0
+                self._last_state[session_id] = {}
+                self._last_artifacts[session_id] = {}
+        return session_id
+
+    def forget(self, session_id: str):
+        """Drop the per-session write caches, e.g. when the session is unloaded; ``load`` rebuilds them"""
+        with self._lock:
+            for cache in (self._turn_counts, self._segment_starts, self._last_state, self._last_artifacts):
+                cache.pop(session_id, None)
+
+    def has_session(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def revision(self, session_id: str) -> tuple:
+        """Changes whenever anything is written for the session, by this process or another"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM turns WHERE session_id = ?), "
+                "(SELECT MAX(id) FROM state_events WHERE session_id = ?), "
+                "(SELECT MAX(id) FROM artifact_events WHERE session_id = ?)",
+                (session_id, session_id, session_id),
+            ).fetchone()
+
+    def sync_transcript(self, session_id: str, chat_history: List[dict]) -> int:
+        """Append the messages not stored yet; returns how many were written.
+
+        A history shorter than what is stored (a new case) starts a new
+        transcript segment with a ``reset`` marker instead of deleting turns.
+        """
+        with self._lock, self._conn:
+            stored = self._turn_count(session_id)
+            if len(chat_history) < stored - self._segment_start(session_id):
+                self._append_turn(session_id, stored, "reset", "")
+                stored += 1
+                self._segment_starts[session_id] = stored
+            new = chat_history[stored - self._segment_start(session_id):]
+            for offset, message in enumerate(new):
+                self._append_turn(session_id, stored + offset, message.get("role", ""), message.get("content", ""))
+            self._turn_counts[session_id] = stored + len(new)
+        return len(new)
+
+    def _turn_count(self, session_id: str) -> int:
+        if session_id not in self._turn_counts:
+            row = self._conn.execute("SELECT COUNT(*) FROM turns WHERE session_id = ?", (session_id,)).fetchone()
+            self._turn_counts[session_id] = row[0]
+        return self._turn_counts[session_id]
+
+    def _segment_start(self, session_id: str) -> int:
+        """Sequence number where the current transcript segment begins"""
+        if session_id not in self._segment_starts:
+            row = self._conn.execute(
+                "SELECT MAX(seq) FROM turns WHERE session_id = ? AND role = 'reset'", (session_id,)
+            ).fetchone()
+            self._segment_starts[session_id] = 0 if row[0] is None else row[0] + 1
+        return self._segment_starts[session_id]
+
+    def _append_turn(self, session_id: str, seq: int, role: str, content: str):
+        self._conn.execute(
+            "INSERT INTO turns (session_id, seq, role, content, created) VALUES (?, ?, ?, ?, ?)",
+            (session_id, seq, role, content, time.time()),
+        )
+
+    def set_state(self, session_id: str, **values: Any):
+        """Record state values that changed since the last call"""
+        now = time.time()
+        with self._lock, self._conn:
+            last = self._last_state.setdefault(session_id, {})
+            for key, value in values.items():
+                encoded = json.dumps(value, sort_keys=True, default=str)
+                if last.get(key) == encoded:
+                    continue
+                self._conn.execute(
+                    "INSERT INTO state_events (session_id, key, value, created) VALUES (?, ?, ?, ?)",
+                    (session_id, key, encoded, now),
+                )
+                last[key] = encoded
+
+    def put_artifact(self, session_id: str, name: str, data: Optional[bytes], mime_type: str = "image/png") -> Optional[str]:
+        """Point ``name`` at ``data`` (stored once per content hash); None clears it"""
+        digest = hashlib.sha256(data).hexdigest() if data is not None else None
+        with self._lock, self._conn:
+            last = self._last_artifacts.setdefault(session_id, {})
+            if name in last and last[name] == digest:
+                return digest
+            if data is not None:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs (hash, mime_type, data) VALUES (?, ?, ?)",
+                    (digest, mime_type, sqlite3.Binary(data)),
+                )
+            self._conn.execute(
+                "INSERT INTO artifact_events (session_id, name, hash, created) VALUES (?, ?, ?, ?)",
+                (session_id, name, digest, time.time()),
+            )
+            last[name] = digest
+        return digest
+
+    def get_artifact(self, session_id: str, name: str) -> Optional[bytes]:
+        """Current bytes of one artifact, or None if it was never stored or was cleared"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT b.data FROM artifact_events e LEFT JOIN blobs b ON b.hash = e.hash "
+                "WHERE e.session_id = ? AND e.name = ? ORDER BY e.id DESC LIMIT 1", (session_id, name)
+            ).fetchone()
+        return bytes(row[0]) if row and row[0] is not None else None
+
+    def load(self, session_id: str) -> Dict[str, Any]:
+        """Rebuild a session: the current transcript segment, latest state values and artifacts"""
+        with self._lock:
+            turns = self._conn.execute(
+                "SELECT role, content FROM turns WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+            state_rows = self._conn.execute(
+                "SELECT key, value FROM state_events WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+            # Only the latest event per name is joined to its blob, not every past version
+            artifact_rows = self._conn.execute(
+                "SELECT e.name, e.hash, b.data FROM artifact_events e "
+                "JOIN (SELECT MAX(id) AS id FROM artifact_events WHERE session_id = ? GROUP BY name) latest "
+                "ON latest.id = e.id LEFT JOIN blobs b ON b.hash = e.hash", (session_id,)
+            ).fetchall()
+
+            chat_history = []
+            segment_start = 0
+            for seq, (role, content) in enumerate(turns):
+                if role == "reset":
+                    chat_history = []
+                    segment_start = seq + 1
+                else:
+                    chat_history.append({"role": role, "content": content})
+            last_state = dict(state_rows)
+            state = {key: json.loads(value) for key, value in last_state.items()}
+            last_artifacts = {}
+            artifacts = {}
+            for name, digest, data in artifact_rows:
+                last_artifacts[name] = digest
+                if data is not None:
+                    artifacts[name] = bytes(data)
+            # Under the lock, so a concurrent forget or write cannot interleave with the rebuild
+            self._segment_starts[session_id] = segment_start
+            self._last_state[session_id] = last_state
+            self._last_artifacts[session_id] = last_artifacts
+            self._turn_counts[session_id] = len(turns)
+        return {"chat_history": chat_history, "state": state, "artifacts": artifacts}
+
+    def save_game_state(self, session_id: str, state: Dict[str, Any]):
+        """Persist the Agent state fields shared by the console game and the Streamlit UI"""
+        self.sync_transcript(session_id, state.get("chat_history") or [])
+        case = state.get("case")
+        self.set_state(
+            session_id,
+            case_details=state.get("case_details", ""),
+            dossiers=state.get("dossiers") or {},
+            case=case.model_dump() if case is not None else None,
+        )
+
+    def load_game_state(self, session_id: str) -> Dict[str, Any]:
+        """Load a session as Agent state fields plus any extra state values and artifacts"""
+        loaded = self.load(session_id)
+        values = loaded["state"]
+        case = values.pop("case", None)
+        return {
+            "case_details": values.pop("case_details", ""),
+            "dossiers": values.pop("dossiers", {}),
+            "case": Case.model_validate(case) if case else None,
+            "chat_history": loaded["chat_history"],
+            "extra": values,
+            "artifacts": loaded["artifacts"],
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide store at SESSION_DB (default .cache/sessions.sqlite3).
+
+    SESSION_STORE="module:factory" swaps in another backend, e.g. one shared
+    by engine workers on several machines. The factory takes no arguments and
+    returns an object with SessionStore's public methods.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            factory = os.getenv("SESSION_STORE")
+            if factory:
+                module_name, _, attribute = factory.partition(":")
+                _store = getattr(importlib.import_module(module_name), attribute)()
+            else:
+                _store = SessionStore(os.getenv(
+                    "SESSION_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sessions.sqlite3")
+                ))
+        return _store
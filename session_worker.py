@@ -0,0 +1,83 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class SessionWorker:
+    """Per-session background queue whose jobs are keyed, e.g. by suspect.
+
+    Submitting a job for a key supersedes any older job for the same key: the
+    older one is skipped if it has not started, and its result is discarded if
+    it has. Results are collected with ``drain`` on the script thread.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session-worker")
+        self._lock = threading.Lock()
+        # Notified whenever a job finishes or is superseded, for ``wait``
+        self._changed = threading.Condition(self._lock)
+        self._generations: Dict[str, int] = {}
+        self._running: Dict[str, int] = {}
+        self._completed: Dict[str, Tuple[Any, Optional[BaseException]]] = {}
+
+    def submit(self, key: str, fn: Callable[[], Any]):
+        with self._lock:
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+            self._running[key] = generation
+            self._completed.pop(key, None)
+        # Jobs see the submitter's context variables, e.g. its session tracer
+        self._executor.submit(contextvars.copy_context().run, self._run, key, generation, fn)
+
+    def _is_current(self, key: str, generation: int) -> bool:
+        return self._generations.get(key) == generation
+
+    def _run(self, key: str, generation: int, fn: Callable[[], Any]):
+        with self._lock:
+            if not self._is_current(key, generation):
+                return
+        result, error = None, None
+        try:
+            result = fn()
+        except Exception as e:
+            error = e
+        with self._lock:
+            if self._is_current(key, generation):
+                self._completed[key] = (result, error)
+                self._running.pop(key, None)
+                self._changed.notify_all()
+
+    def wait(self, key: str, timeout: Optional[float] = None) -> bool:
+        """Block until the current job for ``key``, if any, has finished; False on timeout"""
+        with self._lock:
+            return self._changed.wait_for(lambda: key not in self._running, timeout)
+
+    def pending(self) -> bool:
+        """True while any current job has not finished"""
+        with self._lock:
+            return bool(self._running)
+
+    def has_completed(self) -> bool:
+        with self._lock:
+            return bool(self._completed)
+
+    def drain(self) -> List[Tuple[str, Any, Optional[BaseException]]]:
+        """Pop finished results as (key, result, error)"""
+        with self._lock:
+            completed, self._completed = self._completed, {}
+        return [(key, result, error) for key, (result, error) in completed.items()]
+
+    def clear(self):
+        """Supersede every queued and running job, e.g. when the case is reset"""
+        with self._lock:
+            for key in self._generations:
+                self._generations[key] += 1
+            self._running.clear()
+            self._completed.clear()
+            self._changed.notify_all()
+
+    def close(self):
+        """Supersede every job and let the worker threads exit once idle"""
+        self.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
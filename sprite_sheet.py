@@ -0,0 +1,75 @@
+import contextvars
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+class SpriteSheet:
+    """Pre-renders emotion portraits for every suspect on background threads.
+
+    Jobs are processed in the order given, so callers put the most likely
+    emotions first. ``cancel`` stops the job before the next fetch starts.
+    Sprites are held as the encoded bytes ``fetch`` returns, not as bitmaps.
+    """
+
+    def __init__(self, jobs: Iterable[Tuple[str, str, str]], fetch: Callable[[str], bytes], workers: int = 2):
+        self._pending = deque(jobs)
+        self.total = len(self._pending)
+        self._fetch = fetch
+        self._sprites: Dict[Tuple[str, str], bytes] = {}
+        self._failed = 0
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._threads = [
+            threading.Thread(target=contextvars.copy_context().run, args=(self._run,), name=f"sprite-sheet-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self) -> "SpriteSheet":
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _run(self):
+        while not self._cancelled.is_set():
+            with self._lock:
+                if not self._pending:
+                    return
+                suspect_id, emotion, prompt = self._pending.popleft()
+            try:
+                image = self._fetch(prompt)
+            except Exception:
+                with self._lock:
+                    self._failed += 1
+                continue
+            if self._cancelled.is_set():
+                return
+            with self._lock:
+                self._sprites[(suspect_id, emotion)] = image
+
+    def get(self, suspect_id: str, emotion: str) -> Optional[bytes]:
+        """Return the pre-rendered sprite, or None if it is not ready yet"""
+        with self._lock:
+            return self._sprites.get((suspect_id, emotion))
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._lock:
+            self._pending.clear()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def progress(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "ready": len(self._sprites),
+                "failed": self._failed,
+                "pending": len(self._pending),
+                "total": self.total,
+            }
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(len(data) for data in self._sprites.values())
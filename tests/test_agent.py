@@ -0,0 +1,34 @@
+from agent import Agent
+
+
+class ScriptedModel:
+    """Streams a fixed reply token by token"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def stream(self, prompt, config=None):
+        yield from self.tokens
+
+    def invoke(self, prompt, config=None):
+        return "".join(self.tokens)
+
+
+def test_short_reply_without_header_reaches_the_token_sink():
+    agent = Agent(ScriptedModel(["I was ", "at home", " all night."]))
+    emitted = []
+    agent.on_token = emitted.append
+    state = agent._interrogate({"case_details": "A theft.", "user_input": "Where were you?", "chat_history": []}, 2)
+    assert "".join(emitted) == "I was at home all night."
+    assert state["chat_history"][-1] == {"role": "suspect 2", "content": "I was at home all night."}
+    assert agent.on_token == emitted.append
+
+
+def test_stale_ledger_result_is_ignored():
+    agent = Agent(ScriptedModel([]))
+    assert agent.merge_ledger(("FACT | suspect 1 | was at the docks", 3)) == 1
+    assert agent.merge_ledger(("FACT | suspect 1 | said she was by the docks", 2)) == 0
+    assert agent.ledger.processed == 3
+    assert agent.ledger.count() == 1
+    agent.merge_ledger((None, 1))
+    assert agent.ledger.processed == 3
@@ -0,0 +1,69 @@
+import os
+from io import BytesIO
+
+from PIL import Image
+
+from artifact_store import ArtifactStore
+from render_cache import COMPACT_FORMAT, PORTRAIT_WIDTH, compact_image, decoded_size
+
+
+def jpeg(width, height, color=(120, 40, 40)) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def test_compact_image_shrinks_to_display_width():
+    original = jpeg(1024, 1024)
+    compact = compact_image(original, PORTRAIT_WIDTH)
+    image = Image.open(BytesIO(compact))
+    assert image.format == COMPACT_FORMAT
+    assert image.width == PORTRAIT_WIDTH
+    assert len(compact) < decoded_size(original) / 100
+    # Already compact bytes pass through untouched
+    assert compact_image(compact, PORTRAIT_WIDTH) == compact
+
+
+def test_budget_spills_least_recently_used_to_disk(tmp_path):
+    store = ArtifactStore(spill_dir=str(tmp_path), budget_bytes=150)
+    for name in ("a", "b", "c"):
+        store.put(name, name.encode() * 100)
+    assert store.memory_bytes() <= 150
+    report = store.memory_report()
+    assert report["spills"] == 2 and report["spilled_bytes"] == 200
+    assert len(os.listdir(tmp_path)) == 2
+
+    # Reading a spilled artifact gives the same bytes
+    assert store.get("a") == b"a" * 100
+    store.clear()
+    assert os.listdir(tmp_path) == []
+
+
+def test_budget_drops_and_reloads_without_a_spill_dir():
+    backing = {name: name.encode() * 100 for name in ("a", "b", "c")}
+    store = ArtifactStore(budget_bytes=150, reload=backing.get)
+    for name, data in backing.items():
+        store.put(name, data)
+    report = store.memory_report()
+    assert report["evictions"] == 2 and report["dropped_bytes"] == 200
+
+    assert store.get("a") == backing["a"]
+    assert store.memory_report()["reloads"] == 1
+    # "a" is now the most recently used, so it stays and another one is dropped
+    assert store.memory_bytes() <= 150
+    assert store.get("a") == backing["a"]
+    assert store.memory_report()["reloads"] == 1
+
+
+def test_latest_artifact_stays_even_when_alone_over_budget():
+    store = ArtifactStore(budget_bytes=10, reload=lambda name: None)
+    store.put("big", b"x" * 100)
+    assert store.get("big") == b"x" * 100
+    assert store.memory_report()["evictions"] == 0
+
+
+def test_no_budget_without_somewhere_to_put_the_bytes():
+    store = ArtifactStore(budget_bytes=10)
+    store.put("a", b"a" * 100)
+    store.put("b", b"b" * 100)
+    assert store.memory_bytes() == 200
@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+
+from case_factory import CaseFactory
+from case_model import Case, SuspectProfile
+
+
+def built_case() -> dict:
+    suspects = [
+        SuspectProfile(number=n, name=f"Suspect {n}", role="guest", motive="money", access="a key",
+                       suspicious_fact="was seen nearby", evidence="a glove")
+        for n in range(1, 5)
+    ]
+    return {
+        "case": Case(crime="The necklace is gone.", suspects=suspects),
+        "case_details": "A necklace went missing.",
+        "dossiers": {},
+        "suspect_images": {f"suspect{n}": b"portrait" for n in range(1, 5)},
+        "scene": b"scene",
+    }
+
+
+def test_processes_sharing_a_pool_stop_at_its_depth(tmp_path):
+    builds = []
+    lock = threading.Lock()
+
+    def slow_build():
+        with lock:
+            builds.append(1)
+        time.sleep(0.1)
+        return built_case()
+
+    # One factory per process; each opens the lock file itself, as separate processes would
+    factories = [CaseFactory(str(tmp_path), target_depth=2, build=slow_build) for _ in range(3)]
+    for factory in factories:
+        factory.start()
+    deadline = time.monotonic() + 5
+    while factories[0].depth() < 2 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    time.sleep(0.3)
+    for factory in factories:
+        factory.stop()
+
+    assert factories[0].depth() == 2
+    assert len(builds) == 2
+    assert factories[0].pop()["case"].crime == "The necklace is gone."
+
+
+def test_stale_staging_is_cleared(tmp_path):
+    stale = tmp_path / "building" / "left-by-a-dead-process"
+    stale.mkdir(parents=True)
+    (stale / "case.json").write_text("{")
+    factory = CaseFactory(str(tmp_path), target_depth=1, build=built_case).start()
+    deadline = time.monotonic() + 5
+    while factory.depth() < 1 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    factory.stop()
+
+    assert factory.depth() == 1
+    assert os.listdir(tmp_path / "building") == []
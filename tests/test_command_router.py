@@ -0,0 +1,74 @@
+import pytest
+from langgraph.graph import END
+
+from command_router import fast_route
+
+SUSPECT_2_ANSWERED = [
+    {"role": "detective", "content": "Suspect 2, where were you?"},
+    {"role": "suspect 2", "content": "At home."},
+]
+
+
+@pytest.mark.parametrize("text", [
+    "new case",
+    "Generate a new mystery",
+    "start a case!",
+    "create mystery.",
+])
+def test_mystery_command(text):
+    assert fast_route(text, []) == "mysterygen"
+
+
+@pytest.mark.parametrize("text, route", [
+    ("suspect 4: is there a new case of wine missing?", "suspect4"),
+    ("suspect 2, are you aware of the new case against you?", "suspect2"),
+    ("Second suspect, did you start a case file on him?", "suspect2"),
+    ("Suspect 3, should I check my solution with you?", "suspect3"),
+])
+def test_named_suspect_wins_over_commands(text, route):
+    assert fast_route(text, []) == route
+
+
+@pytest.mark.parametrize("text, route", [
+    ("solution check: suspect 3 did it", "solution"),
+    ("Check my solution - the third suspect is the killer", "solution"),
+    ("help me with suspect 3", "default"),
+])
+def test_leading_command_wins_over_a_named_suspect(text, route):
+    assert fast_route(text, []) == route
+
+
+def test_mystery_words_inside_a_question_do_not_reset_the_case():
+    assert fast_route("Is there a new case of wine missing?", SUSPECT_2_ANSWERED) != "mysterygen"
+    assert fast_route("Why would anyone start a case against you?", []) is None
+
+
+def test_exit_and_solution():
+    assert fast_route("quit", []) == END
+    assert fast_route("Check my solution: the butler did it", []) == "solution"
+
+
+def test_several_suspects_go_to_the_llm():
+    assert fast_route("Suspect 1, what about suspect 2?", []) is None
+
+
+def test_follow_up_continues_with_last_suspect():
+    assert fast_route("And after that?", SUSPECT_2_ANSWERED) == "suspect2"
+    assert fast_route("Hint please", SUSPECT_2_ANSWERED) == "default"
+    assert fast_route("Give me a clue", SUSPECT_2_ANSWERED) is None
+
+
+@pytest.mark.parametrize("text", [
+    "All suspects, where were you at ten?",
+    "everyone: who saw the victim last?",
+    "All of you, who has a key?",
+    "Group question: who owns a boat?",
+])
+def test_group_address(text):
+    assert fast_route(text, []) == "group"
+
+
+def test_group_only_as_leading_address():
+    assert fast_route("suspect 2, did everyone leave by ten?", []) == "suspect2"
+    assert fast_route("Did everyone leave by ten?", SUSPECT_2_ANSWERED) == "suspect2"
+    assert fast_route("Did everyone leave by ten?", []) is None
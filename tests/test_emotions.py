@@ -0,0 +1,36 @@
+from emotions import EmotionHeaderFilter, split_emotion_header
+
+
+def stream(tokens):
+    emitted = []
+    sink = EmotionHeaderFilter(emitted.append)
+    for token in tokens:
+        sink(token)
+    return emitted, sink
+
+
+def test_header_is_held_back():
+    emitted, sink = stream(["EMOTION: ner", "vous\n", "I was ", "at home."])
+    sink.flush()
+    assert "".join(emitted) == "I was at home."
+
+
+def test_flush_emits_short_reply_without_header():
+    emitted, sink = stream(["I was ", "at home", " all night."])
+    assert emitted == []
+    sink.flush()
+    assert "".join(emitted) == "I was at home all night."
+    sink.flush()
+    assert "".join(emitted) == "I was at home all night."
+
+
+def test_flush_drops_a_lone_header():
+    emitted, sink = stream(["EMOTION: smug"])
+    sink.flush()
+    assert emitted == []
+
+
+def test_split_emotion_header():
+    assert split_emotion_header("**Emotion:** Nervous\nFine.") == ("nervous", "Fine.")
+    assert split_emotion_header("EMOTION: bored\nFine.") == (None, "Fine.")
+    assert split_emotion_header("Fine.") == (None, "Fine.")
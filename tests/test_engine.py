@@ -0,0 +1,246 @@
+import json
+import os
+import threading
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import engine
+from case_model import Case, SuspectProfile
+from engine import EngineSession, GameEngine
+from render_cache import COMPACT_MIME
+from session_store import SessionStore
+
+OLD_CASE = [
+    {"role": "detective", "content": "Suspect 1, where were you?"},
+    {"role": "suspect 1", "content": "At the docks."},
+] * 3
+
+
+class BlockingModel:
+    """Ledger extraction that waits until the test lets it answer"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def invoke(self, prompt, config=None):
+        self.started.set()
+        self.release.wait(5)
+        return self.reply
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SessionStore(str(tmp_path / "sessions.sqlite3"))
+
+
+def wait_idle(session):
+    for _ in range(500):
+        if not session.worker.pending():
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("background jobs did not finish")
+
+
+def test_ledger_extraction_from_a_reset_case_is_dropped(store):
+    model = BlockingModel("FACT | suspect 1 | old case: was at the docks")
+    session = EngineSession(store.create_session(), store, model)
+    session._queue_ledger_update(OLD_CASE)
+    assert model.started.wait(5)
+
+    # A new case starts while the old case's extraction is still running
+    session._reset()
+    session.agent.ledger.reset()
+    model.release.set()
+    # clear() stopped tracking the job, so wait for its thread to finish instead
+    session.worker._executor.shutdown(wait=True)
+    session._apply_background_results()
+
+    assert session.agent.ledger.count() == 0
+    assert session.agent.ledger.processed == 0
+
+
+def test_ledger_extraction_is_merged_when_applied(store):
+    model = BlockingModel("FACT | suspect 1 | was at the docks")
+    model.release.set()
+    session = EngineSession(store.create_session(), store, model)
+    session._queue_ledger_update(OLD_CASE)
+    wait_idle(session)
+    assert session.agent.ledger.count() == 0
+
+    assert session._apply_background_results()
+    assert session.agent.ledger.count() == 1
+    assert session.agent.ledger.processed == len(OLD_CASE)
+
+
+def test_closing_a_session_drops_its_store_caches(store):
+    engine = GameEngine(store, llm=object(), max_sessions=1, reap_seconds=60)
+    first = engine.create_session()
+    engine.session(first).reset()
+    assert first in store._last_state
+
+    engine.create_session()
+    assert engine.stats()["evicted"] == 1
+    assert all(first not in cache for cache in
+               (store._turn_counts, store._segment_starts, store._last_state, store._last_artifacts))
+
+    # Reloading rebuilds them from the store
+    engine.session(first)
+    assert first in store._last_state
+
+
+def test_open_session_creates_a_fresh_client_id(store):
+    engine = GameEngine(store, llm=object(), reap_seconds=60)
+    session_id = "0123456789abcdef" * 2
+    assert engine.open_session(session_id) == session_id
+    assert store.has_session(session_id)
+    assert engine.open_session(session_id) == session_id
+    assert engine.open_session("../other") != "../other"
+
+
+class NotifyingStore(SessionStore):
+    """Calls ``on_write`` after every state write, while the writer still holds the session lock"""
+
+    on_write = None
+
+    def set_state(self, session_id, **values):
+        super().set_state(session_id, **values)
+        if self.on_write is not None:
+            self.on_write()
+
+
+def test_session_being_saved_is_not_mistaken_for_another_workers(tmp_path):
+    store = NotifyingStore(str(tmp_path / "sessions.sqlite3"))
+    engine = GameEngine(store, llm=object(), reap_seconds=60)
+    session_id = engine.create_session()
+    session = engine.session(session_id)
+
+    # A snapshot request arrives after the store write but before the session records its revision
+    seen = []
+    lookup = threading.Thread(target=lambda: seen.append(engine.session(session_id)))
+
+    def look_up_once():
+        store.on_write = None
+        lookup.start()
+        lookup.join(0.2)
+
+    store.on_write = look_up_once
+    session.reset()
+    lookup.join()
+
+    assert seen == [session]
+    assert engine.stats()["reloaded"] == 0
+
+
+def make_case():
+    suspects = [
+        SuspectProfile(number=n, name=f"Suspect {n}", role="guest", motive="money", access="a key",
+                       suspicious_fact="was seen nearby", evidence="a glove")
+        for n in range(1, 5)
+    ]
+    return Case(crime="The necklace is gone.", suspects=suspects)
+
+
+def portrait(color) -> bytes:
+    # Noise, so the compact encoding stays about 36 KB
+    image = Image.effect_noise((600, 600), 64).convert("RGB")
+    image.paste(color, (0, 0, 100, 100))
+    buffer = BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_images_stay_under_the_session_budget_and_survive_a_reload(store, monkeypatch):
+    # Room for two compact portraits
+    monkeypatch.setenv("SESSION_IMAGE_BUDGET_MB", str(80 / 1024))
+    monkeypatch.delenv("ARTIFACT_SPILL_DIR", raising=False)
+    monkeypatch.setattr(engine, "start_sprite_prerender", lambda descriptions: None)
+    session = EngineSession(store.create_session(), store, object())
+    case = make_case()
+    session.case, session.case_details = case, case.briefing()
+    session.state_tracker = {"case": case, "case_details": case.briefing(), "dossiers": {}, "chat_history": []}
+    session.case_started = True
+    colors = ["red", "green", "blue", "yellow"]
+    for n, color in enumerate(colors, 1):
+        session._set_suspect_image(f"suspect{n}", portrait(color))
+    session._persist()
+
+    report = session.artifacts.memory_report()
+    assert report["memory_bytes"] <= report["budget_bytes"]
+    assert report["evictions"] == 2
+    assert report["decoded_bytes"] == 4 * 600 * 600 * 3
+
+    # Dropped portraits come back from the session store, unchanged
+    versions = {name: session.versions[name] for name in session.suspect_images.values()}
+    data, mime_type, version = session.artifact("portrait:suspect1")
+    assert version == versions["portrait:suspect1"] == engine.artifact_version(data)
+    assert mime_type == COMPACT_MIME
+    assert session.artifacts.memory_report()["reloads"] == 1
+    assert session.artifacts.memory_bytes() <= report["budget_bytes"]
+
+    # Another worker resumes the session with the same images
+    resumed = EngineSession(session.session_id, store, object())
+    resumed.resume()
+    assert resumed.case == case
+    for name, version in versions.items():
+        assert resumed.artifact(name)[2] == version
+
+
+def test_images_spill_to_disk_under_the_budget(store, monkeypatch, tmp_path):
+    monkeypatch.setenv("SESSION_IMAGE_BUDGET_MB", str(80 / 1024))
+    monkeypatch.setenv("ARTIFACT_SPILL_DIR", str(tmp_path / "spill"))
+    session = EngineSession(store.create_session(), store, object())
+    images = {f"suspect{n}": portrait(color) for n, color in enumerate(["red", "green", "blue"], 1)}
+    for suspect_id, image in images.items():
+        session._set_suspect_image(suspect_id, image)
+
+    report = session.artifacts.memory_report()
+    assert report["spills"] == 1 and report["memory_bytes"] <= report["budget_bytes"]
+    assert os.listdir(tmp_path / "spill")
+    assert session.artifact("portrait:suspect1")[0] == store.get_artifact(session.session_id, "portrait:suspect1")
+
+    session.close()
+    assert os.listdir(tmp_path / "spill") == []
+
+
+class LedgerThenAnswerModel:
+    """Holds ledger extractions until released and answers everything else at once"""
+
+    def __init__(self):
+        self.extractions = 0
+        self.release = threading.Event()
+
+    def invoke(self, prompt, config=None):
+        if "maintain a detective's evidence ledger" in str(prompt):
+            self.extractions += 1
+            self.release.wait(5)
+            return "FACT | suspect 1 | was at the docks"
+        return "The evidence is inconclusive."
+
+
+def test_solution_check_reuses_the_running_ledger_extraction(store):
+    model = LedgerThenAnswerModel()
+    session = EngineSession(store.create_session(), store, model)
+    session.case_started, session.case_details = True, "A theft."
+    session.state_tracker = {"case_details": "A theft.", "dossiers": {}, "case": None}
+    session.chat_history = list(OLD_CASE[:2])
+    session._queue_ledger_update(session.chat_history)
+    threading.Timer(0.2, model.release.set).start()
+
+    result = session.turn("solution check: suspect 1 did it")
+
+    assert result["route"] == "solution"
+    assert model.extractions == 1
+    ledger = session.agent.ledger
+    assert ledger.count() == 1
+    assert ledger.processed >= 2
+
+
+def test_trace_exports_are_built_only_on_request(store):
+    session = EngineSession(store.create_session(), store, object())
+    assert set(session.diagnostics()["tracing"]) == {"enabled", "scope", "summary", "errors"}
+    assert json.loads(session.trace_export(fmt="json"))["series"] == []
+    assert session.trace_export(scope="process", fmt="prometheus").startswith("# HELP")
@@ -0,0 +1,23 @@
+import json
+import zlib
+
+import httpx
+
+from engine_client import RemoteEngineClient
+
+
+def test_new_session_is_created_on_the_worker_its_id_maps_to():
+    client = RemoteEngineClient("http://a, http://b, http://c")
+    created = {}
+
+    def worker(index):
+        def handle(request):
+            session_id = json.loads(request.content)["session_id"]
+            created[session_id] = index
+            return httpx.Response(201, json={"session_id": session_id})
+        return httpx.MockTransport(handle)
+
+    client._http = [httpx.Client(base_url=url, transport=worker(index)) for index, url in enumerate(client.base_urls)]
+    for session_id in [client.open_session() for _ in range(8)] + [client.open_session("not-a-session")]:
+        assert len(session_id) == 32
+        assert created[session_id] == zlib.crc32(session_id.encode()) % 3
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+from portrait_cache import PortraitCache
+
+
+def test_concurrent_misses_fetch_once(tmp_path):
+    cache = PortraitCache(str(tmp_path))
+    key = PortraitCache.key("a nervous butler", width=300)
+    release = threading.Event()
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        release.wait(5)
+        return b"portrait"
+
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(cache.get_or_fetch(key, fetch))) for _ in range(8)]
+    for thread in callers:
+        thread.start()
+    release.set()
+    for thread in callers:
+        thread.join()
+
+    assert results == [b"portrait"] * 8
+    assert len(fetches) == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_failed_fetch_is_not_cached(tmp_path):
+    cache = PortraitCache(str(tmp_path))
+
+    def fail():
+        raise OSError("image service down")
+
+    with pytest.raises(OSError):
+        cache.get_or_fetch("key", fail)
+    assert cache.get_or_fetch("key", lambda: b"portrait") == b"portrait"
+
+
+def test_entries_survive_on_disk(tmp_path):
+    PortraitCache(str(tmp_path)).get_or_fetch("key", lambda: b"portrait")
+    reopened = PortraitCache(str(tmp_path))
+    assert reopened.get("key") == b"portrait"
+    assert reopened.stats()["disk_hits"] == 1
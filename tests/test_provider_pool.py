@@ -0,0 +1,155 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import scheduler
+from provider_pool import AllProvidersFailed, CircuitBreaker, Provider, ProviderPool
+from scheduler import BACKGROUND, run_at
+
+RESET_SECONDS = 0.05
+
+
+class SwitchModel:
+    """Answers with its name, or raises while ``failing`` is set"""
+
+    def __init__(self, name):
+        self.name = name
+        self.failing = False
+
+    def invoke(self, prompt, config=None):
+        if self.failing:
+            raise RuntimeError(f"{self.name} is down")
+        return self.name
+
+    def stream(self, prompt, config=None):
+        if self.failing:
+            raise RuntimeError(f"{self.name} is down")
+        yield from (self.name, "!")
+
+
+def make_pool():
+    models = [SwitchModel("primary"), SwitchModel("standby")]
+    providers = [Provider(model.name, model, CircuitBreaker(failure_threshold=1, reset_seconds=RESET_SECONDS))
+                 for model in models]
+    return ProviderPool(providers), models
+
+
+def test_half_open_trial_is_claimed_once():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=RESET_SECONDS)
+    breaker.record_failure()
+    assert not breaker.available()
+    time.sleep(RESET_SECONDS)
+    assert breaker.available()
+    assert breaker.allow()
+    assert not breaker.available() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+@pytest.mark.parametrize("call", [
+    lambda pool: pool.invoke("q"),
+    lambda pool: "".join(pool.stream("q")),
+])
+def test_unused_standby_keeps_its_half_open_trial(call):
+    pool, (primary, standby) = make_pool()
+    primary.failing = standby.failing = True
+    with pytest.raises(AllProvidersFailed):
+        call(pool)
+    assert [p.breaker.state for p in pool.providers] == ["open", "open"]
+
+    # Both recover; the primary answers and the standby is never asked
+    primary.failing = standby.failing = False
+    time.sleep(RESET_SECONDS)
+    assert call(pool).startswith("primary")
+    assert pool.providers[1].breaker.available()
+
+    # The primary goes down again: the standby must still take over
+    primary.failing = True
+    assert call(pool).startswith("standby")
+    assert pool.providers[1].breaker.state == "closed"
+
+
+def test_abandoned_stream_releases_the_trial():
+    pool, (primary, _) = make_pool()
+    primary.failing = True
+    pool.providers[0].breaker.record_failure()
+    primary.failing = False
+    time.sleep(RESET_SECONDS)
+    stream = pool.stream("q")
+    assert next(stream) == "primary"
+    stream.close()
+    assert pool.providers[0].breaker.state == "closed"
+
+
+def test_skipped_call_keeps_another_calls_trial():
+    pool, _ = make_pool()
+    provider = pool.providers[0]
+    provider.breaker.record_failure()
+    time.sleep(RESET_SECONDS)
+    assert provider.breaker.claim() == "trial"
+
+    # A queued call that never claimed the trial is skipped: the trial stays with its owner
+    finished = threading.Event()
+    finished.set()
+    assert pool._call(provider, False, Future(), finished, None, "q", None, {}) is None
+    assert not provider.breaker.available()
+    assert pool._call(provider, True, Future(), finished, None, "q", None, {}) is None
+    assert provider.breaker.available()
+
+
+def test_every_circuit_open():
+    pool, models = make_pool()
+    for provider in pool.providers:
+        provider.breaker.record_failure()
+    with pytest.raises(AllProvidersFailed, match="circuit is open"):
+        pool.invoke("q")
+
+
+class SleepModel:
+    """Answers after the number of seconds in the prompt"""
+
+    def invoke(self, prompt, config=None):
+        time.sleep(float(prompt))
+        return prompt
+
+
+@pytest.fixture
+def tight_scheduler(monkeypatch):
+    """Two slots on "a", one of them kept for interactive calls"""
+    monkeypatch.setattr(scheduler, "_scheduler", scheduler.Scheduler({"a": (0, 2)}, reserve=1))
+
+
+def test_time_queued_in_the_scheduler_is_not_charged_to_the_provider(tight_scheduler):
+    pool = ProviderPool([Provider("a", SleepModel())], deadline_seconds=0.5)
+    interactive = threading.Thread(target=pool.invoke, args=("0.6",), kwargs={"deadline_seconds": 5})
+    interactive.start()
+    time.sleep(0.05)
+
+    # Background calls queue behind the long interactive call, well past their deadline
+    results = []
+    background = [threading.Thread(target=lambda: results.append(run_at(BACKGROUND, pool.invoke, "0.05")))
+                  for _ in range(3)]
+    for thread in background:
+        thread.start()
+    for thread in [interactive] + background:
+        thread.join()
+
+    assert results == ["0.05"] * 3
+    assert pool.providers[0].breaker.state == "closed"
+    assert pool.invoke("0") == "0"
+
+
+def test_no_hedge_while_the_primary_is_queued(tight_scheduler):
+    busy = ProviderPool([Provider("a", SleepModel())])
+    pool = ProviderPool([Provider("a", SleepModel()), Provider("b", SleepModel())], hedge_default_seconds=0.05)
+    # The free slot on "a" is kept for interactive calls, so a background call queues for 0.3 s
+    blocker = threading.Thread(target=busy.invoke, args=("0.3",))
+    blocker.start()
+    time.sleep(0.05)
+
+    assert run_at(BACKGROUND, pool.invoke, "0.01") == "0.01"
+    blocker.join()
+    assert pool.providers[1].counters["hedges_fired"] == 0
+    assert pool.providers[1].counters["calls"] == 0
@@ -0,0 +1,60 @@
+from session_store import SessionStore
+
+
+def test_new_case_starts_a_new_transcript_segment(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    session_id = store.create_session()
+    first_case = [{"role": "detective", "content": "hello"}, {"role": "suspect 1", "content": "hi"}]
+    store.sync_transcript(session_id, first_case)
+    assert store.sync_transcript(session_id, first_case) == 0
+    store.sync_transcript(session_id, [{"role": "assistant", "content": "new case"}])
+
+    reopened = SessionStore(store.path)
+    assert reopened.load(session_id)["chat_history"] == [{"role": "assistant", "content": "new case"}]
+
+
+def test_state_and_artifacts_are_only_written_when_they_change(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    session_id = store.create_session()
+    store.set_state(session_id, case_started=True, emotions={"suspect1": "calm"})
+    store.put_artifact(session_id, "crime_scene", b"scene", "image/webp")
+    revision = store.revision(session_id)
+    store.set_state(session_id, case_started=True, emotions={"suspect1": "calm"})
+    store.put_artifact(session_id, "crime_scene", b"scene", "image/webp")
+    assert store.revision(session_id) == revision
+
+    store.set_state(session_id, case_started=False)
+    assert store.revision(session_id) != revision
+    loaded = store.load(session_id)
+    assert loaded["state"] == {"case_started": False, "emotions": {"suspect1": "calm"}}
+    assert loaded["artifacts"] == {"crime_scene": b"scene"}
+
+
+def test_forget_then_load_keeps_writes_incremental(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    session_id = store.create_session()
+    store.sync_transcript(session_id, [{"role": "detective", "content": "hello"}])
+    store.set_state(session_id, case_started=True)
+    store.forget(session_id)
+
+    store.load(session_id)
+    revision = store.revision(session_id)
+    store.set_state(session_id, case_started=True)
+    assert store.sync_transcript(session_id, [{"role": "detective", "content": "hello"}]) == 0
+    assert store.revision(session_id) == revision
+
+
+def test_load_returns_the_latest_version_of_each_artifact(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    session_id = store.create_session()
+    for version in (b"v1", b"v2", b"v3"):
+        store.put_artifact(session_id, "crime_scene", version)
+    store.put_artifact(session_id, "portrait", b"face")
+    store.put_artifact(session_id, "portrait", None)
+
+    reopened = SessionStore(store.path)
+    assert reopened.load(session_id)["artifacts"] == {"crime_scene": b"v3"}
+    revision = reopened.revision(session_id)
+    reopened.put_artifact(session_id, "crime_scene", b"v3")
+    reopened.put_artifact(session_id, "portrait", None)
+    assert reopened.revision(session_id) == revision
@@ -0,0 +1,27 @@
+from streamlit.testing.v1 import AppTest
+
+
+def play_turn_that_drops():
+    import streamlit as st
+
+    import ui
+
+    class DroppedConnection:
+        """Streams part of a reply, then stops without a done or error event"""
+
+        def turn(self, session_id, text):
+            yield {"event": "route", "value": "suspect1"}
+            yield {"event": "token", "value": "I was "}
+
+    st.session_state.session_id = "session"
+    st.session_state.stream_replies = True
+    ui.process_user_input(DroppedConnection(), "Suspect 1, where were you?")
+
+
+def test_turn_stream_that_ends_without_a_result_shows_an_error():
+    app = AppTest.from_function(play_turn_that_drops).run()
+    assert not app.exception
+    assert [error.value for error in app.error] == [
+        "Lost the connection to the game engine before the turn finished. "
+        "Reload the page to see where the case stands."
+    ]
@@ -0,0 +1,222 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+ENABLED = os.getenv("TRACING", "1") != "0"
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Span:
+    """One timed call: an LLM invoke, image fetch or render step.
+
+    Use as a context manager; set the token, byte and retry counts on it while
+    it is open. An exception leaving the block marks the span as an error.
+    """
+
+    __slots__ = ("kind", "node", "started", "duration_ms", "prompt_tokens", "completion_tokens",
+                 "bytes", "retries", "outcome", "error", "_tracer", "_start")
+
+    def __init__(self, tracer: "Tracer", kind: str, node: str):
+        self.kind = kind
+        self.node = node
+        self.started = 0.0
+        self.duration_ms = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.bytes = 0
+        self.retries = 0
+        self.outcome = "ok"
+        self.error = None
+        self._tracer = tracer
+        self._start = 0.0
+
+    def __enter__(self) -> "Span":
+        self.started = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        if exc_type is not None:
+            self.outcome = "error"
+            self.error = f"{exc_type.__name__}: {exc}"
+        self._tracer.record(self)
+        return False
+
+    def as_dict(self) -> dict:
+        return {
+            "kind": self.kind, "node": self.node, "started": self.started,
+            "duration_ms": round(self.duration_ms, 3), "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens, "bytes": self.bytes,
+            "retries": self.retries, "outcome": self.outcome, "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for Span when tracing is disabled; attribute writes are ignored"""
+
+    __slots__ = ()
+    prompt_tokens = completion_tokens = bytes = retries = 0
+    outcome = "ok"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, value_ms: float):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (inf past the last bucket)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS_MS + (float("inf"),), self.buckets):
+            cumulative += bucket
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+
+class _Series:
+    """Aggregates for one (kind, node) pair"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.outcomes: Dict[str, int] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.bytes = 0
+        self.retries = 0
+
+
+class Tracer:
+    """Histograms and recent spans for one scope; spans are also forwarded to ``parent``"""
+
+    def __init__(self, parent: Optional["Tracer"] = None, recent: int = 200):
+        self.parent = parent
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def record(self, span: Span):
+        with self._lock:
+            series = self._series.get((span.kind, span.node))
+            if series is None:
+                series = self._series[(span.kind, span.node)] = _Series()
+            series.latency.observe(span.duration_ms)
+            series.outcomes[span.outcome] = series.outcomes.get(span.outcome, 0) + 1
+            series.prompt_tokens += span.prompt_tokens
+            series.completion_tokens += span.completion_tokens
+            series.bytes += span.bytes
+            series.retries += span.retries
+            self._recent.append(span)
+        if self.parent is not None:
+            self.parent.record(span)
+
+    def summary(self) -> List[dict]:
+        """One row per (kind, node) with counts, latency quantiles, tokens and bytes"""
+        with self._lock:
+            rows = []
+            for (kind, node), series in sorted(self._series.items()):
+                count = series.latency.count
+                rows.append({
+                    "kind": kind, "node": node, "count": count,
+                    "errors": series.outcomes.get("error", 0),
+                    "mean_ms": round(series.latency.sum_ms / count, 1) if count else 0.0,
+                    "p50_ms": series.latency.quantile(0.5),
+                    "p95_ms": series.latency.quantile(0.95),
+                    "prompt_tokens": series.prompt_tokens,
+                    "completion_tokens": series.completion_tokens,
+                    "bytes": series.bytes,
+                    "retries": series.retries,
+                    "outcomes": dict(series.outcomes),
+                })
+            return rows
+
+    def recent(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            spans = list(self._recent)[-limit:]
+        return [span.as_dict() for span in spans]
+
+    def to_json(self) -> str:
+        return json.dumps({"buckets_ms": BUCKETS_MS, "series": self.summary(), "recent": self.recent()}, indent=2)
+
+    def to_prometheus(self, prefix: str = "ideduct") -> str:
+        """Prometheus text exposition format; latencies are exported in seconds"""
+        lines = [
+            f"# HELP {prefix}_span_duration_seconds Latency of model, image and render calls",
+            f"# TYPE {prefix}_span_duration_seconds histogram",
+        ]
+        totals = []
+        with self._lock:
+            for (kind, node), series in sorted(self._series.items()):
+                labels = f'kind="{kind}",node="{node}"'
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS_MS, series.latency.buckets):
+                    cumulative += bucket
+                    lines.append(f'{prefix}_span_duration_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'{prefix}_span_duration_seconds_bucket{{{labels},le="+Inf"}} {series.latency.count}')
+                lines.append(f"{prefix}_span_duration_seconds_sum{{{labels}}} {series.latency.sum_ms / 1000:.6f}")
+                lines.append(f"{prefix}_span_duration_seconds_count{{{labels}}} {series.latency.count}")
+                for outcome, count in sorted(series.outcomes.items()):
+                    totals.append(("spans_total", f'{labels},outcome="{outcome}"', count))
+                totals.append(("tokens_total", f'{labels},direction="prompt"', series.prompt_tokens))
+                totals.append(("tokens_total", f'{labels},direction="completion"', series.completion_tokens))
+                totals.append(("bytes_total", labels, series.bytes))
+                totals.append(("retries_total", labels, series.retries))
+        for name in ("spans_total", "tokens_total", "bytes_total", "retries_total"):
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            lines.extend(f"{prefix}_{name}{{{labels}}} {value}" for metric, labels, value in totals if metric == name)
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self._recent.clear()
+
+
+process_tracer = Tracer(recent=500)
+
+_current: ContextVar[Optional[Tracer]] = ContextVar("tracer", default=None)
+
+
+def use_tracer(tracer: Optional[Tracer]):
+    """Send spans started in this context (and contexts copied from it) to ``tracer``"""
+    _current.set(tracer)
+
+
+def current_tracer() -> Tracer:
+    return _current.get() or process_tracer
+
+
+def span(kind: str, node: str):
+    """Open a span on the current session's tracer, or the process tracer outside a session"""
+    if not ENABLED:
+        return NOOP_SPAN
+    return Span(_current.get() or process_tracer, kind, node)
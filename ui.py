@@ -1,18 +1,10 @@
 import streamlit as st
-from io import BytesIO
-from PIL import Image
-from detective_engine import (
-    initialize_llm,
-    parse_suspect_descriptions,
-    generate_suspect_images,
-    generate_crime_scene_image,
-    update_suspect_expression,
-    analyze_emotion
-)
-from agent import Agent, AgentState
-import re
-import asyncio
-import os
+from engine_client import EngineError, get_engine_client
+from providers import MissingCredentials
+from render_cache import ThumbnailCache, CHAT_WIDTH, PORTRAIT_WIDTH
+from session_log import DEBUG, INFO, WARNING, ERROR, LEVEL_NAMES
+from langgraph.graph import END
+from tracing import span
 
 def main():
     # Set up page config
@@ -22,134 +14,159 @@ def main():
         layout="wide",
     )
 
+    # The game itself runs in the engine, in this process or behind ENGINE_URL
+    try:
+        client = get_engine_client()
+    except MissingCredentials as e:
+        st.error(str(e))
+        st.stop()
+
     # Initialize session state
-    if "agent" not in st.session_state:
-        llm = initialize_llm()
-        st.session_state.agent = Agent(llm)
-        st.session_state.llm = llm
-        
-        def streamlit_get_input(state):
-            return state
-        st.session_state.agent.get_input = streamlit_get_input
-        
-        st.session_state.case_details = ""
-        st.session_state.chat_history = []
-        st.session_state.state_tracker = None
-        st.session_state.case_started = False
-        st.session_state.current_node = "mysterygen"
-        st.session_state.suspect_images = None
-        st.session_state.crime_scene_image = None
-        st.session_state.suspect_emotions = {f"suspect{i}": "neutral" for i in range(1, 5)}
-        st.session_state.debug_log = []
-        st.session_state.last_emotion_update = {}
+    if "session_id" not in st.session_state:
+        # Resume the session named in the URL, or start a new durable one
+        session_id = client.open_session(st.query_params.get("session"))
+        st.query_params["session"] = session_id
+        st.session_state.session_id = session_id
+        st.session_state.stream_replies = True
+        st.session_state.thumbnails = ThumbnailCache()
+        # Artifact name -> (version, bytes) of the images this browser session has shown
+        st.session_state.images = {}
+        st.session_state.portrait_versions = {}
+
+    try:
+        game = client.snapshot(st.session_state.session_id)
+    except EngineError as e:
+        if e.status != 404:
+            raise
+        # The engine no longer knows this session, e.g. a fresh session store
+        del st.session_state["session_id"]
+        st.rerun()
 
     # UI Layout
     st.title("🕵️ Detective Mystery Game")
 
     # Start Case Button
-    if not st.session_state.case_started:
+    if not game["case_started"]:
         if st.button("Start New Case"):
-            reset_game_state()
+            client.reset(st.session_state.session_id)
             st.rerun()
 
     # Generate mystery if not started
-    if not st.session_state.case_started and st.session_state.current_node == "mysterygen":
+    if not game["case_started"]:
         with st.spinner("Generating mystery..."):
-            state = AgentState(
-                case_details="",
-                discovered_info="",
-                chat_history=[],
-                user_input="",
-                router_info=""
-            )
-            updated_state = st.session_state.agent.mystery_generator(state)
-            st.session_state.case_details = updated_state["case_details"]
-            st.session_state.debug_log.append("Mystery generated")
-            
-            with st.spinner("Generating images..."):
-                # Parse suspect descriptions first
-                suspect_descriptions = parse_suspect_descriptions(st.session_state.case_details)
-                
-                # Generate individual suspect images
-                st.session_state.suspect_images = generate_suspect_images(st.session_state.case_details)
-                
-                # Generate crime scene image
-                st.session_state.crime_scene_image = generate_crime_scene_image(
-                    st.session_state.case_details,suspect_descriptions
-                )
-                st.session_state.debug_log.append("Images generated")
-            
-            st.session_state.state_tracker = updated_state
-            st.session_state.case_started = True
-            st.session_state.chat_history.append({
-                "role": "assistant",
-                "content": "Case file generated. What would you like to do next, Detective?"
-            })
-            st.session_state.debug_log.append("Case started, ready to play")
+            client.start_case(st.session_state.session_id)
             st.rerun()
 
     # Display crime scene image if available
-    
-    st.subheader("Crime Scene")
-    image = Image.open('gemini-native-image.png')
-    st.image(image, use_container_width=True)
-    st.session_state.debug_log.append("Displayed crime scene image")
+    scene = artifact_bytes(game["scene"]) if game["scene"] else None
+    if scene:
+        st.subheader("Crime Scene")
+        st.image(scene, use_container_width=True)
+
+    st.subheader("Suspects")
+    with span("render", "portraits"):
+        render_suspect_portraits(game)
 
     st.subheader("Detective's Notes")
 
     # Display chat history
-    render_chat_history()
+    with span("render", "chat"):
+        render_chat_history(game)
 
     # Sidebar for game controls and info
-    render_sidebar()
+    render_sidebar(client, game)
+
+    if game["pending"]:
+        st.session_state.rendered_revision = game["revision"]
+        watch_background_jobs()
 
     # Input area
-    if st.session_state.case_started:
+    if game["case_started"]:
         user_input = st.chat_input("Ask questions or interrogate suspects...")
         if user_input:
-            st.session_state.chat_history.append({"role": "detective", "content": user_input})
-            current_state = st.session_state.state_tracker.copy() if st.session_state.state_tracker else {}
-            current_state["user_input"] = user_input
-            current_state["chat_history"] = st.session_state.chat_history
-
-            process_user_input(user_input, current_state)
-
-def reset_game_state():
-    st.session_state.chat_history = []
-    st.session_state.case_details = ""
-    st.session_state.state_tracker = None
-    st.session_state.case_started = False
-    st.session_state.current_node = "mysterygen"
-    st.session_state.suspect_images = None
-    st.session_state.crime_scene_image = None
-    st.session_state.suspect_emotions = {f"suspect{i}": "neutral" for i in range(1, 5)}
-    st.session_state.debug_log = []
-    st.session_state.last_emotion_update = {}
-
-def render_chat_history():
-    st.session_state.debug_log.append(f"Rendering chat history, suspect_images: { {k: 'Image present' if v else 'No image' for k, v in st.session_state.suspect_images.items()} if st.session_state.suspect_images else 'None'}")
-    for message in st.session_state.chat_history:
-        st.session_state.debug_log.append(f"Processing message: role={message['role']}, content={message['content'][:50]}...")
+            process_user_input(client, user_input)
+
+def artifact_bytes(ref):
+    """Bytes of an artifact ({"artifact", "version"}), fetched from the engine only when its version changes"""
+    cached = st.session_state.images.get(ref["artifact"])
+    if cached is not None and cached[0] == ref["version"]:
+        return cached[1]
+    fetched = get_engine_client().artifact(st.session_state.session_id, ref["artifact"])
+    if fetched is None:
+        return None
+    data, _, version = fetched
+    st.session_state.images[ref["artifact"]] = (version, data)
+    return data
+
+def suspect_thumbnail(suspect, width):
+    if suspect is None or suspect["version"] is None:
+        return None
+    suspect_id, version = suspect["id"], suspect["version"]
+    if st.session_state.portrait_versions.get(suspect_id) != version:
+        # The portrait changed: encodes of the old one are never shown again
+        st.session_state.thumbnails.invalidate(suspect_id)
+        st.session_state.portrait_versions[suspect_id] = version
+    thumbnail = st.session_state.thumbnails.cached(suspect_id, version, width)
+    if thumbnail is None:
+        data = artifact_bytes(suspect)
+        if data is not None:
+            thumbnail = st.session_state.thumbnails.get(suspect_id, version, data, width)
+    return thumbnail
+
+def render_suspect_portraits(game):
+    if not game["suspects"]:
+        return
+    columns = st.columns(len(game["suspects"]))
+    for column, suspect in zip(columns, game["suspects"]):
+        thumbnail = suspect_thumbnail(suspect, PORTRAIT_WIDTH)
+        with column:
+            if thumbnail:
+                st.image(thumbnail, width=PORTRAIT_WIDTH)
+            st.caption(f"{suspect['name']} ({suspect['emotion']})")
+
+def render_suspect_message(message, suspects, compact=False):
+    suspect_num = message["role"].split()[-1]
+    suspect_id = f"suspect{suspect_num}"
+    with st.chat_message("assistant", avatar=f"{suspect_num}️⃣"):
+        thumbnail = suspect_thumbnail(suspects.get(suspect_id), CHAT_WIDTH)
+
+        if thumbnail and compact:
+            # Narrow group columns: portrait above the answer
+            st.image(thumbnail, width=CHAT_WIDTH)
+            st.write(f"**Suspect {suspect_num}:** {message['content']}")
+        elif thumbnail:
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                st.image(thumbnail, width=CHAT_WIDTH)
+            with col2:
+                st.write(f"**Suspect {suspect_num}:** {message['content']}")
+        else:
+            st.write(f"**Suspect {suspect_num}:** {message['content']}")
+
+def render_group_answers(messages, suspects):
+    """Answers to one group question, side by side"""
+    for column, message in zip(st.columns(len(messages)), messages):
+        with column:
+            render_suspect_message(message, suspects, compact=True)
+
+def render_chat_history(game):
+    suspects = {suspect["id"]: suspect for suspect in game["suspects"]}
+    group = []
+    for message in game["chat_history"] + [None]:
+        # Consecutive suspect replies only happen for a group question
+        if message is not None and message["role"].startswith("suspect"):
+            group.append(message)
+            continue
+        if len(group) > 1:
+            render_group_answers(group, suspects)
+        elif group:
+            render_suspect_message(group[0], suspects)
+        group = []
+        if message is None:
+            break
         if message["role"] in ["detective", "user"]:
             with st.chat_message("user", avatar="🕵️"):
                 st.write(f"**Detective:** {message['content']}")
-        elif message["role"].startswith("suspect"):
-            suspect_num = message["role"].split()[-1]
-            suspect_id = f"suspect{suspect_num}"
-            with st.chat_message("assistant", avatar=f"{suspect_num}️⃣"):
-                image_present = st.session_state.suspect_images and st.session_state.suspect_images.get(suspect_id) is not None
-                
-                if image_present:
-                    img = st.session_state.suspect_images[suspect_id]
-                    buffer = BytesIO()
-                    img.save(buffer, format="PNG")
-                    col1, col2 = st.columns([1, 3])
-                    with col1:
-                        st.image(buffer.getvalue(), width=150)
-                    with col2:
-                        st.write(f"**Suspect {suspect_num}:** {message['content']}")
-                else:
-                    st.write(f"**Suspect {suspect_num}:** {message['content']}")
         elif message["role"] == "assistant":
             with st.chat_message("assistant", avatar="💼"):
                 st.write(f"**Assistant:** {message['content']}")
@@ -158,69 +175,202 @@ def render_chat_history():
                 st.write("**Case Analysis:**")
                 st.markdown(message['content'])
 
-def render_sidebar():
+def set_verbose_logging():
+    get_engine_client().set_verbose(st.session_state.session_id, st.session_state.verbose_logging)
+
+def render_sidebar(client, game):
+    session_id = st.session_state.session_id
+    scope = st.session_state.get("trace_scope", "Session")
+    min_level = st.session_state.get("log_min_level", INFO)
+    info = client.diagnostics(session_id, scope=scope.lower(), min_level=min_level)
+
     with st.sidebar:
         st.header("Game Controls")
         if st.button("Generate New Mystery"):
-            reset_game_state()
+            client.reset(session_id)
             st.rerun()
 
+        st.toggle("Stream replies", key="stream_replies")
+
         with st.expander("Case Briefing", expanded=False):
-            if st.session_state.case_details:
-                st.markdown(st.session_state.case_details)
+            if game["case_details"]:
+                st.markdown(game["case_details"])
             else:
                 st.write("No case details available. Start a new case.")
 
         if st.button("Test Emotion Update"):
-            if st.session_state.suspect_images and st.session_state.case_details:
+            applied = client.test_emotions(session_id)
+            if applied:
                 st.write("Testing emotion updates for all suspects...")
-                suspect_descriptions = parse_suspect_descriptions(st.session_state.case_details)
-                
-                for suspect_id in st.session_state.suspect_images:
-                    # Test with a random emotion from the list
-                    import random
-                    test_emotions = ["nervous", "defensive", "guilty", "fearful", "suspicious", "confident"]
-                    emotion = random.choice(test_emotions)
-                    
-                    description = suspect_descriptions.get(suspect_id, "")
-                    st.session_state.suspect_images[suspect_id] = update_suspect_expression(
-                        suspect_id, emotion, description
-                    )
-                    st.session_state.suspect_emotions[suspect_id] = emotion
+                for suspect_id, emotion in applied.items():
                     st.write(f"{suspect_id} updated to {emotion}")
-                
                 st.success("Test complete! Refresh the chat to see updated images.")
             else:
                 st.error("No suspect images or case details available for testing.")
 
         st.markdown("---")
         st.subheader("Debug Info - Status")
-        
+
         # Display current emotion states
         st.write("Current Suspect Emotions:")
-        for suspect_id, emotion in st.session_state.suspect_emotions.items():
+        for suspect_id, emotion in game["suspect_emotions"].items():
             st.write(f"{suspect_id}: {emotion}")
-            
-        if st.session_state.suspect_images:
+
+        if game["suspects"]:
             st.write("Suspect Images:")
-            for suspect_id, img in st.session_state.suspect_images.items():
-                st.write(f"{suspect_id}: {'Image present' if img else 'No image'}")
+            for suspect in game["suspects"]:
+                st.write(f"{suspect['id']}: {'Image present' if suspect['version'] else 'No image'}")
         else:
             st.write("No suspect images in session state")
-            
-        if st.session_state.crime_scene_image:
+
+        st.write(f"Thumbnail cache: {st.session_state.thumbnails.encodes} encodes, {st.session_state.thumbnails.hits} hits")
+
+        if info["sprites"] is not None:
+            progress = info["sprites"]
+            st.write(f"Emotion sprites: {progress['ready']}/{progress['total']} ready, {progress['failed']} failed")
+
+        if game["scene"]:
             st.write("Crime scene image: Present")
         else:
             st.write("Crime scene image: Missing")
-            
+
+        with st.expander("Evidence Ledger", expanded=False):
+            ledger = info["ledger"]
+            st.caption(
+                f"{ledger['entries']} entries ({ledger['contradictions']} contradictions), "
+                f"{ledger['processed']}/{ledger['messages']} messages processed"
+            )
+            st.markdown(ledger["markdown"])
+
+        with st.expander("Router Stats", expanded=False):
+            stats = info["router"]
+            st.write(f"Turns routed: {stats['turns']}")
+            st.write(f"Fast path hit rate: {stats['hit_rate']:.0%} ({stats['fast_hits']} fast / {stats['llm_calls']} LLM)")
+            st.write(f"Average latency: {stats['fast_avg_ms']:.2f} ms fast, {stats['llm_avg_ms']:.0f} ms LLM")
+            st.write(f"Latency saved: {stats['saved_ms_per_fast_turn']:.0f} ms per fast turn, {stats['saved_ms_total'] / 1000:.1f} s total")
+
+        with st.expander("Prompt Size", expanded=False):
+            if info["prompt_size"]:
+                for node, last in sorted(info["prompt_size"].items()):
+                    st.write(
+                        f"{node}: {last['prompt_tokens']} prompt tokens "
+                        f"(raw history would add {last['raw_history_tokens']}), {last['calls']} calls"
+                    )
+            else:
+                st.write("No model calls yet.")
+
+        with st.expander("Case Pool", expanded=False):
+            stats = info["case_pool"]
+            st.write(f"Ready cases: {stats['depth']}/{stats['target_depth']}")
+            st.write(f"Served: {stats['served']}, pool empty: {stats['misses']}")
+            st.write(f"Built: {stats['built']} ({stats['build_failures']} failed), refill rate {stats['refill_per_minute']:.1f}/min")
+            st.write(f"Build time: {stats['avg_build_seconds']:.1f} s average, {stats['last_build_seconds']:.1f} s last")
+
+        with st.expander("Response Cache", expanded=False):
+            stats = info["response_cache"]
+            st.caption(f"{stats['memory_items']}/{stats['max_items']} replies in memory")
+            if stats["nodes"]:
+                for node, node_stats in sorted(stats["nodes"].items()):
+                    st.write(
+                        f"{node}: {node_stats['hit_rate']:.0%} hit rate ({node_stats['hits']} hits, "
+                        f"{node_stats['misses']} misses), {node_stats['saved_ms'] / 1000:.1f} s saved"
+                    )
+            else:
+                st.write("No cacheable calls yet.")
+
+        with st.expander("LLM Providers", expanded=False):
+            providers = info["providers"]
+            if providers is not None:
+                st.caption(f"Deadline {providers['deadline_seconds']:g} s, hedge at p{providers['hedge_percentile'] * 100:g}")
+                st.dataframe(providers["rows"], hide_index=True, use_container_width=True)
+            else:
+                st.write("Single provider, no failover.")
+
+        with st.expander("Outbound Scheduler", expanded=False):
+            scheduler_stats = info["scheduler"]
+            rows = [
+                dict(resource=name, priority=level, active=stats["active"], queued=stats["queued"],
+                     limit=f"{stats['rate'] or '∞'}/s, {stats['concurrency']} at once", **values)
+                for name, stats in scheduler_stats["resources"].items()
+                for level, values in stats["classes"].items()
+            ]
+            if rows:
+                st.dataframe(rows, hide_index=True, use_container_width=True)
+            else:
+                st.write("No outbound calls yet." if scheduler_stats["enabled"] else "Scheduling is turned off.")
+
+        with st.expander("Image Memory", expanded=False):
+            report = info["image_memory"]
+            thumbnail_bytes = st.session_state.thumbnails.memory_bytes()
+            sprite_bytes = report["sprite_bytes"]
+            st.write(
+                f"In memory: {(report['memory_bytes'] + thumbnail_bytes + sprite_bytes) / 1024:.0f} KiB "
+                f"({report['memory_bytes'] / 1024:.0f} KiB portraits and scene, "
+                f"{thumbnail_bytes / 1024:.0f} KiB chat thumbnails, {sprite_bytes / 1024:.0f} KiB emotion sprites)"
+            )
+            st.write(
+                f"Budget {report['budget_bytes'] / 1024:.0f} KiB: {report['spilled_bytes'] / 1024:.0f} KiB spilled, "
+                f"{report['dropped_bytes'] / 1024:.0f} KiB dropped ({report['spills']} spills, "
+                f"{report['evictions']} evictions, {report['reloads']} reloads)"
+            )
+            stored = report["memory_bytes"] + report["spilled_bytes"] + report["dropped_bytes"]
+            if report["decoded_bytes"]:
+                st.write(
+                    f"As decoded bitmaps: {report['decoded_bytes'] / (1024 * 1024):.1f} MiB; "
+                    f"stored compact: {stored / 1024:.0f} KiB ({1 - stored / report['decoded_bytes']:.0%} smaller)"
+                )
+
+        with st.expander("Portrait Cache", expanded=False):
+            stats = info["portrait_cache"]
+            st.write(f"Hit rate: {stats['hit_rate']:.0%}")
+            st.write(f"Hits: {stats['memory_hits']} memory, {stats['disk_hits']} disk, {stats['coalesced']} coalesced")
+            st.write(f"Upstream fetches: {stats['misses']} ({stats['upstream_bytes'] / 1024:.0f} KiB)")
+            st.write(f"Disk: {stats['disk_items']} entries, {stats['disk_bytes'] / (1024 * 1024):.1f} MiB, {stats['evictions']} evicted")
+
+        with st.expander("Tracing", expanded=False):
+            tracing = info["tracing"]
+            if tracing["enabled"]:
+                st.radio("Scope", ["Session", "Process"], horizontal=True, key="trace_scope")
+                rows = tracing["summary"]
+                if rows:
+                    st.dataframe(
+                        [{key: value for key, value in row.items() if key != "outcomes"} for row in rows],
+                        hide_index=True
+                    )
+                    for call in tracing["errors"]:
+                        st.text(f"{call['kind']}/{call['node']} failed after {call['duration_ms']:.0f} ms: {call['error']}")
+                    # Serialized only when a button is clicked, not on every rerun
+                    export_scope = tracing["scope"]
+                    st.download_button(
+                        "Export JSON", lambda: client.trace_export(session_id, export_scope, "json"),
+                        file_name="spans.json", mime="application/json"
+                    )
+                    st.download_button(
+                        "Export Prometheus", lambda: client.trace_export(session_id, export_scope, "prometheus"),
+                        file_name="metrics.prom", mime="text/plain"
+                    )
+                else:
+                    st.write("No spans recorded yet.")
+            else:
+                st.write("Tracing is disabled (TRACING=0).")
+
         with st.expander("Debug Log", expanded=False):
-            for log in st.session_state.get("debug_log", []):
-                st.write(log)
+            session_log = info["log"]
+            st.toggle("Verbose logging", value=session_log["verbose"], key="verbose_logging",
+                      on_change=set_verbose_logging)
+            st.selectbox(
+                "Show level", [DEBUG, INFO, WARNING, ERROR], index=1, format_func=LEVEL_NAMES.get,
+                key="log_min_level"
+            )
+            st.caption(f"{session_log['size']}/{session_log['capacity']} entries, {session_log['dropped']} rotated out")
+            for created, level, message in session_log["entries"]:
+                st.text(f"{created} {level:7} {message}")
 
         st.markdown("---")
         st.subheader("Game Commands")
         st.markdown("""
         - `suspect 1`, `suspect 2`, etc.: Interrogate a specific suspect
+        - `all suspects, <question>`: Ask everyone the same question at once
         - `solution check`: Check your solution
         - `help`: Get assistance
         - `exit`: End the case
@@ -230,72 +380,61 @@ def render_sidebar():
         st.subheader("About")
         st.info("This interactive detective game uses LangGraph to create a dynamic mystery-solving experience with suspect portraits.")
 
-def process_user_input(user_input, current_state):
+def stream_reply_target(router_output):
+    """Open the chat bubble a streamed reply renders into and return its token callback"""
+    if router_output.startswith("suspect"):
+        suspect_num = router_output[len("suspect"):]
+        avatar, label = f"{suspect_num}️⃣", f"**Suspect {suspect_num}:** "
+    elif router_output == "solution":
+        avatar, label = "📋", "**Case Analysis:**\n\n"
+    else:
+        avatar, label = "💼", "**Assistant:** "
+
+    with st.chat_message("assistant", avatar=avatar):
+        placeholder = st.empty()
+
+    parts = []
+    def on_token(token):
+        parts.append(token)
+        placeholder.markdown(label + "".join(parts) + "▌")
+    return on_token
+
+@st.fragment(run_every=1)
+def watch_background_jobs():
+    # Rerun the whole page once background jobs have changed the game or finished
+    status = get_engine_client().poll(st.session_state.session_id)
+    if status["revision"] != st.session_state.rendered_revision or not status["pending"]:
+        st.rerun()
+
+def process_user_input(client, user_input):
+    with st.chat_message("user", avatar="🕵️"):
+        st.write(f"**Detective:** {user_input}")
+
+    on_token = None
+    result = None
     with st.spinner("Detective is working..."):
-        router_output = st.session_state.agent.router(current_state)
-        st.session_state.debug_log.append(f"Router output: {router_output}")
-        
-        # Check if we're interrogating a suspect
-        suspect_match = re.match(r"suspect_(\d+)", router_output)
-        if suspect_match:
-            suspect_num = suspect_match.group(1)
-            suspect_id = f"suspect{suspect_num}"
-            
-            # Process the node function first to get the response
-            node_function = getattr(st.session_state.agent, router_output)
-            updated_state = node_function(current_state)
-            
-            # Find the latest response from this suspect
-            suspect_response = ""
-            for msg in reversed(updated_state.get("chat_history", [])):
-                if msg.get("role") == f"suspect {suspect_num}":
-                    suspect_response = msg.get("content", "")
-                    break
-            
-            # Determine appropriate emotion using LLM and update the suspect image
-            if suspect_response:
-                # Get suspect description
-                suspect_descriptions = parse_suspect_descriptions(st.session_state.case_details)
-                description = suspect_descriptions.get(suspect_id, "")
-                
-                # Use the synchronous wrapper for LLM emotion analysis
-                emotion = asyncio.run(analyze_emotion(
-                    st.session_state.llm, 
-                    user_input, 
-                    suspect_response, 
-                    description
-                ))
-                
-                # Update emotion state
-                st.session_state.suspect_emotions[suspect_id] = emotion
-                st.session_state.last_emotion_update[suspect_id] = user_input
-                
-                # Update the suspect image with new emotional expression
-                st.session_state.suspect_images[suspect_id] = update_suspect_expression(
-                    suspect_id, 
-                    emotion, 
-                    description
-                )
-                
-                st.session_state.debug_log.append(f"Updated {suspect_id} with LLM-selected emotion: {emotion}")
-            
-            st.session_state.chat_history = updated_state.get("chat_history", st.session_state.chat_history)
-            st.session_state.state_tracker = updated_state
-            st.rerun()
-            
-        elif router_output == "mysterygen":
-            reset_game_state()
-            st.rerun()
-        elif router_output == "END":
-            st.success("Case concluded! Generate a new mystery to continue playing.")
-            st.session_state.debug_log.append("Case concluded")
-        else:
-            node_function = getattr(st.session_state.agent, router_output)
-            updated_state = node_function(current_state)
-            st.session_state.chat_history = updated_state.get("chat_history", st.session_state.chat_history)
-            st.session_state.state_tracker = updated_state
-            st.session_state.debug_log.append(f"Processed node: {router_output}")
-            st.rerun()
+        # Group questions and commands that end or restart the case have no single reply to stream
+        for event in client.turn(st.session_state.session_id, user_input):
+            if event["event"] == "route":
+                if st.session_state.stream_replies and event["value"] not in ("group", "mysterygen", END):
+                    on_token = stream_reply_target(event["value"])
+            elif event["event"] == "token":
+                if on_token is not None:
+                    on_token(event["value"])
+            elif event["event"] == "error":
+                st.error(event["message"])
+                return
+            else:
+                result = event["result"]
+
+    if result is None:
+        # The stream ended without an outcome, e.g. the connection to the engine dropped
+        st.error("Lost the connection to the game engine before the turn finished. Reload the page to see where the case stands.")
+        return
+    if result["route"] == END:
+        st.success("Case concluded! Generate a new mystery to continue playing.")
+    else:
+        st.rerun()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()